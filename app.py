@@ -1,13 +1,17 @@
 ##----- Lribraries
 from configparser import ConfigParser
 from flask import Flask, request, render_template, redirect
-import os
-from functions.calculations import Calculations, enforce_float
-from functions.utils import get_json_response, nonnumeric_rows, missing_data_rows, duplicate_rows
+from functions.utils import get_json_response, nonnumeric_rows, missing_data_rows, duplicate_rows, HTTP_CLIENT
+from functions.cache import DatasetCache
+from functions.ranking import RankedDataset, RankingCache, rank_dataset, build_base_dataset, parse_weight, RANKING_COLUMNS, WEIGHT_INPUTS
+from functions.search import TrigramIndex
+from functions.export import stream_export, EXPORT_FORMATS
+from functions.workspace import WorkspaceStore
+from functions.categorical import read_parquet
 import pandas as pd
-from functools import reduce
-from flask import Flask, flash, url_for
+from flask import Flask, flash, url_for, jsonify, session, Response, stream_with_context
 import io
+import uuid
 from waitress import serve
 
 
@@ -26,12 +30,34 @@ from functions.utils import get_path_info, get_db_info
 SECRET_KEY = config["USER"]["SECRETKEY"]
 
 # Paths
-ROOT_DIR, TEMP_DIR, TAXON_DIR, DB_DIR, DS_DIR, DOWNLOAD_DIR = get_path_info(config)
+ROOT_DIR, TEMP_DIR, TAXON_DIR, DB_DIR, DS_DIR, _ = get_path_info(config)
 # SQL connection information
 SERVER, USERNAME, PASSWORD, DRIVER, DB_NAME = get_db_info(config)
 
 ALLOWED_EXTENSIONS = {"csv"}
 
+# Scored dataset is read once per process and reloaded when the file changes
+SCORED_DATASET = DatasetCache(TEMP_DIR + "scored_dataset.parquet", reader=read_parquet)
+# Ranked datasets for recently used weights, shared by page requests
+RANKINGS = RankingCache(maxsize=16)
+# Search index of each workspace's base dataset, shared by its rankings for every weight
+SEARCH_INDEXES = RankingCache(maxsize=16)
+
+
+def drop_cached_rankings(ws_id: str):
+    """
+    Removes the rankings and search indexes of a dropped workspace,
+    so they don't keep its data in memory.
+    """
+    for cache in [RANKINGS, SEARCH_INDEXES]:
+        cache.discard(lambda key: key[0] == ws_id)
+
+
+# Each user's uploaded, biobank and weighted data is held in memory per session,
+# dropped after an hour of inactivity or when over 1GB is used in total,
+# along with the rankings cached for it
+WORKSPACES = WorkspaceStore(ttl=60 * 60, max_bytes=1 << 30, on_evict=drop_cached_rankings)
+
 
 ##-- Flask app
 
@@ -39,6 +65,16 @@ ALLOWED_EXTENSIONS = {"csv"}
 app = Flask(__name__)
 
 
+def workspace_id():
+    """
+    Returns the workspace id of the current session,
+    creating one if the session doesn't have one yet.
+    """
+    if "workspace" not in session:
+        session["workspace"] = uuid.uuid4().hex
+    return session["workspace"]
+
+
 # Route for root page
 @app.route("/")
 @app.route("/home", methods=["GET", "POST"])
@@ -110,18 +146,25 @@ def upload_display():
             dup_fullnames = duplicate_rows(uploaded_data, 'full_name')
             if len (dup_fullnames) > 0:
                 flash(f"Warning: There are duplicate species in your data which could result in data being dropped: {dup_fullnames}")
-            # save uploaded file to /temp folder
-            uploaded_data.to_parquet(TEMP_DIR + "uploaded_data.parquet", engine="fastparquet", index=False)   
+            # keep uploaded data in the session workspace
+            WORKSPACES.put(workspace_id(), "uploaded", uploaded_data)
  
         ##------ If user adds data to database
         if "add" in request.form:
-            uploaded_data = pd.read_parquet(TEMP_DIR + "uploaded_data.parquet")
-            # save uploaded biobank data to /temp folder, replacing old biobank data
-            uploaded_data.to_parquet(TEMP_DIR + "biobank.parquet", engine="fastparquet", index=False)         
+            uploaded_data = WORKSPACES.get(workspace_id(), "uploaded")
+            if uploaded_data is None:
+                return redirect(url_for('upload'))
+            # replace old biobank data in the session workspace
+            WORKSPACES.put(workspace_id(), "biobank", uploaded_data)
             return redirect(url_for('display')) # display data
-            
+
+    uploaded_data = WORKSPACES.get(workspace_id(), "uploaded")
+    # If nothing has been uploaded in this session
+    if uploaded_data is None:
+        return redirect(url_for('upload'))
+
     # Find uploaded names that arent present in database
-    data = pd.read_parquet(TEMP_DIR + "scored_dataset.parquet")
+    data = SCORED_DATASET.get()
     isin_result = uploaded_data["full_name"].isin(data["full_name"])
     unmatched = uploaded_data.loc[~isin_result, 'full_name'].tolist()
     no_unmatched = len(unmatched)
@@ -143,69 +186,33 @@ def display():
     and weigthing.
     """
     
+    ws_id = workspace_id()
     # If biobank data not provided yet
-    if not os.path.exists(TEMP_DIR + "biobank.parquet"):
+    biobank_data = WORKSPACES.get(ws_id, "biobank")
+    if biobank_data is None:
         # Redirect to upload page
         return redirect(url_for('upload'))
 
-    data = pd.read_parquet(TEMP_DIR + "scored_dataset.parquet")
-    biobank_data = pd.read_parquet(TEMP_DIR + "biobank.parquet")
-
-    # rescale biobank data
-    calc = Calculations(biobank_data["biobank_samples"])
-    biobank_data["biobank_samples"]= calc.invert_max()
-
-    # add biobank data to rest of dataset
-    data = reduce(
-                lambda left, right: pd.merge(
-                    left, right, on=["full_name", "class"], how="outer"
-                ),
-                [biobank_data[["full_name", "class", "biobank_samples"]], data],
-            ).drop_duplicates()
-    # assign species with no biobank_samples a value of 1
-    data["biobank_samples"].fillna(1, inplace=True)
-    
-    # enforce float type
-    cols = [col for col in data.columns if col not in ["full_name", "class"]]
-    for col in cols:
-        data[col] = enforce_float(data[col])
-
-    # DataTable fails is any NaN are present in dataframe, failsafe- drop any rows that contain one or more NaN values
-    data = data.dropna()
-
-    # currently combining conservation value here as approach might change in future
-    data["conservation_value"] = (
-        data["iucn_category"] + data["cites_listing"] + data["ed_median"]
-    ) / 3
-    data = data.drop(["iucn_category", "cites_listing", "ed_median"], axis=1)
+    # merge biobank data with scored dataset, only when either has changed
+    scored_data = SCORED_DATASET.get()
+    sources = [WORKSPACES.version(ws_id, "biobank"), SCORED_DATASET.version]
+    data = WORKSPACES.get(ws_id, "base")
+    if data is None or session.get("base_sources") != sources:
+        data = build_base_dataset(scored_data, biobank_data)
+        WORKSPACES.put(ws_id, "base", data)
+        session["base_sources"] = sources
 
     #----- Weight data
+    # weights are applied when /display-data ranks the data
+    weights = {col: 1.0 for col in WEIGHT_INPUTS}
     if request.method == "POST":
-        # function that applies numeric weight to column
-        def apply_weight(data, column_name, weight):
+        for column_name, form_key in WEIGHT_INPUTS.items():
+            weight = request.form.get(key=form_key, default=1)
             try:
-                weight = int(weight or 1)  # convert to integer or default to 1
-            except ValueError: # catch non-integer enteries and raise warning
+                weights[column_name] = parse_weight(weight)
+            except ValueError: # catch non-numeric enteries and raise warning
                 flash(f"Invalid weight value for {column_name}: '{weight}'. Please supply numeric entry only")
-                return render_template("/display.html")
-            data[column_name] *= weight
-        # conservation weighting
-        weight = request.form.get(key='conservation', default=1)
-        apply_weight(data, "conservation_value", weight)
-        # demand weighting
-        weight = request.form.get(key='demand', default=1)
-        apply_weight(data, "demand", weight)
-        # biobank samples weighting
-        weight = request.form.get(key='samples', default=1)
-        apply_weight(data, "biobank_samples", weight)
-
-    # create parquet of weighted data
-    data.to_parquet(TEMP_DIR + "weighted_dataset.parquet", engine="fastparquet", index=False)
-
-    # download data if download button clicked
-    if "download" in request.form:
-        data.to_csv(os.path.join(DOWNLOAD_DIR + "priority-scores.csv"))
-        flash(f"Dataset downloaded to '/downloaded' folder")
+    session["weights"] = weights
 
     # get class information for filters
     classes = list(data["class"].drop_duplicates())
@@ -216,17 +223,73 @@ def display():
     return render_template("/display.html", classes=classes)
 
 
+def current_ranking() -> RankedDataset:
+    """
+    Returns the ranking of the session's data with the session's weights,
+    ranking the data once per workspace version and weights.
+    """
+    ws_id = workspace_id()
+    data = WORKSPACES.get(ws_id, "base")
+    if data is None:
+        # workspace expired, nothing to display
+        data = pd.DataFrame(columns=["full_name", "class", "biobank_samples", "demand", "conservation_value", "null_percent"])
+    weights = session.get("weights", {})
+    version = WORKSPACES.version(ws_id, "base")
+
+    def build() -> RankedDataset:
+        ranked, order = rank_dataset(data, weights, return_order=True)
+        # the search index is built once per base dataset version, not per weights
+        search_index = lambda: SEARCH_INDEXES.get((ws_id, version), lambda: TrigramIndex(data["full_name"]))
+        return RankedDataset(ranked, search_index=search_index, source_positions=order)
+
+    return RANKINGS.get((ws_id, version, tuple(sorted(weights.items()))), build)
+
+
 @app.route("/display-data", methods=["POST", "GET"])
 def display_data():
-    data = pd.read_parquet(TEMP_DIR + "weighted_dataset.parquet")
-    data["priority_score"] = (data[['biobank_samples', 'demand','conservation_value']].sum(axis="columns")) / 3 # calculate priority scores
-    data = data.sort_values("priority_score", ascending=False)  # sort by priority score
-    data = data[['full_name', 'class', 'biobank_samples', 'demand', 'conservation_value', 'priority_score', 'null_percent']] # order columns
-    data = data.round(2) # round data to 2 decimal place
-    result = get_json_response(json_data= request.get_json(), data = data)
+    # page requests reuse the cached ranking
+    ranking = current_ranking()
+    result = get_json_response(json_data= request.get_json(), data = ranking)
     return result
 
 
+@app.route("/download", methods=["GET"])
+def download():
+    """
+    Streams the displayed ranking to the browser as a file,
+    keeping the class filter, search and ordering of the table.
+    """
+    export_format = request.args.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        flash(f"Download format '{export_format}' is not supported, choose from: {list(EXPORT_FORMATS)}")
+        return redirect(url_for('display'))
+    order_col = request.args.get("order_col", "priority_score")
+    if order_col not in RANKING_COLUMNS:
+        order_col = "priority_score"
+    ranking = current_ranking()
+    positions = ranking.query(
+        class_selected=request.args.get("classSelected"),
+        search=request.args.get("search"),
+        order_col=order_col,
+        ascending=request.args.get("order_dir", "desc") == "asc",
+    )
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(stream_export(ranking.data, positions, export_format)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=priority-scores{extension}"},
+    )
+
+
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    """
+    Hit/ miss counters for the in-process dataset cache,
+    and connection reuse counters of the shared HTTP client.
+    """
+    return jsonify({"scored_dataset": SCORED_DATASET.stats(), "rankings": RANKINGS.stats(), "search_indexes": SEARCH_INDEXES.stats(), "workspaces": WORKSPACES.stats(), "http_client": HTTP_CLIENT.stats()})
+
+
 # run app
 if __name__ == "__main__":
     app.config["SESSION_TYPE"] = "filesystem"
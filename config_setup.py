@@ -24,7 +24,17 @@ config_object["DATABASE"] = {
 
 config_object["API"] = {
     "CITES": sys.argv[6], 
-    "IUCN": sys.argv[7]
+    "IUCN": sys.argv[7],
+    # requests per second and maximum requests in flight for each API
+    "CITES_RATE": "2",
+    "CITES_CONCURRENCY": "4",
+    "IUCN_RATE": "2",
+    "IUCN_CONCURRENCY": "4",
+}
+
+# Seed of the generated demand scores, so rebuilds give the same scores
+config_object["PIPELINE"] = {
+    "DEMAND_SEED": "0",
 }
 
 # Set system pathways
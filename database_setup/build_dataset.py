@@ -0,0 +1,96 @@
+##-- Libraries
+import os
+import sys
+import argparse
+from configparser import ConfigParser
+
+# import bespoke functions from project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from functions.utils import get_path_info
+from functions.fetch import iter_pages
+from generate_metadata import score_dicts, metadata_dict
+from taxonomy.generate_tax_rep import taxonomy_dicts
+from get_api_data import load_api_schemas, get_cites_data, get_iucn_data
+from generate_dataframes import build_dataframes, load_demand_seed, DEMAND_SEED
+from generate_entire_dataset import build_entire_dataset
+from generate_scored_dataset import build_scored_dataset
+
+##------------ Build scored dataset in a single process ---------##
+# Runs every database_setup stage, passing dataframes directly from one
+# stage to the next. Intermediate parquet files are only written when
+# checkpointing, scored_dataset.parquet (read by the app) is always written.
+
+
+def build(api_keys: dict, db_dir: str, dataset_dir: str, temp_dir: str, use_saved_responses: bool = False, checkpoint: bool = False, demand_seed: int = DEMAND_SEED):
+    """
+    Builds the scored dataset from the APIs and the EDGE list.
+
+    Parameters:
+        api_keys (dict): API tokens, with keys 'cites' and 'iucn'
+        db_dir (str): path of database_setup folder, containing the API schemas
+        dataset_dir (str): path of folder containing the EDGE list workbook
+        temp_dir (str): folder API responses are saved to and checkpoints are written to
+        use_saved_responses (bool, optional): use API responses saved in temp_dir instead of requesting them. Defaults to False.
+        checkpoint (bool, optional): write each intermediate dataframe to temp_dir. Defaults to False.
+        demand_seed (int, optional): seed of the generated demand scores. Defaults to DEMAND_SEED.
+
+    Returns:
+        scored (pd.DataFrame): scored dataset
+    """
+    scores = score_dicts()
+    metadata = metadata_dict()
+
+    if not use_saved_responses:
+        iucn_schema, cites_schema = load_api_schemas(db_dir)
+        # API data is saved page by page as it arrives, rather than held in memory
+        get_cites_data(api_keys["cites"], cites_schema, temp_dir + "cites_pages/")
+        get_iucn_data(api_keys["iucn"], iucn_schema, temp_dir + "iucn_pages/")
+    frames = build_dataframes(
+        iucn_pages=iter_pages(temp_dir + "iucn_pages/"),
+        cites_pages=iter_pages(temp_dir + "cites_pages/"),
+        edge_file=dataset_dir + "EDGE_List_2023.xlsx",
+        taxa_dict=taxonomy_dicts(),
+        demand_scores=scores["demand_scores"],
+        cache_dir=temp_dir,
+        demand_seed=demand_seed,
+    )
+    entire = build_entire_dataset(frames, metadata)
+    scored = build_scored_dataset(entire, metadata, scores)
+
+    if checkpoint:
+        for name, df in frames.items():
+            df.to_parquet(temp_dir + name + ".parquet")
+        entire.to_parquet(temp_dir + "entire_dataset.parquet", engine="fastparquet")
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the scored dataset in a single process.")
+    parser.add_argument("--checkpoint", action="store_true", help="also save intermediate parquet files to the temp folder")
+    parser.add_argument("--skip-api", action="store_true", help="use API responses already saved in the temp folder")
+    args = parser.parse_args()
+
+    # Get paths and API keys from config file
+    config = ConfigParser()
+    config.read("config.ini")
+    _, TEMP_DIR, _, DB_DIR, DS_DIR, _ = get_path_info(config)
+
+    scored = build(
+        api_keys=config["API"],
+        db_dir=DB_DIR,
+        dataset_dir=DS_DIR,
+        temp_dir=TEMP_DIR,
+        use_saved_responses=args.skip_api,
+        checkpoint=args.checkpoint,
+        demand_seed=load_demand_seed(config),
+    )
+    scored.to_parquet(TEMP_DIR + "scored_dataset.parquet")
+
+    print("Scored dataset successfully created")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,25 @@
 ###--- Library imports
+import os
 import sys
 import pandas as pd
 import json
 from configparser import ConfigParser
 
-# config
-config = ConfigParser()
-config.read("config.ini")
-ROOT = config["PATHS"]["root_dir"]
-
-# import bespoke functions
+# import bespoke functions from project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.append(ROOT)
 
-from functions.utils import get_path_info, nested_dicts_to_df, generate_demand, validate_df_schema, clean_dataframe
-
-# import paths
-_, TEMP_DIR, TAXON_DIR, DB_DIR, DS_DIR, _ = get_path_info(config)
+from functions.utils import get_path_info, generate_demand, validate_df_schema, clean_dataframe, flatten_nested
+from functions.fetch import iter_pages
+from functions.ingest import clean_chunks, concat_chunks, write_parquet_chunks, schema_to_arrow
+from functions.excel import read_excel_sheets
+from functions.categorical import to_categorical, dictionary_schema, read_parquet
 
 ###----- Required metadata and functions
 
 ## Taxonomic replacement dictionary
-def load_tax_dicts():
+def load_tax_dicts(taxon_dir: str) -> dict:
     # Store filenames in a dictionary
     taxon_files = {
         "class": "class.json",
@@ -31,35 +29,32 @@ def load_tax_dicts():
     # Load JSON files and merge dictionaries
     tax_dicts = {}
     for taxon, filename in taxon_files.items():
-        with open(TAXON_DIR + filename) as f:
+        with open(taxon_dir + filename) as f:
             tax_dicts[taxon] = json.load(f)
     merged_dict = {**tax_dicts["class"], **tax_dicts["order"], **tax_dicts["family"]}
     return merged_dict
 
-taxa_dict = load_tax_dicts()
-
 ## Demand score dictionary
-with open(DB_DIR + "scores.json") as f:
-    scores = json.load(f)
-demand_scores = scores["demand_scores"]
+def load_demand_scores(db_dir: str) -> dict:
+    with open(db_dir + "scores.json") as f:
+        scores = json.load(f)
+    return scores["demand_scores"]
+
+## Demand score seed
+DEMAND_SEED = 0
+
+def load_demand_seed(config: ConfigParser) -> int:
+    """
+    Returns the seed of the generated demand scores from config.ini,
+    DEMAND_SEED if config.ini has no seed.
+    """
+    return config.getint("PIPELINE", "demand_seed", fallback=DEMAND_SEED)
 
 
 ##################################################
 ##--------- IUCN transform & clean ----------##
 ##################################################
 
-## Import & transform
-with open(TEMP_DIR + "iucn_response.json", "r") as f:
-    iucn_dict = json.load(f)
-iucn_df = nested_dicts_to_df(iucn_dict, "result")
-iucn_df = iucn_df.rename(
-    columns={"scientific_name": "full_name", "category": "iucn_category"}
-)
-
-# Clean
-iucn = clean_dataframe(iucn_df, taxa_dict)
-
-# Validate schema
 iucn_schema = {
     'taxonid': int,
     'kingdom': str,
@@ -77,50 +72,32 @@ iucn_schema = {
     'main_common_name': str
 }
 
-validate_df_schema(iucn, iucn_schema)
+def iucn_page_to_df(page: dict) -> pd.DataFrame:
+    """
+    Converts a page of IUCN API data to a dataframe.
+    """
+    iucn_df = pd.DataFrame.from_dict(page["result"])
+    return iucn_df.rename(
+        columns={"scientific_name": "full_name", "category": "iucn_category"}
+    )
+
+def iucn_chunks(iucn_pages, taxa_dict: dict):
+    """
+    Transforms, cleans and validates IUCN API response pages one page at a time.
+    """
+    return clean_chunks(iucn_pages, iucn_page_to_df, taxa_dict, iucn_schema)
+
+def build_iucn(iucn_pages, taxa_dict: dict) -> pd.DataFrame:
+    """
+    Transforms, cleans and validates IUCN API response pages.
+    """
+    return to_categorical(concat_chunks(iucn_chunks(iucn_pages, taxa_dict)))
 
-# Save cleaned datasets
-iucn.to_parquet(TEMP_DIR + "iucn.parquet")
 
 ##################################################
 ##---------- CITES transform & clean ----------##
 ##################################################
 
-with open(TEMP_DIR + "cites_response.json", "r") as f:
-    cites_dict = json.load(f)
-
-cites_df = pd.DataFrame.from_dict(cites_dict["taxon_concepts"])
-
-#---- CITES common names df
-dfs = [pd.DataFrame(sublist) for sublist in cites_df["common_names"]]
-# Add the 'id' from the original dataset to each DataFrame
-df_list = []
-for sub_df in dfs:
-    sub_df['id'] = cites_df['id']
-    df_list.append(sub_df)
-cn_df = pd.concat(df_list)
-
-#---- CITES listings df
-dfs = [pd.DataFrame(sublist) for sublist in cites_df["cites_listings"]]
-listings_df = pd.concat(dfs)
-
-#---- CITES synonyms df
-dfs = [pd.DataFrame(sublist) for sublist in cites_df["synonyms"]]
-synonyms_df = pd.concat(dfs)
-
-#---- CITES df
-# Append higher-taxa info to CITES df
-tax = pd.DataFrame.from_records(cites_df["higher_taxa"])
-cites_df = pd.concat([cites_df, tax], axis=1)
-# Drop unwanted columns
-cites_df.drop(
-    ["higher_taxa", "common_names", "cites_listings", "synonyms"], axis=1, inplace=True
-)
-
-# Clean
-cites_df = clean_dataframe(cites_df, taxa_dict)
-
-# Validate schema
 cites_schema = {
     'id': int,
     'full_name': str,
@@ -137,63 +114,85 @@ cites_schema = {
     'family': str
 }
 
-validate_df_schema(cites_df, cites_schema)
+def cites_page_to_df(page: dict) -> pd.DataFrame:
+    """
+    Converts a page of CITES API data to a dataframe, with a column for each higher taxon.
+    """
+    cites_df = pd.DataFrame.from_dict(page["taxon_concepts"])
+    if cites_df.empty:
+        return cites_df
+    # Append higher-taxa info to CITES df
+    tax = pd.DataFrame.from_records(cites_df["higher_taxa"])
+    cites_df = pd.concat([cites_df, tax], axis=1)
+    # Drop unwanted columns
+    cites_df.drop(
+        ["higher_taxa", "common_names", "cites_listings", "synonyms"], axis=1, inplace=True
+    )
+    return cites_df
+
+def cites_chunks(cites_pages, taxa_dict: dict):
+    """
+    Transforms, cleans and validates CITES API response pages one page at a time.
+    """
+    return clean_chunks(cites_pages, cites_page_to_df, taxa_dict, cites_schema)
+
+def build_cites(cites_pages, taxa_dict: dict) -> pd.DataFrame:
+    """
+    Transforms, cleans and validates CITES API response pages.
+    """
+    return to_categorical(concat_chunks(cites_chunks(cites_pages, taxa_dict)))
+
+# nested lists of each taxon concept saved as child tables, and their file names
+cites_child_tables = {
+    "common_names": "cites_common_names",
+    "cites_listings": "cites_listings",
+    "synonyms": "cites_synonyms",
+}
+
+def build_cites_children(cites_pages) -> dict:
+    """
+    Flattens the common names, listings and synonyms of each
+    taxon concept into tables, with the id of the taxon concept
+    in a taxon_concept_id column.
+
+    Returns:
+        (dict): child table of each nested list, keyed by file name
+    """
+    tables = {name: [] for name in cites_child_tables.values()}
+    for page in cites_pages:
+        children = flatten_nested(page["taxon_concepts"], list(cites_child_tables), parent_column="taxon_concept_id")
+        for field, name in cites_child_tables.items():
+            tables[name].append(children[field])
+    return {name: concat_chunks(frames) for name, frames in tables.items()}
 
-# Save
-cites_df.to_parquet(TEMP_DIR + "cites.parquet")
 
 ##################################################
 ##---- Demand creation, transform & clean ----##
 ##################################################
 
-# Generate demand data
-demand_df = generate_demand(taxonomy_df=iucn, demand_scores=demand_scores)
-
-# Validate schema
 demand_schema = {
     'demand': float,
     'full_name': str,
     'class': str
 }
 
-validate_df_schema(demand_df, demand_schema)
+def build_demand(iucn: pd.DataFrame, demand_scores: dict, seed: int = DEMAND_SEED) -> pd.DataFrame:
+    """
+    Generates and validates demand data for IUCN species.
+    The same seed gives the same demand scores.
+    """
+    # Generate demand data
+    demand_df = generate_demand(taxonomy_df=iucn, demand_scores=demand_scores, seed=seed)
 
-demand_df.to_parquet(TEMP_DIR + "demand.parquet")
+    # Validate schema
+    validate_df_schema(demand_df, demand_schema)
+    return to_categorical(demand_df)
 
 
 ##################################################
 ##---------- EDGE transform & clean ----------##
 ##################################################
 
-# Import & transforms
-file = DS_DIR + "EDGE_List_2023.xlsx"
-data = pd.ExcelFile(file)
-# extract sheets of scores for non-plant species
-score_sheets = [sheet for sheet in data.sheet_names if "score" in sheet and all(word not in sheet for word in ["corals", "gymnosperms"])]
-# create df from list of sheets
-df_list = []
-for sheet in score_sheets:
-    df = data.parse(sheet)
-    df.columns = df.columns.str.lower()
-    df_list.append(df)
-# convert list of dfs to single concatinated df
-edge_df = pd.concat(df_list)
-
-# rename column names
-edge_df.columns = edge_df.columns.str.replace('.', '_', regex=False)
-edge_df.rename(columns={"species": "full_name"}, inplace=True)
-
-# add class column 
-edge_df["class"] = ""
-
-# Clean
-edge_df = clean_dataframe(edge_df, taxa_dict)
-
-# Cast object columns to string columns
-object_columns = edge_df.select_dtypes(include='object').columns
-edge_df[object_columns] = edge_df[object_columns].astype('string')
-
-# Validate schema
 edge_schema = {
     'rl_id': float,
     'family': str,
@@ -201,11 +200,89 @@ edge_schema = {
     'ed_median': float,
     'class': str
 }
-validate_df_schema(edge_df, edge_schema)
 
-edge_df = edge_df[['rl_id', 'family', 'full_name', 'ed_median', 'class']]
+# columns of the EDGE list used, other columns of the workbook are not parsed
+edge_columns = ["species", "rl_id", "family", "ed_median"]
+
+
+def edge_score_sheet(sheet: str) -> bool:
+    """
+    Returns True for sheets of scores for non-plant species.
+    """
+    return "score" in sheet and all(word not in sheet for word in ["corals", "gymnosperms"])
+
+
+def build_edge(file: str, taxa_dict: dict, cache_dir: str = None) -> pd.DataFrame:
+    """
+    Reads, cleans and validates the EDGE list workbook.
+    Score sheets are parsed in parallel and, if cache_dir is given, cached
+    as parquet until the workbook changes (see read_excel_sheets).
+    """
+    # Import & transforms
+    edge_df = read_excel_sheets(file, select_sheet=edge_score_sheet, columns=edge_columns, cache_dir=cache_dir)
+
+    # rename column names
+    edge_df.rename(columns={"species": "full_name"}, inplace=True)
+
+    # add class column
+    edge_df["class"] = ""
+
+    # Clean
+    edge_df = to_categorical(clean_dataframe(edge_df, taxa_dict))
+
+    # Cast object columns to string columns
+    object_columns = edge_df.select_dtypes(include='object').columns
+    edge_df[object_columns] = edge_df[object_columns].astype('string')
+
+    # Validate schema
+    validate_df_schema(edge_df, edge_schema)
+
+    edge_df = edge_df[['rl_id', 'family', 'full_name', 'ed_median', 'class']]
+    return edge_df
+
+
+def build_dataframes(iucn_pages, cites_pages, edge_file: str, taxa_dict: dict, demand_scores: dict, cache_dir: str = None, demand_seed: int = DEMAND_SEED) -> dict:
+    """
+    Builds the cleaned dataframe of each data source.
+    API pages can be iterators (e.g. functions.fetch.iter_pages), pages are cleaned
+    one at a time so only the cleaned dataframes are held in memory.
+    The parsed EDGE list is cached in cache_dir, if given (see build_edge).
+    Demand scores are generated with demand_seed (see build_demand).
+
+    Returns:
+        (dict): dataframes keyed by source name ('iucn', 'cites', 'demand', 'edge')
+    """
+    iucn = build_iucn(iucn_pages, taxa_dict)
+    return {
+        "iucn": iucn,
+        "cites": build_cites(cites_pages, taxa_dict),
+        "demand": build_demand(iucn, demand_scores, demand_seed),
+        "edge": build_edge(edge_file, taxa_dict, cache_dir),
+    }
+
+
+def main():
+    # config
+    config = ConfigParser()
+    config.read("config.ini")
+    # import paths
+    _, TEMP_DIR, TAXON_DIR, DB_DIR, DS_DIR, _ = get_path_info(config)
+    taxa_dict = load_tax_dicts(TAXON_DIR)
+
+    # Stream API data page by page into parquet files, so only one page is held in memory
+    # species and taxonomy columns are dictionary encoded (see functions.categorical)
+    write_parquet_chunks(iucn_chunks(iter_pages(TEMP_DIR + "iucn_pages/"), taxa_dict), TEMP_DIR + "iucn.parquet", dictionary_schema(schema_to_arrow(iucn_schema)))
+    write_parquet_chunks(cites_chunks(iter_pages(TEMP_DIR + "cites_pages/"), taxa_dict), TEMP_DIR + "cites.parquet", dictionary_schema(schema_to_arrow(cites_schema)))
+    for name, table in build_cites_children(iter_pages(TEMP_DIR + "cites_pages/")).items():
+        table.to_parquet(TEMP_DIR + name + ".parquet")
+
+    # Save cleaned datasets
+    iucn = read_parquet(TEMP_DIR + "iucn.parquet", columns=["full_name", "class"])
+    build_demand(iucn, load_demand_scores(DB_DIR), load_demand_seed(config)).to_parquet(TEMP_DIR + "demand.parquet")
+    build_edge(DS_DIR + "EDGE_List_2023.xlsx", taxa_dict, cache_dir=TEMP_DIR).to_parquet(TEMP_DIR + "edge.parquet")
+
+    print("All dataframes successfully created")
 
-# Save
-edge_df.to_parquet(TEMP_DIR + "edge.parquet")
 
-print("All dataframes successfully created")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -2,50 +2,65 @@
 from configparser import ConfigParser
 import pandas as pd
 import json
+import os
 import sys
-from sqlalchemy.engine import URL
-from functools import reduce
 
 
 ##-- Setup
 
-# Read config.ini
-config = ConfigParser()
-config.read("config.ini")
-ROOT = config["PATHS"]["root_dir"]
+# import bespoke functions from project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.append(ROOT)
 
-from functions.utils import get_db_info, get_path_info
+from functions.utils import get_path_info
+from functions.categorical import to_categorical, read_parquet
+from functions.join import join_species
 
-# Get SQL connection information
-SERVER, USERNAME, PASSWORD, DRIVER, DB_NAME = get_db_info(config)
-# Get paths
-_, TEMP_DIR, _, DB_DIR, _, _ = get_path_info(config)
+##---------- Save temporary cache of dataset ----------##
 
-# Get metadata
-with open(DB_DIR + "metadata.json") as meta_file:
-    metadata = json.load(meta_file)
+def build_entire_dataset(frames: dict, metadata: dict) -> pd.DataFrame:
+    """
+    Joins the value column of each data source into a single dataset (see join_species).
+    The class of a species is taken from the first source in metadata that has one.
 
-##---------- Save temporary cache of dataset ----------##
+    Parameters:
+        frames (dict): dataframe of each data source, keyed by metadata table name ('iucn', 'cites', etc.)
+        metadata (dict): metadata of each data source, containing the source's 'column_name'
+
+    Returns:
+        merged_df (pd.DataFrame): one row per full_name, sorted by full_name
+    """
+    # Get table names and column names from metadata
+    dfs = []
+    for table, meta in metadata.items():
+        col_name = str(meta['column_name'])  # 'iucn_category', 'cites_listing', etc.
+        dfs.append(frames[table][["full_name", "class", col_name]])
+
+    # Join the sources on species, keeping the first non-null value of each source
+    merged_df = join_species(dfs)
+    return to_categorical(merged_df)
+
+
+def main():
+    # Read config.ini
+    config = ConfigParser()
+    config.read("config.ini")
+    # Get paths
+    _, TEMP_DIR, _, DB_DIR, _, _ = get_path_info(config)
 
-# Get table names and column names from metadata
-parquets = [str(x) + ".parquet" for x in metadata.keys()]  # ['iucn', 'cites', etc.]
-col_names = [str(x['column_name']) for x in metadata.values()] # ['iucn_category', 'cites_listing', etc.]
+    # Get metadata
+    with open(DB_DIR + "metadata.json") as meta_file:
+        metadata = json.load(meta_file)
 
-# Read parquet tables into list
-dfs = []
-for col_name, parquet_name in zip(col_names, parquets):
-    df = pd.read_parquet(TEMP_DIR + parquet_name)
-    df = df[["full_name", "class", col_name]]
-    dfs.append(df)
+    # Read parquet tables
+    frames = {table: read_parquet(TEMP_DIR + table + ".parquet") for table in metadata}
+    merged_df = build_entire_dataset(frames, metadata)
 
-# Join the dataframes on full_name and class
-merged_df = reduce(lambda left, right: pd.merge(left, right, on= ['full_name', 'class'], how='outer'), dfs)
-# Drop duplicates, keeping first non-null value
-merged_df = merged_df.groupby('full_name').first().sort_values("full_name").reset_index()
+    merged_df.to_parquet(TEMP_DIR + "entire_dataset.parquet", engine="fastparquet")
 
+    print("Database successfully create")
 
-merged_df.to_parquet(TEMP_DIR + "entire_dataset.parquet", engine="fastparquet")
 
-print("Database successfully create")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,87 +1,198 @@
 # Required libraries
+import os
 import json
-import aiohttp
 import asyncio
-import time
 import sys
+import shutil
+import argparse
 from configparser import ConfigParser
 
-# Get path and API key from config.ini
-config = ConfigParser()
-config.read("config.ini")
-ROOT = config["PATHS"]["root_dir"]
-
-# import bespoke functions
+# import bespoke functions from project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if ROOT not in sys.path:
     sys.path.append(ROOT)
 
-from functions.utils import get_url, get_path_info, validate_json_schema
-_, _, _, DB_DIR, _, _ = get_path_info(config)
+from functions.utils import get_path_info, validate_json_schema
+from functions.fetch import AsyncFetcher, ResponseStore, client_session, page_count, probe_page_count, harvest_pages, iter_pages, write_page, utc_timestamp
+
+
+def load_api_schemas(db_dir: str):
+    """
+    Loads schemas for validating api response structure.
 
-# import paths and api information
-apis = config["API"]
-CITES_API_KEY = apis["cites"]
-IUCN_API_KEY = apis["iucn"]
+    Returns:
+        (tuple): IUCN schema and CITES schema
+    """
+    with open(db_dir + "schemas/iucn_api.json") as iucn_schema, open(db_dir + "schemas/cites_api.json") as cites_schema:
+        return json.load(iucn_schema), json.load(cites_schema)
 
-# import schemas for validating api response structure
-with open(DB_DIR + "schemas/iucn_api.json") as iucn_schema, open(DB_DIR + "schemas/cites_api.json") as cites_schema:
-    iucn_schema = json.load(iucn_schema)
-    cites_schema = json.load(cites_schema)
 
 #################################################
 #------------------ CITES ---------------------##
 #################################################
-r = get_url(
-    url="https://api.speciesplus.net/api/v1/taxon_concepts?",
-    headers={"X-Authentication-Token": CITES_API_KEY},
-)
-
-# Validate schema
-validate_json_schema(r.json(), cites_schema)
-
-# Save json response data to temp folder
-with open(ROOT + "/temp/cites_response.json", "w") as file:
-    json.dump(r.json(), file)
+CITES_URL = "https://api.speciesplus.net/api/v1/taxon_concepts"
+CITES_PAGE_SIZE = 500  # largest page size allowed by the Species+ API
+
+
+async def harvest_cites_pages(api_key, schema, out_dir, base_url=CITES_URL, rate=2, concurrency=4, retries=4, full=False):
+    """
+    Gets taxon concepts from the Species+/ CITES API, reading the number of pages
+    from the pagination of the first page. Pages are requested concurrently over
+    one pooled session and saved to out_dir as they arrive.
+
+    Once pages have been saved, only taxon concepts updated since the last sync
+    are requested (with the updated_since filter) and merged into the saved pages,
+    unless full is True.
+
+    Returns:
+        (dict): summary of refresh, whether it was 'full' or 'incremental' and
+            the number of pages fetched, or records updated and added
+    """
+    store = ResponseStore(out_dir)
+    synced_at = utc_timestamp()
+    fetcher = AsyncFetcher(rate=rate, burst=concurrency, concurrency=concurrency, retries=retries)
+    harvest_options = {
+        "count_pages": lambda page: page_count(page["pagination"]["total_entries"], page["pagination"]["per_page"]),
+        "validate": lambda page: validate_json_schema(page, schema),
+    }
+    async with client_session(concurrency, headers={"X-Authentication-Token": api_key}) as session:
+        if full or store.last_synced is None:
+            manifest = await harvest_pages(fetcher, session, base_url, out_dir, params={"per_page": CITES_PAGE_SIZE}, **harvest_options)
+            summary = {"mode": "full", "pages": len(manifest["pages"])}
+        else:
+            updates_dir = os.path.join(out_dir, "updates")
+            await harvest_pages(
+                fetcher, session, base_url, updates_dir,
+                params={"per_page": CITES_PAGE_SIZE, "updated_since": store.last_synced},
+                **harvest_options,
+            )
+            records = [concept for page in iter_pages(updates_dir) for concept in page["taxon_concepts"]]
+            summary = {"mode": "incremental", **store.merge_records(records, "taxon_concepts", page_size=CITES_PAGE_SIZE)}
+            shutil.rmtree(updates_dir)
+    store.mark_synced(synced_at)
+    return summary
+
+
+def get_cites_data(api_key: str, schema: dict, out_dir: str, **fetch_options) -> dict:
+    """
+    Saves taxon concepts from the Species+/ CITES API to out_dir,
+    read them back with functions.fetch.iter_pages.
+    fetch_options (rate, concurrency, retries, full) are passed to harvest_cites_pages.
+
+    Returns:
+        (dict): summary of refresh
+    """
+    return asyncio.run(harvest_cites_pages(api_key, schema, out_dir, **fetch_options))
 
 
 ##################################################
 ##------------------ IUCN ---------------------##
 ##################################################
-async def get_iucn_page(session, page_number):
-    url = f"http://apiv3.iucnredlist.org/api/v3/species/page/{page_number}?token={IUCN_API_KEY}"
-    try:
-        async with session.get(url) as response:
-            if response.text == '{"message":"Token not valid!"}':
-                raise Exception("Token not valid!")
-            elif response.status == 404:
-                print(f"Page {page_number} not found")
-            elif response.status != 200:
-                raise Exception(
-                    f"Request failed with response status: {response.status}"
-                )
-            else:
-                time.sleep(1) # so the server doesnt get overloaded
-                return await response.json()
-    except aiohttp.ClientError as e:
-        print(f"Error occured while getting page {page_number} : {e}")
-        return None
-
-
-async def get_multiple_iucn_pages(page_numbers):
-    async with aiohttp.ClientSession() as session:
-        tasks = [get_iucn_page(session, page_number) for page_number in page_numbers]
-        results = await asyncio.gather(*tasks)
-        return results
-
-
-page_numbers = range(0, 16)  # iucn has a total of 16 pages
-json_pages_list = asyncio.run(get_multiple_iucn_pages(page_numbers)) # save list of dictionaries
-
-# Validate schema
-validate_json_schema(json_pages_list[1], iucn_schema)
-
-# Save response data to temp folder
-with open(ROOT + "/temp/iucn_response.json", "w") as file:
-    json.dump(json_pages_list, file)
-
-print("All API data successfully retrieved")
\ No newline at end of file
+IUCN_URL = "http://apiv3.iucnredlist.org/api/v3/"
+IUCN_PAGE_SIZE = 10000  # species per page of /species/page/
+
+
+async def get_iucn_page(fetcher, session, page_number, api_key, base_url=IUCN_URL):
+    page = await fetcher.get_json(session, f"{base_url}species/page/{page_number}", params={"token": api_key})
+    if page is None:
+        print(f"Page {page_number} not found")
+    return page
+
+
+async def harvest_iucn_pages(api_key, out_dir, base_url=IUCN_URL, rate=2, concurrency=4, retries=4, full=False):
+    """
+    Gets every page of species from the IUCN API, rate limited and concurrently,
+    saving pages to out_dir. The number of pages is calculated from the species count,
+    if the count isn't available pages are requested until an empty page is returned.
+
+    Once pages have been saved, pages are requested with their ETag/ Last-Modified
+    values and only downloaded if they've changed, unless full is True.
+
+    Returns:
+        (dict): summary of refresh, whether it was 'full' or 'incremental',
+            the number of pages and the number of pages not modified
+    """
+    store = ResponseStore(out_dir)
+    synced_at = utc_timestamp()
+    incremental = not full and store.last_synced is not None
+    fetcher = AsyncFetcher(rate=rate, burst=concurrency, concurrency=concurrency, retries=retries)
+    async with client_session(concurrency) as session:
+        count = await fetcher.get_json(session, base_url + "speciescount", params={"token": api_key})
+        if count and str(count.get("count", "")).isdigit():
+            pages = page_count(int(count["count"]), IUCN_PAGE_SIZE)
+            manifest = await harvest_pages(
+                fetcher, session, base_url + "species/page/{page}", out_dir,
+                count_pages=lambda page: pages,
+                params={"token": api_key},
+                first_page=0,
+                conditional=incremental,
+            )
+        else:
+            json_pages_list = await probe_page_count(
+                lambda n: get_iucn_page(fetcher, session, n, api_key, base_url),
+                is_empty=lambda page: not page.get("result"),
+                batch_size=concurrency,
+            )
+            os.makedirs(out_dir, exist_ok=True)
+            entries = [write_page(out_dir, n, page) for n, page in enumerate(json_pages_list)]
+            manifest = store.save_harvest(entries, url=base_url + "species/page/{page}")
+    store.mark_synced(synced_at)
+    return {"mode": "incremental" if incremental else "full", "pages": len(manifest["pages"]), "not_modified": manifest["not_modified"]}
+
+
+def get_iucn_data(api_key: str, schema: dict, out_dir: str, **fetch_options) -> dict:
+    """
+    Saves every page of species from the IUCN API to out_dir,
+    read them back with functions.fetch.iter_pages.
+    fetch_options (rate, concurrency, retries, full) are passed to harvest_iucn_pages.
+
+    Returns:
+        (dict): summary of refresh
+    """
+    summary = asyncio.run(harvest_iucn_pages(api_key, out_dir, **fetch_options))
+
+    # Validate schema
+    validate_json_schema(next(iter_pages(out_dir)), schema)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieve IUCN and CITES API data, only fetching data changed since the last run.")
+    parser.add_argument("--full", action="store_true", help="download all API data again")
+    args = parser.parse_args()
+
+    # Get path and API key from config.ini
+    config = ConfigParser()
+    config.read("config.ini")
+    _, TEMP_DIR, _, DB_DIR, _, _ = get_path_info(config)
+
+    # import paths and api information
+    apis = config["API"]
+    iucn_schema, cites_schema = load_api_schemas(DB_DIR)
+
+    # Save each page of json response data to temp folder
+    cites = get_cites_data(
+        apis["cites"],
+        cites_schema,
+        TEMP_DIR + "cites_pages/",
+        rate=apis.getfloat("cites_rate", fallback=2),
+        concurrency=apis.getint("cites_concurrency", fallback=4),
+        full=args.full,
+    )
+    print(f"CITES data retrieved: {cites}")
+
+    iucn = get_iucn_data(
+        apis["iucn"],
+        iucn_schema,
+        TEMP_DIR + "iucn_pages/",
+        rate=apis.getfloat("iucn_rate", fallback=2),
+        concurrency=apis.getint("iucn_concurrency", fallback=4),
+        full=args.full,
+    )
+    print(f"IUCN data retrieved: {iucn}")
+
+    print("All API data successfully retrieved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+##-- Libraries
+import os
+import sys
+import argparse
+from functools import partial
+from configparser import ConfigParser
+
+# Get paths from config file
+config = ConfigParser()
+config.read("config.ini")
+ROOT = config["PATHS"]["root_dir"]
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from functions.utils import get_path_info
+from functions.pipeline import Stage, PipelineRunner, format_report, run_script
+
+_, TEMP_DIR, TAXON_DIR, DB_DIR, DS_DIR, _ = get_path_info(config)
+
+##------------ Pipeline stages ---------##
+# Each stage declares the files it reads and writes, stages are
+# ordered by matching one stage's outputs to another stage's inputs.
+# Stages also rerun when the project modules they import or the
+# config.ini sections they read change.
+
+taxonomy_files = [TAXON_DIR + name for name in ["class.json", "family.json", "order.json"]]
+# the index of saved API pages holds a hash of each page, so changes to any page change its fingerprint,
+# details of each run (e.g. harvest time) are saved to last_run.json, which isn't fingerprinted
+response_files = [TEMP_DIR + "cites_pages/index.json", TEMP_DIR + "iucn_pages/index.json"]
+source_parquets = [TEMP_DIR + name + ".parquet" for name in ["iucn", "cites", "demand", "edge"]]
+cites_child_parquets = [TEMP_DIR + name + ".parquet" for name in ["cites_common_names", "cites_listings", "cites_synonyms"]]
+
+STAGES = [
+    Stage(
+        "generate_metadata",
+        script=DB_DIR + "generate_metadata.py",
+        outputs=[DB_DIR + "scores.json", DB_DIR + "metadata.json"],
+        config_sections=["PATHS"],
+    ),
+    Stage(
+        "generate_tax_rep",
+        script=TAXON_DIR + "generate_tax_rep.py",
+        outputs=taxonomy_files,
+        config_sections=["PATHS"],
+    ),
+    Stage(
+        "get_api_data",
+        script=DB_DIR + "get_api_data.py",
+        inputs=[DB_DIR + "schemas/iucn_api.json", DB_DIR + "schemas/cites_api.json"],
+        outputs=response_files,
+        always_run=True,  # API data changes without any local input changing
+        config_sections=["PATHS", "API"],
+    ),
+    Stage(
+        "generate_dataframes",
+        script=DB_DIR + "generate_dataframes.py",
+        inputs=response_files + taxonomy_files + [DB_DIR + "scores.json", DS_DIR + "EDGE_List_2023.xlsx"],
+        outputs=source_parquets + cites_child_parquets,
+        config_sections=["PATHS", "PIPELINE"],
+    ),
+    Stage(
+        "generate_entire_dataset",
+        script=DB_DIR + "generate_entire_dataset.py",
+        inputs=source_parquets + [DB_DIR + "metadata.json"],
+        outputs=[TEMP_DIR + "entire_dataset.parquet"],
+        config_sections=["PATHS"],
+    ),
+    Stage(
+        "generate_scored_dataset",
+        script=DB_DIR + "generate_scored_dataset.py",
+        inputs=[TEMP_DIR + "entire_dataset.parquet", DB_DIR + "metadata.json", DB_DIR + "scores.json"],
+        outputs=[TEMP_DIR + "scored_dataset.parquet"],
+        config_sections=["PATHS"],
+    ),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild app data, skipping stages whose inputs haven't changed.")
+    parser.add_argument("targets", nargs="*", help="stages to build (with their dependencies), defaults to all stages")
+    parser.add_argument("--force", action="store_true", help="run every stage even if its inputs haven't changed")
+    parser.add_argument("--skip-api", action="store_true", help="don't refetch API data if responses already exist")
+    args = parser.parse_args()
+
+    if args.skip_api:
+        for stage in STAGES:
+            stage.always_run = False
+
+    # scripts read config.ini from the project root
+    runner = PipelineRunner(STAGES, state_path=TEMP_DIR + "pipeline_state.json", run_stage=partial(run_script, cwd=ROOT), root=ROOT, config_path=os.path.join(ROOT, "config.ini"))
+    results = runner.run(targets=args.targets or None, force=args.force)
+    print(format_report(results))
@@ -3,11 +3,6 @@
 import json
 from configparser import ConfigParser
 
-# Set up paths
-config = ConfigParser()
-config.read("config.ini")
-TAXON = config["PATHS"]["taxa_dir"]
-
 ##---------------- Class --------------##
 class_tax = {
     "Actinopteri": "Actinopterygii",
@@ -226,12 +221,31 @@ multi_order = {
 
 all_order = {"order": {**order, **multi_order}}
 
+
+def taxonomy_dicts() -> dict:
+    """
+    Returns the class, order and family replacement dictionaries,
+    keyed by the taxonomic rank they apply to.
+    """
+    return {**all_class, **all_order, **all_family}
+
+
 ##--------------- Save dictionaries ---------------##
-with open(TAXON + "order.json", "w") as fp:
-    json.dump(all_order, fp)
+def main():
+    # Set up paths
+    config = ConfigParser()
+    config.read("config.ini")
+    TAXON = config["PATHS"]["taxa_dir"]
+
+    with open(TAXON + "order.json", "w") as fp:
+        json.dump(all_order, fp)
+
+    with open(TAXON + "family.json", "w") as fp:
+        json.dump(all_family, fp)
+
+    with open(TAXON + "class.json", "w") as fp:
+        json.dump(all_class, fp)
 
-with open(TAXON + "family.json", "w") as fp:
-    json.dump(all_family, fp)
 
-with open(TAXON + "class.json", "w") as fp:
-    json.dump(all_class, fp)
+if __name__ == "__main__":
+    main()
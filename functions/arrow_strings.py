@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+# species name pattern of filter_species ("[A-Z]{1}[a-z]+\s[a-z]+$" matched from the start)
+# in RE2 syntax, as used by Arrow. RE2's \s only matches ASCII whitespace, so python's \s
+# characters are listed, and python's $ also matches before a trailing newline.
+PYTHON_WHITESPACE = r"\t\n\x0b\x0c\r\x1c-\x1f \x{85}\x{a0}\x{1680}\x{2000}-\x{200a}\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}"
+SPECIES_PATTERN = r"^[A-Z][a-z]+[" + PYTHON_WHITESPACE + r"][a-z]+\n?$"
+
+
+def to_arrow_strings(series: pd.Series):
+    """
+    Converts an object column of strings to an Arrow string array, missing values become nulls.
+
+    Returns:
+        (pa.Array): string array, None if the column isn't an object column of strings
+    """
+    if not isinstance(series, pd.Series) or series.dtype != object:
+        return None
+    if pd.api.types.infer_dtype(series, skipna=True) not in ["string", "empty"]:
+        return None
+    return pa.array(series.to_numpy(), type=pa.string(), from_pandas=True)
+
+
+def capitalize(series: pd.Series) -> pd.Series:
+    """
+    Capitalizes strings as series.str.capitalize() does, with Arrow's ASCII kernel.
+    Only the unique strings of the column are capitalized (the column is dictionary
+    encoded), so taxonomy columns with few values are quick however many rows they have.
+    Strings that aren't ASCII are capitalized by python, as Arrow's case mapping
+    differs from python's for some characters (e.g. 'ß').
+    Columns that aren't object columns of strings use series.str.capitalize().
+    """
+    strings = to_arrow_strings(series)
+    if strings is None:
+        return series.str.capitalize()
+    encoded = pc.dictionary_encode(strings)
+    unique = encoded.dictionary
+    capitalized = np.array(pc.ascii_capitalize(unique).to_numpy(zero_copy_only=False), dtype=object)
+    non_ascii = ~pc.string_is_ascii(unique).to_numpy(zero_copy_only=False)
+    capitalized[non_ascii] = [value.capitalize() for value in unique.to_numpy(zero_copy_only=False)[non_ascii]]
+    # missing values are kept as they are
+    values = series.to_numpy(dtype=object, copy=True)
+    valid = pc.is_valid(strings).to_numpy(zero_copy_only=False)
+    codes = pc.fill_null(encoded.indices, 0).to_numpy(zero_copy_only=False)
+    values[valid] = capitalized[codes[valid]]
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def species_rows(series: pd.Series):
+    """
+    Finds the rows kept by filter_species: species names (see SPECIES_PATTERN),
+    keeping the first row of each name. Missing values are dropped.
+
+    Returns:
+        (np.ndarray): sorted row positions, None if the column isn't an object column of strings
+    """
+    strings = to_arrow_strings(series)
+    if strings is None:
+        return None
+    matches = pc.fill_null(pc.match_substring_regex(strings, SPECIES_PATTERN), False)
+    positions = np.flatnonzero(matches.to_numpy(zero_copy_only=False))
+    # first row of each name
+    table = pa.table({"name": strings.filter(matches), "position": pa.array(positions, type=pa.int64())})
+    first = table.group_by("name").aggregate([("position", "min")])
+    return np.sort(first["position_min"].to_numpy())
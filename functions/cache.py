@@ -0,0 +1,93 @@
+import os
+import hashlib
+import threading
+import pandas as pd
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Calculates the sha256 hash of a file's contents,
+    reading the file in chunks so large files are not
+    loaded into memory at once.
+
+    Parameters:
+        path (str): path to file
+        chunk_size (int, optional): number of bytes read per chunk. Defaults to 1MB.
+
+    Returns:
+        (str): hex digest of file contents
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class DatasetCache:
+    """
+    Process-wide cache of a parquet dataset.
+    The file is read once and only re-read when its
+    modification time changes and the content hash
+    differs from the cached copy.
+
+    Frames returned by get() are shared between requests,
+    so callers must not modify them in place.
+    """
+
+    usecase = "Caching datasets read from disk"
+
+    def __init__(self, path: str, reader=pd.read_parquet):
+        self.path = path
+        self.reader = reader
+        self.hits = 0
+        self.misses = 0
+        self._data = None
+        self._stat = None
+        self._hash = None
+        self._lock = threading.Lock()
+
+    def get(self) -> pd.DataFrame:
+        """
+        Returns the cached dataset, reloading it from disk
+        if the file has changed since it was last read.
+
+        Raises:
+            FileNotFoundError: if the dataset file does not exist
+        """
+        with self._lock:
+            stat = os.stat(self.path)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            if self._data is not None and stat_key == self._stat:
+                self.hits += 1
+                return self._data
+            # mtime changed, only reload if the contents changed too
+            content_hash = file_hash(self.path)
+            if self._data is not None and content_hash == self._hash:
+                self._stat = stat_key
+                self.hits += 1
+                return self._data
+            self._data = self.reader(self.path)
+            self._stat = stat_key
+            self._hash = content_hash
+            self.misses += 1
+            return self._data
+
+    @property
+    def version(self) -> str:
+        """
+        Content hash of the currently cached dataset,
+        None if the dataset has not been loaded yet.
+        """
+        return self._hash
+
+    def stats(self) -> dict:
+        """
+        Returns hit and miss counters for the cache.
+        """
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "version": self._hash,
+        }
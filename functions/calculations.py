@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -20,6 +21,98 @@ def enforce_float(pd_series: pd.Series):
     return pd_series
 
 
+def _column_max(values: np.ndarray) -> np.ndarray:
+    # maximum of each column ignoring NaN, NaN if a column is all NaN
+    return np.fmax.reduce(values, axis=0)
+
+
+def _column_min(values: np.ndarray) -> np.ndarray:
+    # minimum of each column ignoring NaN, NaN if a column is all NaN
+    return np.fmin.reduce(values, axis=0)
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # columns with a zero (or NaN) denominator are scaled to 0, NaN values stay NaN
+    safe = (denominator != 0) & ~np.isnan(denominator)
+    result = np.divide(numerator, np.where(safe, denominator, 1))
+    return np.where(safe | np.isnan(numerator), result, 0.0)
+
+
+def _divide_max(values):
+    return _safe_divide(values, _column_max(values))
+
+
+def _invert_max(values):
+    return 1 - _divide_max(values)
+
+
+def _min_max(values):
+    minimum = _column_min(values)
+    return _safe_divide(values - minimum, _column_max(values) - minimum)
+
+
+def _percentile_rank(values):
+    return pd.DataFrame(values).rank(method="average", pct=True).to_numpy()
+
+
+def _log(values):
+    if np.any(values < 0):
+        raise ValueError("Log scaling requires values greater than or equal to 0.")
+    logged = np.log1p(values)
+    return _safe_divide(logged, _column_max(logged))
+
+
+# scaling strategy: function that scales each column of a 2D float array
+SCALING_STRATEGIES = {
+    "divide_max": _divide_max,
+    "invert_max": _invert_max,
+    "min_max": _min_max,
+    "rank": _percentile_rank,
+    "log": _log,
+}
+
+
+def scale(data, strategy: str = "divide_max"):
+    """
+    Scales every column of a series, dataframe or array at once.
+    NaN values are ignored when finding the max/ min of a column and
+    stay NaN, columns whose max (or range) is 0 are scaled to 0.
+
+    Strategies:
+        divide_max: divides each value by the column max
+        invert_max: divides each value by the column max and takes this value away from 1
+        min_max: scales the column to between 0 and 1 using the column min and max
+        rank: percentile rank of each value within the column
+        log: log(1 + value) divided by log(1 + column max), values must be >= 0
+
+    Parameters:
+        data (pd.Series, pd.DataFrame or np.ndarray): numeric data to scale
+        strategy (str, optional): scaling strategy. Defaults to "divide_max".
+
+    Returns:
+        scaled data of the same type, index and columns as data
+
+    Raises:
+        ValueError: if strategy is not supported
+    """
+    if strategy not in SCALING_STRATEGIES:
+        raise ValueError(f"Scaling strategy '{strategy}' is not supported, choose from: {list(SCALING_STRATEGIES)}")
+    values = np.asarray(data, dtype=float)
+    one_dimensional = values.ndim == 1
+    if one_dimensional:
+        values = values.reshape(-1, 1)
+    if len(values):
+        with np.errstate(invalid="ignore"):
+            values = SCALING_STRATEGIES[strategy](values)
+    if one_dimensional:
+        values = values.ravel()
+    if isinstance(data, pd.Series):
+        return pd.Series(values, index=data.index, name=data.name)
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(values, index=data.index, columns=data.columns)
+    return values
+
+
 class Calculations:
     """
     Calculations class.
@@ -32,14 +125,19 @@ class Calculations:
         self.series = enforce_float(series)
         self.max_value = self.series.max()
 
+    def scale(self, strategy: str):
+        """
+        Scales the series using one of the SCALING_STRATEGIES.
+        """
+        self.series = scale(self.series, strategy)
+        return self.series
+
     def divide_max(self):
         """
         Divides each row by the maximum row value of the column.
         Datatype of column must be integer.
         """
-
-        self.series = self.series.apply(lambda row: row / self.max_value)
-        return self.series
+        return self.scale("divide_max")
 
     def invert_max(self):
         """
@@ -47,8 +145,7 @@ class Calculations:
         and takes this value away from 1.
         Datatype of column must be integer.
         """
-        self.series = self.series.apply(lambda row: 1 - (row / self.max_value))
-        return self.series
+        return self.scale("invert_max")
 
 def priority_score(df: pd.DataFrame):
     """
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# species and taxonomy columns, stored as categories (dictionary encoded strings)
+# in every dataframe and parquet file the pipeline produces
+CATEGORICAL_COLUMNS = ["full_name", "class", "order", "family", "kingdom", "phylum"]
+
+
+def sorted_categories(series: pd.Series) -> pd.Series:
+    """
+    Converts a column to categories in alphabetical order, so sorting the
+    column sorts by category code in the same order as sorting the strings.
+    Categories already in order are kept as they are.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        if categories.is_monotonic_increasing:
+            return series
+        return series.cat.reorder_categories(sorted(categories))
+    return series.astype("category")
+
+
+def to_categorical(df: pd.DataFrame, columns: list = CATEGORICAL_COLUMNS) -> pd.DataFrame:
+    """
+    Stores the species and taxonomy columns of a dataframe as categories
+    (see sorted_categories). Columns that aren't in the dataframe are skipped.
+
+    Parameters:
+        df (pd.DataFrame): dataframe
+        columns (list, optional): columns to convert. Defaults to CATEGORICAL_COLUMNS.
+
+    Returns:
+        df (pd.DataFrame): copy of dataframe with columns converted
+    """
+    df = df.copy(deep=False)
+    for col in columns:
+        if col in df.columns:
+            df[col] = sorted_categories(df[col])
+    return df
+
+
+def align_categories(frames: list, columns: list = CATEGORICAL_COLUMNS) -> list:
+    """
+    Gives a column the same categories in every dataframe, so dataframes
+    are merged on category codes and merged columns stay categorical.
+
+    Parameters:
+        frames (list): dataframes
+        columns (list, optional): columns to align. Defaults to CATEGORICAL_COLUMNS.
+
+    Returns:
+        (list): copies of the dataframes with aligned columns
+    """
+    frames = [df.copy(deep=False) for df in frames]
+    for col in columns:
+        present = [df for df in frames if col in df.columns]
+        if not present:
+            continue
+        dtypes = [df[col].dtype for df in present]
+        if all(isinstance(dtype, pd.CategoricalDtype) and dtype == dtypes[0] for dtype in dtypes) and dtypes[0].categories.is_monotonic_increasing:
+            continue  # already aligned
+        values = [df[col].cat.categories if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].dropna().unique() for df in present]
+        dtype = pd.CategoricalDtype(sorted(pd.unique(np.concatenate([np.asarray(v, dtype=object) for v in values]))))
+        for df in present:
+            df[col] = df[col].astype(dtype)
+    return frames
+
+
+def read_parquet(path: str, **kwargs) -> pd.DataFrame:
+    """
+    Reads a parquet file with the species and taxonomy columns as categories in
+    alphabetical order, whichever engine wrote the file. Keyword arguments are
+    passed to pd.read_parquet.
+    """
+    return to_categorical(pd.read_parquet(path, **kwargs))
+
+
+def dictionary_schema(schema: pa.Schema, columns: list = CATEGORICAL_COLUMNS) -> pa.Schema:
+    """
+    Returns an Arrow schema with the string columns in columns dictionary encoded.
+    """
+    for i, field in enumerate(schema):
+        if field.name in columns and pa.types.is_string(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.dictionary(pa.int32(), pa.string())))
+    return schema
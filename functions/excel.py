@@ -0,0 +1,100 @@
+import os
+import hashlib
+import zipfile
+import xml.etree.ElementTree as ET
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functions.cache import file_hash
+
+
+def normalise_column(name) -> str:
+    """
+    Lower case column name with '.' replaced by '_', e.g. 'ED.median' -> 'ed_median'.
+    """
+    return str(name).lower().replace(".", "_")
+
+
+def sheet_names(path: str) -> list:
+    """
+    Returns names of the sheets of an .xlsx workbook, in workbook order. Only the
+    workbook's sheet list is read, so this is quick however large the workbook is.
+    """
+    with zipfile.ZipFile(path) as archive:
+        root = ET.fromstring(archive.read("xl/workbook.xml"))
+    return [sheet.get("name") for sheet in root.iter() if sheet.tag.endswith("}sheet")]
+
+
+def parse_sheet(path, sheet: str, columns: list = None) -> pd.DataFrame:
+    """
+    Reads a sheet of an Excel workbook with normalised column names (see normalise_column).
+
+    Parameters:
+        path (str or pd.ExcelFile): path of workbook, or opened workbook
+        sheet (str): name of sheet
+        columns (list, optional): normalised names of the columns to read, other columns are skipped.
+            Defaults to reading every column.
+
+    Returns:
+        (pd.DataFrame): sheet data
+    """
+    usecols = (lambda name: normalise_column(name) in columns) if columns else None
+    df = pd.read_excel(path, sheet_name=sheet, usecols=usecols, engine="openpyxl")
+    df.columns = [normalise_column(col) for col in df.columns]
+    return df
+
+
+def parse_sheets(path: str, sheets: list, columns: list = None, max_workers: int = None) -> list:
+    """
+    Reads sheets of an Excel workbook in parallel, one sheet per process.
+    Each process opens the workbook, so with one process (or one CPU) the
+    workbook is instead opened once and its sheets read in turn.
+
+    Returns:
+        (list): dataframe of each sheet, in the order of sheets
+    """
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sheets))
+    if max_workers < 2:
+        book = pd.ExcelFile(path, engine="openpyxl")
+        return [parse_sheet(book, sheet, columns) for sheet in sheets]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(parse_sheet, [path] * len(sheets), sheets, [columns] * len(sheets)))
+
+
+def read_excel_sheets(path: str, select_sheet=None, columns: list = None, cache_dir: str = None, max_workers: int = None) -> pd.DataFrame:
+    """
+    Reads and combines sheets of an Excel workbook. Sheets are parsed in
+    parallel and, if cache_dir is given, the result is saved as parquet
+    named by the hash of the workbook's contents (and of the sheets and
+    columns read), so the workbook is only parsed again when it changes.
+
+    Parameters:
+        path (str): path of workbook
+        select_sheet (function, optional): takes a sheet name and returns True if the sheet should be read.
+            Defaults to reading every sheet.
+        columns (list, optional): normalised names of the columns to read (see parse_sheet)
+        cache_dir (str, optional): folder parquet cache is saved in
+        max_workers (int, optional): maximum processes used to parse sheets. Defaults to number of CPUs.
+
+    Returns:
+        (pd.DataFrame): rows of every read sheet, in sheet order
+    """
+    sheets = [sheet for sheet in sheet_names(path) if select_sheet is None or select_sheet(sheet)]
+
+    cache_path = None
+    if cache_dir:
+        options = hashlib.sha256(repr((sheets, sorted(columns or []))).encode("utf-8")).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{file_hash(path)[:16]}.{options[:8]}.parquet")
+        if os.path.exists(cache_path):
+            return pd.read_parquet(cache_path)
+
+    df = pd.concat(parse_sheets(path, sheets, columns, max_workers), ignore_index=True)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # remove caches of earlier versions of the workbook
+        prefix = os.path.basename(path) + "."
+        for name in os.listdir(cache_dir):
+            if name.startswith(prefix) and name.endswith(".parquet"):
+                os.remove(os.path.join(cache_dir, name))
+        df.to_parquet(cache_path)
+    return df
@@ -0,0 +1,149 @@
+import zlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# download format: (mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrow"),
+}
+
+
+class ChunkSink:
+    """
+    Write-only file object that collects the bytes written by
+    pyarrow writers so they can be yielded as they are produced.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """
+        Returns and clears the bytes written since the last drain.
+        """
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_schema(data: pd.DataFrame) -> pa.Schema:
+    """
+    Returns the Arrow schema of a dataframe, typing object and categorical
+    columns as strings so every chunk is written with the same schema.
+    """
+    schema = pa.Schema.from_pandas(data.iloc[:0], preserve_index=False)
+    for i, name in enumerate(schema.names):
+        if data[name].dtype == object or isinstance(data[name].dtype, pd.CategoricalDtype):
+            schema = schema.set(i, pa.field(name, pa.string()))
+    return schema
+
+
+def iter_chunks(data: pd.DataFrame, positions: np.ndarray, chunk_size: int = 10000):
+    """
+    Yields the rows at positions as dataframes of
+    at most chunk_size rows, in order of positions.
+    """
+    for start in range(0, len(positions), chunk_size):
+        yield data.iloc[positions[start:start + chunk_size]]
+
+
+def stream_csv(chunks):
+    """
+    Yields a csv file, one encoded chunk at a time.
+    """
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+
+def stream_csv_gzip(chunks):
+    """
+    Yields a gzip compressed csv file, one compressed chunk at a time.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    for csv_bytes in stream_csv(chunks):
+        compressed = compressor.compress(csv_bytes)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_parquet(chunks, schema: pa.Schema):
+    """
+    Yields a parquet file, writing one row group per chunk.
+    """
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_arrow(chunks, schema: pa.Schema):
+    """
+    Yields an Arrow IPC stream, writing one record batch per chunk.
+    """
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for chunk in chunks:
+            writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_export(data: pd.DataFrame, positions: np.ndarray, export_format: str, chunk_size: int = 10000):
+    """
+    Streams the rows of data at positions in the requested file format.
+    Only one chunk of rows is converted at a time, so memory use doesn't
+    grow with the size of the download.
+
+    Parameters:
+        data (pd.DataFrame): dataset to download
+        positions (np.ndarray): row positions to download, in download order
+        export_format (str): one of 'csv', 'csv.gz', 'parquet' or 'arrow'
+        chunk_size (int, optional): number of rows converted at a time. Defaults to 10000.
+
+    Returns:
+        generator of bytes
+
+    Raises:
+        ValueError: if export_format is not supported
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Download format '{export_format}' is not supported, choose from: {list(EXPORT_FORMATS)}")
+    chunks = iter_chunks(data, positions, chunk_size)
+    if export_format in ["csv", "csv.gz"]:
+        # csv header is written with the first chunk, so write an empty chunk if no rows matched
+        if not len(positions):
+            chunks = iter([data.iloc[:0]])
+        return stream_csv(chunks) if export_format == "csv" else stream_csv_gzip(chunks)
+    schema = arrow_schema(data)
+    if export_format == "parquet":
+        return stream_parquet(chunks, schema)
+    return stream_arrow(chunks, schema)
@@ -0,0 +1,507 @@
+import os
+import json
+import math
+import time
+import hashlib
+import datetime
+import random
+import asyncio
+import aiohttp
+
+
+# statuses worth retrying, the server is overloaded or rate limiting requests
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """
+    Raised when a request fails and shouldn't, or can no longer, be retried.
+    """
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket rate limiter. Tokens are added at a
+    steady rate up to capacity, and every request takes a token,
+    waiting (without blocking the event loop) until one is available.
+
+    Parameters:
+        rate (float): tokens added per second, i.e. the sustained requests per second
+        capacity (int, optional): maximum tokens held, i.e. the size of a burst of requests. Defaults to 1.
+    """
+
+    usecase = "Limiting the rate of API requests"
+
+    def __init__(self, rate: float, capacity: int = 1, clock=time.monotonic, sleep=asyncio.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """
+        Waits until a token is available and takes it.
+        """
+        # requests queue on the lock so tokens are handed out in order
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await self.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class AsyncFetcher:
+    """
+    Makes rate limited, concurrent GET requests for JSON with aiohttp.
+    Responses with a status in RETRY_STATUSES, and connection errors,
+    are retried with exponential backoff (a Retry-After header is
+    respected if longer).
+
+    Parameters:
+        rate (float, optional): requests per second. Defaults to 2.
+        burst (int, optional): requests that can be made at once before rate limiting. Defaults to 1.
+        concurrency (int, optional): maximum requests in flight. Defaults to 4.
+        retries (int, optional): retries of a failed request before giving up. Defaults to 4.
+        backoff (float, optional): seconds waited before the first retry, doubled after every retry. Defaults to 1.
+    """
+
+    usecase = "Fetching pages of API data concurrently without overloading the server"
+
+    def __init__(self, rate: float = 2, burst: int = 1, concurrency: int = 4, retries: int = 4, backoff: float = 1, sleep=asyncio.sleep):
+        self.limiter = TokenBucket(rate, burst, sleep=sleep)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.requests = 0
+
+    def delay(self, attempt: int, retry_after: str = None) -> float:
+        """
+        Seconds to wait before retrying, doubling with each attempt, plus jitter.
+        """
+        wait = self.backoff * 2 ** attempt * (1 + random.random() / 10)
+        if retry_after and retry_after.isdigit():
+            wait = max(wait, float(retry_after))
+        return wait
+
+    async def request(self, session: aiohttp.ClientSession, url: str, params: dict = None, headers: dict = None) -> tuple:
+        """
+        Gets url, retrying on server errors and rate limiting.
+
+        Returns:
+            (tuple): response status, JSON content and response headers.
+                Content is None if the url was not found (404) or not modified since
+                the ETag/ date in headers (304).
+
+        Raises:
+            FetchError: if the token is invalid, the response status isn't retryable,
+                or the request still fails after all retries
+        """
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            async with self.semaphore:
+                await self.limiter.acquire()
+                self.requests += 1
+                try:
+                    async with session.get(url, params=params, headers=headers) as response:
+                        text = await response.text()
+                        if text == '{"message":"Token not valid!"}':
+                            raise FetchError("Token not valid!")
+                        if response.status == 200:
+                            return response.status, await response.json(content_type=None), response.headers
+                        if response.status in [304, 404]:
+                            return response.status, None, response.headers
+                        if response.status not in RETRY_STATUSES:
+                            raise FetchError(f"Request failed with response status: {response.status}")
+                        error = f"response status {response.status}"
+                        retry_after = response.headers.get("Retry-After")
+                except aiohttp.ClientError as e:
+                    error = str(e) or type(e).__name__
+            # wait outside the semaphore, so other requests can use the slot
+            if attempt < self.retries:
+                await self.sleep(self.delay(attempt, retry_after))
+        raise FetchError(f"Request to {url} failed after {self.retries + 1} attempts, last error: {error}")
+
+    async def get_json(self, session: aiohttp.ClientSession, url: str, params: dict = None):
+        """
+        Gets url, retrying on server errors and rate limiting (see request).
+
+        Returns:
+            JSON response content, or None if the url was not found (404)
+        """
+        _, content, _ = await self.request(session, url, params=params)
+        return content
+
+    async def get_many(self, session: aiohttp.ClientSession, urls: list) -> list:
+        """
+        Gets several urls concurrently.
+
+        Returns:
+            (list): JSON content of each url, in the order of urls
+        """
+        return await asyncio.gather(*[self.get_json(session, url) for url in urls])
+
+
+def client_session(concurrency: int = 4, headers: dict = None, connect_timeout: float = 5, read_timeout: float = 30) -> aiohttp.ClientSession:
+    """
+    Creates an aiohttp session that keeps up to concurrency connections open to
+    each host for reuse, with the same timeouts as functions.http_client.HttpClient.
+    aiohttp accepts gzip/ deflate compressed responses by default.
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency),
+        timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+        headers=headers,
+    )
+
+
+def page_count(total: int, page_size: int) -> int:
+    """
+    Number of pages needed for total records, at least one page.
+    """
+    return max(1, math.ceil(total / page_size))
+
+
+async def probe_page_count(fetch_page, is_empty, batch_size: int = 4, start: int = 0, max_pages: int = 1000) -> list:
+    """
+    Fetches pages in concurrent batches until a page is missing or empty,
+    for APIs that don't report how many pages there are.
+
+    Parameters:
+        fetch_page (coroutine function): takes a page number and returns its content, or None if not found
+        is_empty (function): takes page content and returns True if it has no records
+        batch_size (int, optional): pages requested at a time. Defaults to 4.
+        start (int, optional): number of first page. Defaults to 0.
+        max_pages (int, optional): stop after this many pages. Defaults to 1000.
+
+    Returns:
+        pages (list): content of each page with records, in page order
+    """
+    pages = []
+    for first in range(start, start + max_pages, batch_size):
+        batch = await asyncio.gather(*[fetch_page(n) for n in range(first, min(first + batch_size, start + max_pages))])
+        for page in batch:
+            if page is None or is_empty(page):
+                return pages
+            pages.append(page)
+    return pages
+
+
+INDEX_FILE = "index.json"
+# details of the last run (e.g. harvest time), kept out of the index so the index
+# only changes when pages change, as the pipeline fingerprints it
+RUN_FILE = "last_run.json"
+RUN_FIELDS = ["harvested_at", "not_modified", "synced_at"]
+
+
+def page_file(page_number: int) -> str:
+    """
+    File name of a saved page, zero padded so files sort in page order.
+    """
+    return f"page_{page_number:05d}.json"
+
+
+def write_json(path: str, content) -> bytes:
+    """
+    Writes content as JSON, replacing path only once the write has finished
+    so an interrupted run doesn't leave a partial file.
+
+    Returns:
+        (bytes): the JSON written
+    """
+    data = json.dumps(content).encode("utf-8")
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return data
+
+
+def read_json(path: str):
+    """
+    Reads a JSON file, returning None if it doesn't exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_page(out_dir: str, page_number: int, content, response_headers=None) -> dict:
+    """
+    Saves a page of API content to out_dir.
+
+    Parameters:
+        out_dir (str): folder page is saved to
+        page_number (int): number of page
+        content: JSON content of page
+        response_headers (optional): headers of the response, its ETag and
+            Last-Modified values are kept for conditional requests
+
+    Returns:
+        (dict): index entry of page, its number, file name, sha256 hash of its content
+            and the ETag/ Last-Modified values of its response (if given)
+    """
+    data = write_json(os.path.join(out_dir, page_file(page_number)), content)
+    entry = {"page": page_number, "file": page_file(page_number), "sha256": hashlib.sha256(data).hexdigest()}
+    for header, key in [("ETag", "etag"), ("Last-Modified", "last_modified")]:
+        if response_headers and response_headers.get(header):
+            entry[key] = response_headers[header]
+    return entry
+
+
+def conditional_headers(entry: dict) -> dict:
+    """
+    Request headers asking the server to only send a page if it has
+    changed since it was saved, from the page's index entry.
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def utc_timestamp() -> str:
+    """
+    Current time in ISO 8601 format (UTC), as used by the updated_since filter of the Species+ API.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ResponseStore:
+    """
+    Pages of API responses saved in a folder, with a manifest (index.json)
+    of each page's file, content hash and ETag/ Last-Modified values. The saved pages are
+    a snapshot of the API data that can be refreshed incrementally.
+    Details of the last run, including the time of the last sync, are saved
+    separately (last_run.json), so the manifest is unchanged by a run that
+    doesn't change any page.
+
+    Parameters:
+        directory (str): folder pages are saved in
+    """
+
+    usecase = "Incremental refreshes of API data"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @property
+    def manifest(self) -> dict:
+        return read_json(os.path.join(self.directory, INDEX_FILE))
+
+    @property
+    def last_synced(self) -> str:
+        """
+        Time of the last sync (see utc_timestamp), or None if never synced.
+        Manifests written by earlier versions held the time of the last sync.
+        """
+        return self.last_run.get("synced_at") or (self.manifest or {}).get("synced_at")
+
+    def entries(self) -> dict:
+        """
+        Returns index entry of each saved page, keyed by page number.
+        """
+        return {entry["page"]: entry for entry in (self.manifest or {}).get("pages", [])}
+
+    def pages(self):
+        """
+        Yields the content of each saved page, in page order.
+        """
+        for entry in (self.manifest or {}).get("pages", []):
+            yield read_json(os.path.join(self.directory, entry["file"]))
+
+    @property
+    def last_run(self) -> dict:
+        """
+        Details of the last run, e.g. time of harvest and number of pages not modified.
+        """
+        return read_json(os.path.join(self.directory, RUN_FILE)) or {}
+
+    def write_last_run(self, **fields) -> dict:
+        """
+        Saves details of a run, keeping other fields of the last run unless given.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        last_run = {**self.last_run, **fields}
+        write_json(os.path.join(self.directory, RUN_FILE), last_run)
+        return last_run
+
+    def save_harvest(self, entries: list, url: str, not_modified: int = 0) -> dict:
+        """
+        Saves the manifest of harvested pages, and the time of the harvest and
+        number of pages not modified as details of the last run.
+
+        Returns:
+            (dict): manifest, with the time of harvest and number of pages not modified
+        """
+        manifest = self.write_manifest(entries, url=url)
+        harvest = {"harvested_at": time.time(), "not_modified": not_modified}
+        self.write_last_run(**harvest)
+        return {**manifest, **harvest}
+
+    def write_manifest(self, entries: list, **fields) -> dict:
+        """
+        Saves the manifest of pages, keeping other fields of the existing manifest
+        unless given, and removes saved pages that are no longer in the manifest.
+        Run details written to the manifest by earlier versions are moved to the last run details.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.manifest or {}
+        legacy = {key: existing[key] for key in RUN_FIELDS if key in existing}
+        if legacy:
+            self.write_last_run(**{**legacy, **self.last_run})
+        existing = {key: value for key, value in existing.items() if key not in RUN_FIELDS}
+        manifest = {**existing, **fields, "pages": entries}
+        write_json(os.path.join(self.directory, INDEX_FILE), manifest)
+        saved = {entry["file"] for entry in entries}
+        for name in os.listdir(self.directory):
+            if name.startswith("page_") and name not in saved:
+                os.remove(os.path.join(self.directory, name))
+        return manifest
+
+    def mark_synced(self, synced_at: str):
+        """
+        Records the time of a sync, which should be taken before its first request
+        so records changed during the sync are fetched by the next one.
+        The time is saved with the last run details, not the manifest.
+        """
+        self.write_last_run(synced_at=synced_at)
+
+    def merge_records(self, records: list, records_field: str, key: str = "id", page_size: int = 500) -> dict:
+        """
+        Merges changed records into the saved pages. Saved records with the same key
+        as a changed record are replaced, other changed records are added in new pages.
+        Pages are read and rewritten one at a time.
+
+        Parameters:
+            records (list): changed records
+            records_field (str): field of page content holding the records, e.g. 'taxon_concepts'
+            key (str, optional): field identifying a record. Defaults to 'id'.
+            page_size (int, optional): records per added page. Defaults to 500.
+
+        Returns:
+            (dict): number of records updated and added
+        """
+        changed = {record[key]: record for record in records}
+        entries = []
+        updated = 0
+        for entry in self.entries().values():
+            content = read_json(os.path.join(self.directory, entry["file"]))
+            saved_records = content[records_field]
+            merged = [changed.pop(record[key], record) for record in saved_records]
+            replaced = sum(new is not old for new, old in zip(merged, saved_records))
+            if replaced:
+                content[records_field] = merged
+                # the page no longer matches the server's, so isn't saved with its ETag
+                entry = write_page(self.directory, entry["page"], content)
+                updated += replaced
+            entries.append(entry)
+        added = list(changed.values())
+        next_page = entries[-1]["page"] + 1 if entries else 1
+        for start in range(0, len(added), page_size):
+            entries.append(write_page(self.directory, next_page, {records_field: added[start:start + page_size]}))
+            next_page += 1
+        self.write_manifest(entries)
+        return {"updated": updated, "added": len(added)}
+
+
+async def harvest_pages(fetcher: AsyncFetcher, session: aiohttp.ClientSession, url: str, out_dir: str, count_pages,
+                        params: dict = None, page_param: str = "page", first_page: int = 1, validate=None,
+                        conditional: bool = False) -> dict:
+    """
+    Fetches every page of a paginated API, writing each page to out_dir as it
+    arrives so only the pages in flight are held in memory. The first page is
+    fetched alone to read the number of pages, the rest are fetched concurrently.
+    A manifest of the pages is written to out_dir once every page is saved (see
+    ResponseStore), and pages left from an earlier, longer harvest are removed.
+    The time of the harvest is saved with the last run details, not the manifest.
+
+    Parameters:
+        fetcher (AsyncFetcher): fetcher used for requests, which limits their rate and concurrency
+        session (aiohttp.ClientSession): session used for requests
+        url (str): url of API endpoint, a '{page}' placeholder is replaced by the page number,
+            otherwise the page number is sent as the page_param query parameter
+        out_dir (str): folder pages are saved to
+        count_pages (function): takes content of the first page and returns the number of pages
+        params (dict, optional): query parameters added to every request
+        page_param (str, optional): name of the page number query parameter. Defaults to 'page'.
+        first_page (int, optional): number of the first page. Defaults to 1.
+        validate (function, optional): called with the content of each page before it is saved
+        conditional (bool, optional): only download pages that have changed since they were saved,
+            using the ETag/ Last-Modified values of the saved pages. Defaults to False.
+
+    Returns:
+        manifest (dict): url, time of harvest, number of pages not modified and
+            index entry (see write_page) of each page in page order
+
+    Raises:
+        FetchError: if a page isn't found or can't be fetched
+    """
+    store = ResponseStore(out_dir)
+    previous = store.entries() if conditional else {}
+    os.makedirs(out_dir, exist_ok=True)
+
+    async def get_page(page_number):
+        """
+        Returns the page content and response headers, or the saved page's entry if it's not modified.
+        """
+        if "{page}" in url:
+            page_url, page_params = url.format(page=page_number), params
+        else:
+            page_url, page_params = url, {**(params or {}), page_param: page_number}
+        entry = previous.get(page_number)
+        saved = entry is not None and os.path.exists(os.path.join(out_dir, entry["file"]))
+        headers = conditional_headers(entry) if saved else None
+        status, content, response_headers = await fetcher.request(session, page_url, params=page_params, headers=headers or None)
+        if status == 304 and saved:
+            return entry, None, None
+        if content is None:
+            raise FetchError(f"Page {page_number} of {url} not found")
+        if validate:
+            validate(content)
+        return None, content, response_headers
+
+    async def save_page(page_number):
+        entry, content, response_headers = await get_page(page_number)
+        if entry is not None:
+            return entry
+        # write in a thread so other responses are read meanwhile
+        return await asyncio.to_thread(write_page, out_dir, page_number, content, response_headers)
+
+    entry, content, response_headers = await get_page(first_page)
+    if entry is not None:
+        content = read_json(os.path.join(out_dir, entry["file"]))
+    else:
+        entry = write_page(out_dir, first_page, content, response_headers)
+    last_page = first_page + count_pages(content)
+    del content
+    entries = [entry] + await asyncio.gather(*[save_page(n) for n in range(first_page + 1, last_page)])
+
+    not_modified = sum(entry is previous.get(entry["page"]) for entry in entries)
+    return store.save_harvest(entries, url, not_modified)
+
+
+def iter_pages(out_dir: str):
+    """
+    Yields the content of each page saved by harvest_pages, in page order.
+
+    Raises:
+        FileNotFoundError: if out_dir has no saved pages
+    """
+    store = ResponseStore(out_dir)
+    if store.manifest is None:
+        raise FileNotFoundError(f"No saved pages in {out_dir}, API data needs to be retrieved first")
+    return store.pages()
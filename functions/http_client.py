@@ -0,0 +1,82 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """
+    Pooled, keep-alive HTTP client. Connections to each host are kept open
+    and reused between requests, instead of a new connection (and TLS
+    handshake) being made for every request. gzip/ deflate compressed
+    responses are accepted, requests time out, and failed connections and
+    server errors (429, 5xx) are retried with exponential backoff.
+
+    Parameters:
+        connect_timeout (float, optional): seconds to wait to connect to server. Defaults to 5.
+        read_timeout (float, optional): seconds to wait for server to send data. Defaults to 30.
+        pool_connections (int, optional): number of hosts connections are kept open for. Defaults to 10.
+        max_per_host (int, optional): maximum open connections to each host, requests wait for
+            a free connection once reached. Defaults to 10.
+        retries (int, optional): retries of a failed request. Defaults to 3.
+        backoff (float, optional): backoff factor of retries, waits are backoff * 2 ** retry seconds. Defaults to 0.5.
+    """
+
+    usecase = "Reusing connections between API requests"
+
+    def __init__(self, connect_timeout: float = 5, read_timeout: float = 30, pool_connections: int = 10,
+                 max_per_host: int = 10, retries: int = 3, backoff: float = 0.5):
+        self.timeout = (connect_timeout, read_timeout)
+        # failed responses are returned after the last retry (raise_on_status=False),
+        # so errors are raised from the response status as before
+        self.retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD"],
+            raise_on_status=False,
+        )
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=max_per_host, pool_block=True, max_retries=self.retry)
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: dict = None, **kwargs) -> requests.Response:
+        """
+        Makes a GET request with the client's timeout, unless another is given.
+        """
+        with self._lock:
+            self.requests += 1
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, headers=headers or None, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Returns connection reuse counters: requests made by the client, and the
+        connections opened and requests sent by each host's connection pool.
+        Requests sent beyond connections opened reused a kept-alive connection.
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            hosts[host] = {
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+                "reused": max(0, pool.num_requests - pool.num_connections),
+            }
+        return {
+            "requests": self.requests,
+            "connections": sum(host["connections"] for host in hosts.values()),
+            "reused": sum(host["reused"] for host in hosts.values()),
+            "hosts": hosts,
+        }
+
+    def close(self):
+        self.session.close()
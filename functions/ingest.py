@@ -0,0 +1,83 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from functions.utils import clean_dataframe, validate_df_schema
+
+
+# python types used in dataframe schemas and their Arrow types
+ARROW_TYPES = {
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bool: pa.bool_(),
+}
+
+
+def schema_to_arrow(schema: dict) -> pa.Schema:
+    """
+    Converts a dataframe schema of column names and python types
+    (as used by validate_df_schema) to an Arrow schema, keeping column order.
+    """
+    return pa.schema([pa.field(col, ARROW_TYPES[expected_type]) for col, expected_type in schema.items()])
+
+
+def clean_chunks(pages, to_frame, taxa_dict: dict, schema: dict = None):
+    """
+    Converts pages of API data to dataframes and cleans them one at a time,
+    so only one page is held in memory before it is cleaned.
+    full_name is kept unique across chunks, keeping the first occurrence,
+    as if every page had been cleaned as one dataframe.
+
+    Parameters:
+        pages (iterable): pages of API data, e.g. from functions.fetch.iter_pages
+        to_frame (function): takes a page and returns its records as a dataframe
+        taxa_dict (dict): taxonomy replacement dictionaries (see clean_dataframe)
+        schema (dict, optional): schema each cleaned chunk is validated against (see validate_df_schema)
+
+    Yields:
+        (pd.DataFrame): cleaned chunk of each page with records
+    """
+    seen = set()
+    for page in pages:
+        df = to_frame(page)
+        if df.empty:
+            continue
+        df = clean_dataframe(df, taxa_dict)
+        # drop species already in an earlier chunk
+        df = df[~df["full_name"].isin(seen)].reset_index(drop=True)
+        seen.update(df["full_name"])
+        if schema:
+            validate_df_schema(df, schema)
+        yield df
+
+
+def concat_chunks(chunks) -> pd.DataFrame:
+    """
+    Combines chunks of a dataframe, returning an empty dataframe if there are none.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_parquet_chunks(chunks, path: str, schema: pa.Schema) -> int:
+    """
+    Appends chunks of a dataframe to a parquet file, one row group per chunk,
+    so the whole dataframe is never held in memory. Every chunk is cast to
+    schema, so the file has the same column types however values vary between chunks.
+
+    Parameters:
+        chunks (iterable): dataframes with the columns of schema
+        path (str): path of parquet file
+        schema (pa.Schema): schema of parquet file
+
+    Returns:
+        rows (int): number of rows written
+    """
+    rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk[schema.names], schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from functions.categorical import align_categories
+
+
+def first_valid(targets: np.ndarray, valid: np.ndarray):
+    """
+    Finds the first valid row of each target.
+
+    Parameters:
+        targets (np.ndarray): target (e.g. species key) of each row, -1 for rows without a target
+        valid (np.ndarray): boolean mask of rows with a value
+
+    Returns:
+        targets (np.ndarray): targets with a valid row, in order of their first valid row
+        rows (np.ndarray): position of the first valid row of each target
+    """
+    rows = np.flatnonzero(valid & (targets >= 0))
+    first = ~pd.Series(targets[rows]).duplicated().to_numpy()
+    return targets[rows][first], rows[first]
+
+
+def join_species(frames: list, key: str = "full_name", class_column: str = "class") -> pd.DataFrame:
+    """
+    Joins the value columns of data sources into one row per species.
+    Each species is given an integer key once (its category code), and each source's
+    value columns are written into arrays preallocated for every species, instead
+    of outer merging the sources in turn and grouping the result.
+
+    The first non-null value of a species in each source is kept. A species' class
+    is taken from the first source, in the order frames are given, that has a class
+    for it, so a species with different classes in different sources always gets the
+    same class. Rows without a species are dropped.
+
+    Parameters:
+        frames (list): dataframes of each source, in order of class priority, with key,
+            class_column and value columns. Value columns must be unique across sources.
+        key (str, optional): species column. Defaults to "full_name".
+        class_column (str, optional): class column. Defaults to "class".
+
+    Returns:
+        (pd.DataFrame): key, class_column, then the value columns of each source,
+            one row per species sorted by species, with key and class as categories
+
+    Raises:
+        ValueError: if a value column is in more than one source
+    """
+    value_columns = [col for df in frames for col in df.columns if col not in [key, class_column]]
+    duplicated = sorted({col for col in value_columns if value_columns.count(col) > 1})
+    if duplicated:
+        raise ValueError(f"Value columns are in more than one source: {duplicated}")
+
+    # species and class share categories (sorted) across sources, so codes are keys
+    frames = align_categories(frames, [key, class_column])
+    species = frames[0][key].cat.categories
+    classes = frames[0][class_column].cat.categories
+    codes = [df[key].cat.codes.to_numpy() for df in frames]
+
+    # one result row for each species in any source, in category (alphabetical) order
+    present = np.zeros(len(species), dtype=bool)
+    for source_codes in codes:
+        present[source_codes[source_codes >= 0]] = True
+    species_codes = np.flatnonzero(present)
+    positions = np.full(len(species) + 1, -1)  # codes of missing species (-1) index the last position
+    positions[species_codes] = np.arange(len(species_codes))
+
+    result = {}
+    class_codes = np.full(len(species_codes), -1)
+    for df, source_codes in zip(frames, codes):
+        targets = positions[source_codes]
+        # class of species that don't have a class from an earlier source
+        source_classes = df[class_column].cat.codes.to_numpy()
+        found, rows = first_valid(targets, source_classes >= 0)
+        unset = class_codes[found] < 0
+        class_codes[found[unset]] = source_classes[rows[unset]]
+
+        for col in df.columns.drop([key, class_column]):
+            values = df[col].to_numpy()
+            found, rows = first_valid(targets, pd.notna(values))
+            if values.dtype.kind in "iu" and len(found) == len(species_codes):
+                # integer columns stay integers when every species has a value
+                column = np.empty(len(species_codes), dtype=values.dtype)
+            else:
+                column = np.full(len(species_codes), np.nan, dtype=float if values.dtype.kind in "iuf" else object)
+            column[found] = values[rows]
+            result[col] = column
+
+    return pd.DataFrame({
+        key: pd.Categorical.from_codes(species_codes, species),
+        class_column: pd.Categorical.from_codes(class_codes, classes),
+        **result,
+    })
@@ -0,0 +1,279 @@
+import os
+import sys
+import ast
+import json
+import time
+import hashlib
+import subprocess
+from configparser import ConfigParser
+from functions.cache import file_hash
+
+
+class Stage:
+    """
+    A step of the data pipeline: a script along with the
+    files it reads (inputs) and the files it writes (outputs).
+    Stages that read another stage's outputs depend on that stage.
+
+    Parameters:
+        name (str): name of stage
+        script (str): path to the python script that runs the stage
+        inputs (list, optional): paths of files read by the stage
+        outputs (list, optional): paths of files written by the stage
+        always_run (bool, optional): run the stage even if its inputs are unchanged,
+            e.g. for stages that fetch data from an API. Defaults to False.
+        config_sections (list, optional): sections of config.ini read by the stage
+    """
+
+    def __init__(self, name: str, script: str, inputs: list = None, outputs: list = None, always_run: bool = False, config_sections: list = None):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.always_run = always_run
+        self.config_sections = list(config_sections or [])
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+def fingerprint(paths: list) -> str:
+    """
+    Calculates a single hash of the contents of several files.
+    Missing files are included in the hash as missing, so a stage
+    is rerun once the file is created.
+
+    Parameters:
+        paths (list): file paths
+
+    Returns:
+        (str): hex digest
+    """
+    sha = hashlib.sha256()
+    for path in paths:
+        sha.update(path.encode("utf-8"))
+        sha.update(file_hash(path).encode("utf-8") if os.path.exists(path) else b"missing")
+    return sha.hexdigest()
+
+
+def module_paths(name: str, search_paths: list) -> list:
+    """
+    Returns the files of a module and the packages containing it (e.g. 'functions.utils'
+    -> functions/__init__.py, functions/utils.py), from the first search path that has it.
+    Modules that aren't in any search path (standard library, installed packages) have no files.
+    """
+    parts = name.split(".")
+    for root in search_paths:
+        files = []
+        for i in range(1, len(parts) + 1):
+            base = os.path.join(root, *parts[:i])
+            if os.path.isfile(os.path.join(base, "__init__.py")):
+                files.append(os.path.join(base, "__init__.py"))
+            elif i == len(parts) and os.path.isfile(base + ".py"):
+                files.append(base + ".py")
+            elif not (i < len(parts) and os.path.isdir(base)):
+                # not a module, folders without __init__.py are allowed as namespace packages
+                files = []
+                break
+        if files:
+            return files
+    return []
+
+
+def imported_modules(script: str, search_paths: list) -> list:
+    """
+    Finds the project modules imported by a script, directly or through other
+    project modules, so a stage reruns when shared code it uses changes.
+    Imports are read from the source without running it.
+
+    Parameters:
+        script (str): path to python script
+        search_paths (list): folders imports are resolved from, as on the script's sys.path
+
+    Returns:
+        (list): sorted paths of imported module files
+    """
+    found = set()
+    pending = [script]
+    while pending:
+        path = pending.pop()
+        try:
+            with open(path, encoding="utf-8") as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [(alias.name, search_paths) for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                paths = search_paths
+                if node.level:
+                    # relative import, resolved from the package of the importing module
+                    paths = [os.path.dirname(path)]
+                    for _ in range(node.level - 1):
+                        paths = [os.path.dirname(paths[0])]
+                # imported names can be modules too, e.g. 'from functions import arrow_strings'
+                names = [node.module] if node.module else []
+                names += [".".join(filter(None, [node.module, alias.name])) for alias in node.names]
+                modules = [(name, paths) for name in names]
+            else:
+                continue
+            for name, paths in modules:
+                for module_file in module_paths(name, paths):
+                    if module_file not in found:
+                        found.add(module_file)
+                        pending.append(module_file)
+    found.discard(script)
+    return sorted(found)
+
+
+def config_fingerprint(config_path: str, sections: list) -> str:
+    """
+    Calculates a hash of the values in sections of a config file,
+    so only changes to the sections a stage reads rerun it.
+    Missing sections are included in the hash as missing.
+    """
+    config = ConfigParser()
+    config.read(config_path)
+    sha = hashlib.sha256()
+    for section in sections:
+        sha.update(section.encode("utf-8"))
+        values = sorted(config[section].items()) if config.has_section(section) else "missing"
+        sha.update(json.dumps(values).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def run_script(stage: Stage, cwd: str = None):
+    """
+    Runs a stage's script in a separate python process.
+
+    Raises:
+        RuntimeError: if the script exits with an error
+    """
+    result = subprocess.run([sys.executable, stage.script], cwd=cwd)
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage '{stage.name}' failed with exit code {result.returncode}, pipeline stopped.")
+
+
+class PipelineRunner:
+    """
+    Runs pipeline stages in dependency order, skipping stages whose
+    script, imported project modules, input files and config sections
+    haven't changed since they last ran and whose outputs still exist.
+    Fingerprints of the last successful run of each stage are saved to
+    a JSON state file.
+
+    Parameters:
+        stages (list): pipeline stages
+        state_path (str): path of JSON state file
+        run_stage (callable, optional): function that runs a stage. Defaults to run_script.
+        root (str, optional): project root, imports are resolved from it and the script's folder
+        config_path (str, optional): path of config.ini, read for each stage's config_sections
+    """
+
+    usecase = "Incremental rebuilds of the app data"
+
+    def __init__(self, stages: list, state_path: str, run_stage=run_script, root: str = None, config_path: str = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.run_stage = run_stage
+        self.root = root
+        self.config_path = config_path
+
+    def dependencies(self, stage: Stage) -> list:
+        """
+        Returns the names of stages that write one of stage's inputs.
+        """
+        return [other.name for other in self.stages.values() if other is not stage and set(other.outputs) & set(stage.inputs)]
+
+    def order(self, targets: list = None) -> list:
+        """
+        Sorts stages so every stage comes after the stages it depends on.
+        If targets are given only those stages and their dependencies are returned.
+
+        Raises:
+            KeyError: if a target isn't a stage
+            ValueError: if stages depend on each other in a cycle
+        """
+        for target in targets or []:
+            if target not in self.stages:
+                raise KeyError(f"Stage '{target}' is not in the pipeline: {list(self.stages)}")
+        ordered = []
+        visiting = set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline stages form a cycle at stage '{name}'")
+            visiting.add(name)
+            for dependency in self.dependencies(self.stages[name]):
+                visit(dependency)
+            visiting.discard(name)
+            ordered.append(name)
+
+        for name in targets or self.stages:
+            visit(name)
+        return [self.stages[name] for name in ordered]
+
+    def stage_fingerprint(self, stage: Stage) -> str:
+        """
+        Hash of a stage's script, the project modules it imports, its input files
+        and the config sections it reads.
+        """
+        search_paths = [os.path.dirname(stage.script)] + ([self.root] if self.root else [])
+        digest = fingerprint([stage.script] + imported_modules(stage.script, search_paths) + stage.inputs)
+        if stage.config_sections and self.config_path:
+            digest = hashlib.sha256((digest + config_fingerprint(self.config_path, stage.config_sections)).encode("utf-8")).hexdigest()
+        return digest
+
+    def load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def save_state(self, state: dict):
+        with open(self.state_path, "w") as f:
+            json.dump(state, f, indent=2)
+
+    def run(self, targets: list = None, force: bool = False) -> list:
+        """
+        Runs the pipeline.
+
+        Parameters:
+            targets (list, optional): names of stages to build, along with their dependencies.
+                Defaults to every stage.
+            force (bool, optional): run every stage even if unchanged. Defaults to False.
+
+        Returns:
+            results (list): dictionary for each stage of its name, status ('ran' or 'skipped') and run time in seconds
+        """
+        state = self.load_state()
+        results = []
+        for stage in self.order(targets):
+            # inputs are fingerprinted after upstream stages have run
+            stage_fingerprint = self.stage_fingerprint(stage)
+            unchanged = state.get(stage.name, {}).get("fingerprint") == stage_fingerprint
+            outputs_exist = all(os.path.exists(path) for path in stage.outputs)
+            if unchanged and outputs_exist and not stage.always_run and not force:
+                results.append({"stage": stage.name, "status": "skipped", "seconds": 0.0})
+                continue
+            start = time.perf_counter()
+            self.run_stage(stage)
+            seconds = time.perf_counter() - start
+            state[stage.name] = {"fingerprint": stage_fingerprint, "seconds": round(seconds, 3)}
+            self.save_state(state)
+            results.append({"stage": stage.name, "status": "ran", "seconds": seconds})
+        return results
+
+
+def format_report(results: list) -> str:
+    """
+    Formats pipeline results as a table of stage, status and run time.
+    """
+    lines = [f"{'Stage':<28}{'Status':<10}{'Seconds':>10}"]
+    for result in results:
+        lines.append(f"{result['stage']:<28}{result['status']:<10}{result['seconds']:>10.2f}")
+    lines.append(f"{'Total':<38}{sum(result['seconds'] for result in results):>10.2f}")
+    return "\n".join(lines)
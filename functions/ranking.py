@@ -0,0 +1,270 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from functions.search import TrigramIndex
+from functions.calculations import Calculations, enforce_float
+from functions.categorical import to_categorical
+from functions.join import join_species
+
+
+# columns scored for each species, averaged into the priority score
+SCORE_COLUMNS = ["biobank_samples", "demand", "conservation_value"]
+# column order displayed in the DataTable
+RANKING_COLUMNS = [
+    "full_name",
+    "class",
+    "biobank_samples",
+    "demand",
+    "conservation_value",
+    "priority_score",
+    "null_percent",
+]
+
+
+# weight form inputs for each score column
+WEIGHT_INPUTS = {"conservation_value": "conservation", "demand": "demand", "biobank_samples": "samples"}
+
+
+def build_base_dataset(scored_data: pd.DataFrame, biobank_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combines the scored dataset with a biobank's sample counts.
+    The result is unweighted, weights are applied when the data is ranked.
+
+    Parameters:
+        scored_data (pd.DataFrame): scored dataset
+        biobank_data (pd.DataFrame): uploaded biobank data with 'full_name', 'class' and 'biobank_samples' columns
+
+    Returns:
+        data (pd.DataFrame): dataset with 'biobank_samples', 'demand', 'conservation_value' and 'null_percent' columns
+    """
+    biobank_data = biobank_data[["full_name", "class", "biobank_samples"]].copy()
+
+    # rescale biobank data
+    calc = Calculations(biobank_data["biobank_samples"])
+    biobank_data["biobank_samples"] = calc.invert_max()
+
+    # add biobank data to rest of dataset, one row per species with the scored dataset's class
+    data = join_species([scored_data, biobank_data])
+    data = data[["full_name", "class", "biobank_samples"] + list(scored_data.columns.drop(["full_name", "class"]))]
+    # assign species with no biobank_samples a value of 1
+    data["biobank_samples"] = data["biobank_samples"].fillna(1)
+
+    # enforce float type
+    cols = [col for col in data.columns if col not in ["full_name", "class"]]
+    for col in cols:
+        data[col] = enforce_float(data[col])
+
+    # DataTable fails is any NaN are present in dataframe, failsafe- drop any rows that contain one or more NaN values
+    data = data.dropna()
+
+    # currently combining conservation value here as approach might change in future
+    data["conservation_value"] = (
+        data["iucn_category"] + data["cites_listing"] + data["ed_median"]
+    ) / 3
+    data = data.drop(["iucn_category", "cites_listing", "ed_median"], axis=1)
+    return to_categorical(data.reset_index(drop=True))
+
+
+def parse_weight(value) -> float:
+    """
+    Converts a weight entered by the user to a float,
+    empty entries default to 1.
+
+    Raises:
+        ValueError: if the weight isn't a finite number
+    """
+    weight = float(value or 1)
+    if not np.isfinite(weight):
+        raise ValueError(f"Weight must be a finite number: '{value}'")
+    return weight
+
+
+def rank_dataset(data: pd.DataFrame, weights: dict = None, return_order: bool = False):
+    """
+    Weights the score columns, calculates the priority score
+    of each species and sorts the species by priority score (desc).
+
+    Parameters:
+        data (pd.DataFrame): dataset containing the score columns
+        weights (dict, optional): weight to multiply each score column by,
+            columns that aren't given a weight keep a weight of 1
+        return_order (bool, optional): also return the position in data of each ranked row. Defaults to False.
+
+    Returns:
+        ranked (pd.DataFrame): dataframe of display columns, rounded to 2 decimal places
+        order (np.ndarray): position in data of each row of ranked, only if return_order
+    """
+    ranked = data[[col for col in RANKING_COLUMNS if col != "priority_score"]].reset_index(drop=True)
+    if weights:
+        weight_vector = np.array([float(weights.get(col, 1)) for col in SCORE_COLUMNS])
+        ranked[SCORE_COLUMNS] = ranked[SCORE_COLUMNS].to_numpy(dtype=float) * weight_vector
+    ranked["priority_score"] = ranked[SCORE_COLUMNS].sum(axis="columns") / len(SCORE_COLUMNS)
+    ranked = ranked.sort_values("priority_score", ascending=False, kind="stable")
+    order = ranked.index.to_numpy()
+    ranked = ranked[RANKING_COLUMNS].round(2).reset_index(drop=True)
+    if return_order:
+        return ranked, order
+    return ranked
+
+
+class RankedDataset:
+    """
+    Dataset ranked by priority score that is
+    queried for each DataTables page request.
+    Rows are addressed by their position in the ranking.
+
+    Rankings of the same dataset with different weights can share one search index:
+    search_index is a function returning a TrigramIndex of the dataset the ranking
+    was made from, and source_positions the position in that dataset of each ranked
+    row (see rank_dataset), so matches are mapped through the ranking order.
+    Without a search_index, full_name of the ranking itself is indexed on first search.
+    """
+
+    usecase = "Serving pages of the ranked dataset"
+
+    def __init__(self, data: pd.DataFrame, search_index=None, source_positions: np.ndarray = None):
+        self.data = data
+        self._build_search_index = search_index or (lambda: TrigramIndex(self.data["full_name"]))
+        self._search_index = None
+        self._ranked_positions = None
+        if source_positions is not None:
+            # ranked position of each row of the source dataset
+            self._ranked_positions = np.empty(len(source_positions), dtype=np.int64)
+            self._ranked_positions[source_positions] = np.arange(len(source_positions))
+        # sorted row positions of each class, so class filters are a lookup
+        self.class_index = data.groupby("class", sort=False, observed=True).indices
+        # ascending order of each column, priority score order is the ranking itself
+        self._permutations = {"priority_score": np.arange(len(data))[::-1]}
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def search_index(self) -> TrigramIndex:
+        """
+        Trigram index of full_name, fetched or built on first search.
+        """
+        if self._search_index is None:
+            self._search_index = self._build_search_index()
+        return self._search_index
+
+    def search(self, term: str) -> np.ndarray:
+        """
+        Returns the positions in the ranking of species whose full_name contains term (case insensitive).
+        """
+        positions = self.search_index.search(term)
+        if self._ranked_positions is not None:
+            positions = self._ranked_positions[positions]
+        return positions
+
+    def permutation(self, column: str) -> np.ndarray:
+        """
+        Row positions sorted by column (asc), computed on first use
+        and reused by every later page request ordered by that column.
+        """
+        if column not in self._permutations:
+            values = self.data[column].reset_index(drop=True)
+            self._permutations[column] = values.sort_values(kind="stable").index.to_numpy()
+        return self._permutations[column]
+
+    def positions_mask(self, positions) -> np.ndarray:
+        """
+        Converts row positions into a boolean mask over the ranking.
+        """
+        mask = np.zeros(len(self.data), dtype=bool)
+        mask[np.asarray(positions, dtype=np.int64)] = True
+        return mask
+
+    def query(self, class_selected: str = None, search: str = None, order_col: str = "priority_score", ascending: bool = False) -> np.ndarray:
+        """
+        Filters and orders the ranking.
+
+        Parameters:
+            class_selected (str, optional): only keep species of this class
+            search (str, optional): only keep species whose full_name contains this term (case insensitive, not a regex)
+            order_col (str, optional): column to order by. Defaults to 'priority_score'.
+            ascending (bool, optional): order direction. Defaults to False.
+
+        Returns:
+            positions (np.ndarray): row positions of the matching species, in display order
+        """
+        mask = np.ones(len(self.data), dtype=bool)
+        if class_selected:
+            mask = self.positions_mask(self.class_index.get(class_selected, []))
+        if search:
+            mask &= self.positions_mask(self.search(search))
+        # walk the presorted permutation and keep rows that pass the filters
+        ordered = self.permutation(order_col)
+        if not ascending:
+            ordered = ordered[::-1]
+        return ordered[mask[ordered]]
+
+    def page(self, positions: np.ndarray, start: int, length: int) -> pd.DataFrame:
+        """
+        Returns the rows for a single page of query results.
+        """
+        return self.data.iloc[positions[start:start + length]]
+
+
+class RankingCache:
+    """
+    Bounded LRU cache of ranked datasets, keyed by dataset version and weights.
+    Also used for the search index of each dataset version.
+    """
+
+    usecase = "Caching ranked datasets between page requests"
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rankings = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build) -> RankedDataset:
+        """
+        Returns the ranking stored under key, calling
+        build() to create it if it isn't cached.
+
+        Parameters:
+            key (hashable): dataset version and weights
+            build (callable): function that returns a RankedDataset
+        """
+        with self._lock:
+            if key in self._rankings:
+                self._rankings.move_to_end(key)
+                self.hits += 1
+                return self._rankings[key]
+        ranking = build()
+        with self._lock:
+            self.misses += 1
+            self._rankings[key] = ranking
+            self._rankings.move_to_end(key)
+            while len(self._rankings) > self.maxsize:
+                self._rankings.popitem(last=False)
+        return ranking
+
+    def clear(self):
+        with self._lock:
+            self._rankings.clear()
+
+    def discard(self, match) -> int:
+        """
+        Removes every entry whose key match(key) is true,
+        e.g. the rankings of a workspace that was dropped.
+
+        Returns:
+            (int): number of entries removed
+        """
+        with self._lock:
+            keys = [key for key in self._rankings if match(key)]
+            for key in keys:
+                del self._rankings[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        """
+        Returns hit and miss counters for the cache.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._rankings), "maxsize": self.maxsize}
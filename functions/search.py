@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def trigrams(text: str) -> set:
+    """
+    Returns the set of 3 character substrings of a string.
+
+    Example:
+        trigrams("aves")
+        >>> {"ave", "ves"}
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Case-folded trigram index over a column of strings.
+    Searching looks up the positions of rows that contain every trigram
+    of the search term, then checks those candidates contain the term itself,
+    so only a small part of the column is scanned for each search.
+    The index is built and searched with Arrow compute kernels, rather than
+    a python loop over each name.
+    """
+
+    usecase = "Substring search of species names"
+
+    def __init__(self, values: pd.Series):
+        folded = np.array([v.casefold() if isinstance(v, str) else "" for v in values], dtype=object)
+        self.values = pa.array(folded, type=pa.string())
+        self.postings = {}
+        lengths = pc.utf8_length(self.values).to_numpy()
+        # trigram starting at each character of every row long enough to have one
+        grams, positions = [], []
+        for start in range(max(lengths.max(initial=0) - 2, 0)):
+            rows = np.flatnonzero(lengths >= start + 3)
+            grams.append(pc.utf8_slice_codeunits(self.values.take(rows), start, start + 3))
+            positions.append(rows)
+        if not grams:
+            return
+        encoded = pc.dictionary_encode(pa.concat_arrays(grams))
+        # sort by (trigram, position) and drop trigrams repeated within a row,
+        # so each posting list is sorted and unique
+        keys = np.unique(encoded.indices.to_numpy().astype(np.int64) * len(folded) + np.concatenate(positions))
+        codes, positions = np.divmod(keys, len(folded))
+        bounds = np.searchsorted(codes, np.arange(len(encoded.dictionary) + 1))
+        for i, gram in enumerate(encoded.dictionary.to_pylist()):
+            self.postings[gram] = positions[bounds[i]:bounds[i + 1]]
+
+    def __len__(self):
+        return len(self.values)
+
+    def candidates(self, term: str):
+        """
+        Returns the sorted positions of rows containing every trigram in term.
+        Terms shorter than 3 characters have no trigrams, so every row is a candidate (None).
+        """
+        grams = trigrams(term.casefold())
+        if not grams:
+            return None
+        postings = []
+        for gram in grams:
+            if gram not in self.postings:
+                return np.array([], dtype=np.int64)
+            postings.append(self.postings[gram])
+        # intersect shortest posting lists first so the candidate set shrinks fastest
+        postings.sort(key=len)
+        result = postings[0]
+        for posting in postings[1:]:
+            result = np.intersect1d(result, posting, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+    def search(self, term: str) -> np.ndarray:
+        """
+        Returns the sorted positions of rows containing term (case insensitive).
+
+        Parameters:
+            term (str): search term, matched as a literal substring
+
+        Returns:
+            (np.ndarray): row positions
+        """
+        term = term.casefold()
+        candidates = self.candidates(term)
+        if candidates is None:
+            return np.flatnonzero(pc.match_substring(self.values, term).to_numpy(zero_copy_only=False))
+        if len(candidates) == 0:
+            return candidates
+        matches = pc.match_substring(self.values.take(candidates), term).to_numpy(zero_copy_only=False)
+        return candidates[matches]
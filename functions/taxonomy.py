@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+def resolve_chains(rep_dict: dict) -> dict:
+    """
+    Follows chained corrections to their final value, so each value is corrected in one step,
+    e.g. {'A': 'B', 'B': 'C'} -> {'A': 'C', 'B': 'C'}. Values mapped to themselves are dropped.
+
+    Parameters:
+        rep_dict (dict): corrections of a taxonomic rank, incorrect value -> correct value
+
+    Returns:
+        (dict): corrections with chains resolved
+
+    Raises:
+        ValueError: if corrections form a cycle, e.g. {'A': 'B', 'B': 'A'}
+    """
+    resolved = {}
+    for value in rep_dict:
+        path = [value]
+        current = value
+        while current in rep_dict and rep_dict[current] != current:
+            current = rep_dict[current]
+            if current in path:
+                raise ValueError(f"Taxonomy corrections form a cycle: {' -> '.join(path + [current])}")
+            path.append(current)
+        if current != value:
+            resolved[value] = current
+    return resolved
+
+
+class TaxonomyResolver:
+    """
+    Corrects the taxonomy of dataframes. Each rank column (e.g. 'class', 'order', 'family')
+    is encoded as categories and only the categories are corrected, so the cost depends on
+    the number of unique values rather than rows. Columns keep their dtype and other
+    columns are untouched.
+
+    Parameters:
+        rep_dicts (dict): corrections keyed by the rank column they apply to, e.g. from database_setup/taxonomy/*.json
+    """
+
+    usecase = "Correcting taxonomy of dataframes"
+    report_columns = ["rank", "original", "corrected", "rows"]
+
+    def __init__(self, rep_dicts: dict):
+        self.corrections = {rank: resolve_chains(rep_dict) for rank, rep_dict in rep_dicts.items()}
+
+    def resolve(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Returns a copy of df with taxonomy corrected.
+        """
+        df, _ = self.resolve_with_report(df)
+        return df
+
+    def resolve_with_report(self, df: pd.DataFrame):
+        """
+        Returns a copy of df with taxonomy corrected, and a report of the corrected values.
+
+        Returns:
+            df (pd.DataFrame): corrected dataframe
+            report (pd.DataFrame): rank, original and corrected value, and number of rows corrected,
+                for each value changed
+        """
+        df = df.copy(deep=False)
+        changes = []
+        for rank, corrections in self.corrections.items():
+            if rank not in df.columns or not corrections:
+                continue
+            df[rank], rank_changes = self.correct_column(df[rank], corrections)
+            changes += [(rank, *change) for change in rank_changes]
+        return df, pd.DataFrame(changes, columns=self.report_columns)
+
+    @staticmethod
+    def correct_column(column: pd.Series, corrections: dict):
+        """
+        Corrects the values of a column, via its categories.
+
+        Returns:
+            column (pd.Series): corrected column
+            changes (list): (original, corrected, rows) of each value changed
+        """
+        categorical = isinstance(column.dtype, pd.CategoricalDtype)
+        if categorical:
+            codes, categories = column.cat.codes.to_numpy(), column.cat.categories
+        else:
+            codes, categories = pd.factorize(column)
+        original = np.asarray(categories, dtype=object)
+        corrected = np.array([corrections.get(value, value) for value in original], dtype=object)
+        changed = np.flatnonzero(original != corrected)
+        if not len(changed):
+            return column, []
+
+        rows = np.bincount(codes[codes >= 0], minlength=len(original))
+        changes = [(original[i], corrected[i], int(rows[i])) for i in changed]
+
+        if categorical:
+            # merge categories corrected to the same value, keeping missing values (-1)
+            new_categories = pd.unique(corrected)
+            remap = np.append(pd.Index(new_categories).get_indexer(corrected), -1)
+            values = pd.Categorical.from_codes(remap[codes], categories=new_categories, ordered=column.cat.ordered)
+            return pd.Series(values, index=column.index, name=column.name), changes
+
+        # only rows of changed categories are written
+        values = column.to_numpy(dtype=object, copy=True)
+        rows_changed = np.isin(codes, changed)
+        values[rows_changed] = corrected[codes[rows_changed]]
+        return pd.Series(values, index=column.index, name=column.name, dtype=column.dtype), changes
@@ -6,7 +6,15 @@ import json
 import jsonschema
 import warnings
 from itertools import chain
-from flask import jsonify
+from flask import jsonify, Response
+from functions.http_client import HttpClient
+from functions.taxonomy import TaxonomyResolver
+from functions import arrow_strings
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library encoder is used without it
+    orjson = None
 
 def get_db_info(config):
     """
@@ -71,7 +79,7 @@ def multi_dict_replace_rows(df: pd.DataFrame, rep_dicts: dict):
     return df
 
 
-def rename_taxonomy(df: pd.DataFrame):
+def rename_taxonomy(df: pd.DataFrame, engine: str = "pandas"):
     """
     This function renames the columns of the dataframe
     to match the taxonomy related terms "kingdom",
@@ -81,6 +89,8 @@ def rename_taxonomy(df: pd.DataFrame):
 
     Parameters:
         df (pandas.DataFrame): dataframe to be renamed
+        engine (str, optional): 'pandas', or 'arrow' to capitalize with Arrow compute
+            kernels (see functions.arrow_strings.capitalize). Defaults to 'pandas'.
 
     Returns:
         pandas.DataFrame: dataframe with renamed and capitalized columns
@@ -107,15 +117,17 @@ def rename_taxonomy(df: pd.DataFrame):
     for column in df.columns:
         if column in rep_col:
             # capitalize the column values and assign them back to the dataframe
-            df[column] = df[column].str.capitalize()
+            df[column] = arrow_strings.capitalize(df[column]) if engine == "arrow" else df[column].str.capitalize()
     return df
 
-def filter_species(df: pd.DataFrame) -> pd.DataFrame:
+def filter_species(df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
     """
     Filter species names, drop null values, and remove duplicate entries for the 'full_name' column.
 
     Args:
         df (pandas.DataFrame): The input DataFrame containing the species data.
+        engine (str, optional): 'pandas', or 'arrow' to match and deduplicate names with Arrow
+            compute kernels (see functions.arrow_strings.species_rows). Defaults to 'pandas'.
 
     Returns:
         pandas.DataFrame: The filtered DataFrame with unique species names and without any null values or duplicate entries.
@@ -126,6 +138,11 @@ def filter_species(df: pd.DataFrame) -> pd.DataFrame:
     """
     if "full_name" not in df.columns:
         raise ValueError("Column 'full_name' is not present in dataset, cleaning failed.")
+    if engine == "arrow":
+        rows = arrow_strings.species_rows(df["full_name"])
+        # columns that aren't strings are filtered by pandas
+        if rows is not None:
+            return df.iloc[rows].reset_index(drop=True)
     # Drop rows where full_name is null
     df = df[df['full_name'].notna()]
     # Filter to only include species (not genus or subspecies)
@@ -169,14 +186,18 @@ def nested_dicts_to_df(nested_dicts: dict, key: str):
         raise KeyError(f"The key '{key}' was not found in the nested dictionaries.")
     return df
 
-def get_url(url: str, headers: str = "") -> requests.Response:
+# shared client, so connections are reused between calls to get_url
+HTTP_CLIENT = HttpClient()
+
+def get_url(url: str, headers: str = "", client: HttpClient = None) -> requests.Response:
     """ 
-    Makes get request using requests library to 
-    given url.
+    Makes get request to given url, using a pooled
+    client that keeps connections to each host open.
 
     Args:
         url
         headers
+        client (HttpClient, optional): client making the request, defaults to the shared HTTP_CLIENT
 
     Returns:
         response: request response object
@@ -187,8 +208,9 @@ def get_url(url: str, headers: str = "") -> requests.Response:
         requests.exceptions.ConnectionError (Connection Error. Error connecting to server url:{url}. Following error raised: {e})
         requests.exceptions.RequestException (Request Exception. An error occurred while making the request: {e})
     """
+    client = client or HTTP_CLIENT
     try:
-        response = requests.get(url=url, headers=headers)
+        response = client.get(url, headers=headers)
     except requests.exceptions.ConnectionError as e:
         raise requests.exceptions.ConnectionError(f"Connection Error. Error connecting to server url:{url}. Following error raised: {e}")
     except requests.exceptions.RequestException as e:
@@ -203,11 +225,11 @@ def get_url(url: str, headers: str = "") -> requests.Response:
 
 
 
-def generate_demand(taxonomy_df: pd.DataFrame, demand_scores: json) -> pd.DataFrame:
+def generate_demand(taxonomy_df: pd.DataFrame, demand_scores: json, seed: int = None) -> pd.DataFrame:
     """
     Generates demand scores for species based on their class.
     The scores follow a random normal distribution around a
-    specified mean for each class.
+    specified mean for each class, drawn for all species at once.
 
     Parameters:
     taxonomy_df (pandas.DataFrame):
@@ -219,60 +241,91 @@ def generate_demand(taxonomy_df: pd.DataFrame, demand_scores: json) -> pd.DataFr
         A dictionary of unique species class names (keys) and
         their integers (values). The integers represents the mean
         number of requests for biological samples from that class.
+    seed (int, optional):
+        Seed of the random numbers, the same seed gives the same
+        scores. Defaults to None (different scores on every call).
 
     Returns:
     demand_df (pandas.DataFrame):
         DataFrame that contains the demand scores for each species.
         The DataFrame has columns 'demand' (the demand score),
         'full_name' (the full scientific name of the species),
-        and 'class' (the class of the species).
+        and 'class' (the class of the species), ordered by class.
 
     Example:
     >>> taxonomy_df = pd.DataFrame({'full_name': ['Species 1', 'Species 2', 'Species 3'], 'class': ['Class A', 'Class B', 'Class B']})
-    >>> demand_df = generate_demand(taxonomy_df, demand_scores)
+    >>> demand_df = generate_demand(taxonomy_df, demand_scores, seed=0)
     >>> demand_df
-               full_name     class  demand
-    0        Species 1   Class A       2
-    1        Species 2   Class B       6
-    2        Species 3   Class B       7
-    """
-    # group full_name by class
-    grouped = (
-        taxonomy_df.groupby("class")["full_name"]
-        .apply(list)
-        .reset_index(name="full_name")
-    )
-    # count number of species in each class
-    grouped["no_species"] = [len(species) for species in grouped["full_name"]]
-    # add class demand scores to data
-    grouped["demand_scores"] = grouped["class"].map(demand_scores)
-    # generate demand scores for each species based on class scores
-    demand_data = []
-    for _, row in grouped[["demand_scores", "no_species"]].iterrows():
-        demand_data.append(
-            np.ceil(
-                np.random.normal(
-                    loc=row["demand_scores"], scale=1, size=int(row["no_species"])
-                )
-            )
-        )
-    # create df of results
-    demand_df = pd.DataFrame(
-        {
-            "demand": demand_data,
-            "full_name": grouped["full_name"],
-            "class": grouped["class"],
-        }
-    )
-    demand_df = demand_df.explode(['full_name', 'demand']).reset_index(drop=True)
+       demand  full_name    class
+    0     3.0  Species 1  Class A
+    1     6.0  Species 2  Class B
+    2     7.0  Species 3  Class B
+    """
+    # species ordered by class (by class code), species without a class are dropped
+    codes, classes = pd.factorize(taxonomy_df["class"], sort=True)
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    demand_df = taxonomy_df[["full_name", "class"]].iloc[order].reset_index(drop=True)
+    # class demand score of each species, looked up once per class
+    means = np.array([demand_scores.get(name, np.nan) for name in classes], dtype=float)[codes[order]]
+    # generate demand scores for every species in one draw
+    rng = np.random.default_rng(seed)
+    demand_df.insert(0, "demand", np.ceil(rng.normal(loc=means, scale=1)))
+    return demand_df
 
+def flatten_nested(records: list, fields: list, parent_key: str = "id", parent_column: str = "parent_id") -> dict:
+    """
+    Flattens lists of nested records (e.g. the common names of each CITES taxon concept)
+    into a child table for each field, walking the records once. Each child row
+    is given the id of the record it came from, by repeating each parent id by
+    its number of children.
 
-    return demand_df
+    Parameters:
+        records (list): dictionaries, each with a parent_key and a list of dictionaries for each field
+        fields (list): keys of the nested lists to flatten, missing or null lists have no children
+        parent_key (str, optional): key of the parent id in each record. Defaults to "id".
+        parent_column (str, optional): name of the parent id column of each child table. Defaults to "parent_id".
 
-def get_json_response(json_data: json, data: pd.DataFrame):
+    Returns:
+        (dict): child dataframe of each field, with the parent id as the first column
+
+    Example:
+        records = [{"id": 1, "synonyms": [{"name": "a"}, {"name": "b"}]}, {"id": 2, "synonyms": []}, {"id": 3, "synonyms": [{"name": "c"}]}]
+        flatten_nested(records, ["synonyms"])["synonyms"]
+        >>>    parent_id name
+            0          1    a
+            1          1    b
+            2          3    c
+    """
+    parent_ids = []
+    lengths = {field: [] for field in fields}
+    children = {field: [] for field in fields}
+    for record in records:
+        parent_ids.append(record[parent_key])
+        for field in fields:
+            items = record.get(field) or []
+            lengths[field].append(len(items))
+            children[field].extend(items)
+    tables = {}
+    for field in fields:
+        table = pd.DataFrame.from_records(children[field])
+        table.insert(0, parent_column, np.repeat(np.asarray(parent_ids), lengths[field]))
+        tables[field] = table
+    return tables
+
+def get_json_response(json_data: json, data):
     """
     Gets JSON data from DataTables AJAX request, filters, sorts, and paginates the data, 
     and constructs a JSON response in the format expected by DataTables.
+
+    Parameters:
+        json_data (json): DataTables AJAX request
+        data (pd.DataFrame or functions.ranking.RankedDataset): data to be displayed, a RankedDataset
+            is queried in place rather than filtered and sorted as a dataframe
+            (it isn't imported here, so pipeline scripts using utils don't depend on the app's ranking code)
+
+    If the request contains "format": "columnar" the page data is returned
+    as column arrays (see columnar_json), otherwise as a list of row dictionaries.
     """
 
     # Get the updated draw, start, length, and search parameters
@@ -282,36 +335,40 @@ def get_json_response(json_data: json, data: pd.DataFrame):
     search = str(json_data.get("search"))
     order = (json_data.get("order"))
     columns = (json_data.get("columns"))
-
-    try:
-        classSelected = (json_data.get("classSelected"))
-        if classSelected:
-            data = data[data["class"] == classSelected]
-    except:
-        pass
-
-    # Search for term in df if one is given
-    if search:
-        search_result = data['full_name'].str.contains(search, case=False)
-        data = data[search_result]
+    classSelected = (json_data.get("classSelected"))
 
     # Order by column asc/ desc
     indx_cols = list(enumerate([c['data'] for c in columns]))
     order_col = [c for i, c in indx_cols if i == order[0]['column']]
     order_dir = order[0]['dir']
-    if order_dir == 'asc':
-        data = data.sort_values(order_col, ascending=True)
-    if order_dir == 'desc':
-        data = data.sort_values(order_col, ascending=False)
 
-    # Get the total number of data records (rows)
-    total_records = len(data)
+    if not isinstance(data, pd.DataFrame):
+        # Query the cached ranking and only materialise the current page
+        positions = data.query(class_selected=classSelected, search=search, order_col=order_col[0], ascending=order_dir == 'asc')
+        total_records = len(positions)
+        data = data.page(positions, start, length)
+    else:
+        try:
+            if classSelected:
+                data = data[data["class"] == classSelected]
+        except:
+            pass
 
-    # Get the data for the current selected page
-    data = data.iloc[start:start + length]
+        # Search for term in df if one is given
+        if search:
+            search_result = data['full_name'].str.contains(search, case=False)
+            data = data[search_result]
 
-    # Construct the JSON response in the format expected by DataTables
-    data_dict = data.to_dict('records')
+        if order_dir == 'asc':
+            data = data.sort_values(order_col, ascending=True)
+        if order_dir == 'desc':
+            data = data.sort_values(order_col, ascending=False)
+
+        # Get the total number of data records (rows)
+        total_records = len(data)
+
+        # Get the data for the current selected page
+        data = data.iloc[start:start + length]
 
     response = {
         'draw': draw,
@@ -319,11 +376,50 @@ def get_json_response(json_data: json, data: pd.DataFrame):
         'length': length,
         'recordsTotal': total_records,
         'recordsFiltered': total_records,
-        'data': data_dict
     }
 
+    # Columnar mode sends each column as an array, rows are rebuilt by the DataTables client
+    if json_data.get("format") == "columnar":
+        return Response(columnar_json(response, data), mimetype="application/json")
+
+    # Construct the JSON response in the format expected by DataTables
+    response['data'] = data.to_dict('records')
+
     return jsonify(response)
 
+def column_array(series: pd.Series):
+    """
+    Converts a column to an array that can be JSON encoded,
+    missing values are encoded as null.
+    """
+    values = series.to_numpy()
+    if values.dtype.kind in "iub":
+        return np.ascontiguousarray(values) if orjson else values.tolist()
+    if values.dtype.kind == "f":
+        if orjson:  # orjson encodes NaN as null
+            return np.ascontiguousarray(values)
+        return np.where(np.isnan(values), None, values).tolist()
+    return [None if pd.isna(value) else value for value in values]
+
+def columnar_json(response: dict, data: pd.DataFrame) -> bytes:
+    """
+    Encodes a DataTables response with the page data stored as
+    column arrays under the 'columnar' key, instead of one dictionary
+    per row. Numeric columns are encoded straight from their NumPy
+    buffers when orjson is installed.
+
+    Parameters:
+        response (dict): DataTables response without data
+        data (pd.DataFrame): rows of the current page
+
+    Returns:
+        (bytes): JSON encoded response
+    """
+    payload = {**response, 'columnar': {col: column_array(data[col]) for col in data.columns}}
+    if orjson:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload).encode("utf-8")
+
 def nonnumeric_rows(df: pd.DataFrame, colm: str) -> list:
     """
     Takes a dataframe and column name and 
@@ -399,37 +495,123 @@ def validate_json_schema(json_data: dict, schema: dict) -> None:
     except jsonschema.SchemaError as e:
         raise jsonschema.exceptions.ValidationError("Failed to validate response JSON. Response data does not conform to the schema:")
     
-def validate_df_schema(df: pd.DataFrame, schema: dict) -> None:
+def is_missing_value(value) -> bool:
+    """
+    Returns True if value is None or np.nan, the missing values allowed in any column of a schema.
+    """
+    return value is None or value is np.nan
+
+
+def invalid_type_rows(series: pd.Series, expected_type: type, sample: int = None, random_state: int = 0) -> pd.Index:
+    """
+    Finds rows of a column whose value is not of the expected type, or a missing value (see is_missing_value).
+    Columns are checked by dtype where every value has the same type, e.g. numeric and string
+    dtypes, or object columns of strings. Values are only checked one by one in other
+    columns, e.g. object columns of mixed types.
+
+    Parameters:
+        series (pd.Series): column to check
+        expected_type (type): type values are expected to be
+        sample (int, optional): number of randomly sampled rows checked one by one. Defaults to checking every row.
+        random_state (int, optional): seed of sample. Defaults to 0.
+
+    Returns:
+        (pd.Index): index of invalid rows
+    """
+    if expected_type is object or series.empty:
+        return series.index[:0]
+    dtype = series.dtype
+
+    # numpy numeric and bool columns: every value is the same python type, including NaN
+    if isinstance(dtype, np.dtype) and dtype.kind in "iufcb":
+        return series.index[:0] if isinstance(next(iter(series)), expected_type) else series.index
+
+    # string columns: values are str, missing values are pd.NA
+    if isinstance(dtype, pd.StringDtype):
+        return series.index[series.isna()] if issubclass(str, expected_type) else series.index
+
+    # categorical columns: values are categories, missing values are np.nan
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = pd.Series(dtype.categories.tolist(), dtype=object)
+        invalid_codes = invalid_type_rows(categories, expected_type)
+        return series.index[np.isin(series.cat.codes.to_numpy(), invalid_codes.to_numpy())]
+
+    # object columns of strings: only missing values need checking
+    if dtype == object and issubclass(str, expected_type) and pd.api.types.infer_dtype(series, skipna=True) in ["string", "empty"]:
+        missing = series[series.isna()]
+        # None is compared elementwise, other missing values one by one
+        missing = missing[missing.to_numpy() != None]
+        return missing.index[[not is_missing_value(value) and not isinstance(value, expected_type) for value in missing]]
+
+    # other columns: check values one by one
+    if sample is not None and len(series) > sample:
+        series = series.sample(sample, random_state=random_state)
+    return series.index[[not (isinstance(value, expected_type) or is_missing_value(value)) for value in series]]
+
+
+def df_schema_report(df: pd.DataFrame, schema: dict, sample: int = None, random_state: int = 0) -> dict:
+    """
+    Checks a DataFrame against a schema, without stopping at the first failure.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to check.
+        schema (dict): The schema representing the expected columns as keys and their expected types as values.
+        sample (int, optional): Number of rows sampled in columns whose values are checked one by one (see invalid_type_rows).
+        random_state (int, optional): Seed of sample. Defaults to 0.
+
+    Returns:
+        report (dict): 'unexpected_columns' and 'missing_columns' lists, and 'invalid_columns', keyed by
+            column, of the expected type, column dtype and index of rows not matching the type ('rows').
+            'valid' is False if any expected column is missing or invalid.
+    """
+    report = {
+        "unexpected_columns": sorted(set(df.columns) - set(schema.keys())),
+        "missing_columns": sorted(set(schema.keys()) - set(df.columns)),
+        "invalid_columns": {},
+    }
+    for col, expected_type in schema.items():
+        if col not in df.columns:
+            continue
+        rows = invalid_type_rows(df[col], expected_type, sample, random_state)
+        if len(rows):
+            report["invalid_columns"][col] = {
+                "expected": expected_type.__name__,
+                "dtype": str(df[col].dtype),
+                "rows": rows.tolist(),
+            }
+    report["valid"] = not report["missing_columns"] and not report["invalid_columns"]
+    return report
+
+
+def validate_df_schema(df: pd.DataFrame, schema: dict, sample: int = None) -> None:
     """
     Validate the DataFrame against a given schema.
 
     Checks if the DataFrame columns match the expected schema columns and if their types match the expected types.
     Raises a KeyError if unexpected columns are present or if expected columns are missing.
     Raises a ValueError if a column does not match the expected type.
+    See df_schema_report for every column and row that doesn't match.
 
     Args:
         df (pd.DataFrame): The DataFrame to validate.
         schema (dict): The schema representing the expected columns as keys and their expected types as values.
+        sample (int, optional): Number of rows sampled in columns whose values are checked one by one (see invalid_type_rows).
 
     Raises:
         warnings.warn: If unexpected columns are present
         KeyError: If expected columns are missing in the DataFrame.
         ValueError: If a column's type does not match the expected type.
     """
-    # Check for missing columns
-    unexpected_cols = sorted(list(set(df.columns)-set(schema.keys())))
-    missing_cols = sorted(list(set(schema.keys())-(set(df.columns))))
+    report = df_schema_report(df, schema, sample)
 
-    if unexpected_cols:
-        warnings.warn(f"Unexpected columns present in dataframe: {list(unexpected_cols)}")
-    if missing_cols:
-         raise KeyError(f"Expected columns are missing from dataframe: {list(missing_cols)}")
+    if report["unexpected_columns"]:
+        warnings.warn(f"Unexpected columns present in dataframe: {report['unexpected_columns']}")
+    if report["missing_columns"]:
+         raise KeyError(f"Expected columns are missing from dataframe: {report['missing_columns']}")
 
     # Check columns match expected types
-    for col, expected_type in schema.items():
-        is_expected_type = all(isinstance(value, expected_type) or value is None or value is np.nan for value in df[col])
-        if not is_expected_type:
-            raise ValueError(f"Error: Column '{col}' does not match the expected schema of '{expected_type.__name__}'.")
+    for col, invalid in report["invalid_columns"].items():
+        raise ValueError(f"Error: Column '{col}' does not match the expected schema of '{invalid['expected']}'.")
 
 def str_to_snake_case(column_name: str) -> str:
     """
@@ -458,7 +640,7 @@ def columns_to_snake_case(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = [str_to_snake_case(col) for col in df.columns]
     return df
 
-def clean_dataframe(df: pd.DataFrame, taxa_dict: dict) -> pd.DataFrame:
+def clean_dataframe(df: pd.DataFrame, taxa_dict: dict, engine: str = "arrow") -> pd.DataFrame:
     """
     Cleans the given DataFrame by standardizing column names, 
     filtering out nulls, duplicate and non-species rows, 
@@ -467,15 +649,18 @@ def clean_dataframe(df: pd.DataFrame, taxa_dict: dict) -> pd.DataFrame:
     
     Args:
         df (pandas.DataFrame): DataFrame to be cleaned
+        taxa_dict (dict): taxonomy corrections keyed by the rank column they apply to (see TaxonomyResolver)
+        engine (str, optional): 'arrow' to clean strings with Arrow compute kernels, or 'pandas'.
+            Both give the same result. Defaults to 'arrow'.
         
     Returns:
         df (pandas.DataFrame) cleaned DataFrame
     """
     # Standardise column names
-    df = rename_taxonomy(df)
+    df = rename_taxonomy(df, engine)
     df = columns_to_snake_case(df)
     # Filter species
-    df = filter_species(df)
+    df = filter_species(df, engine)
     # Replace incorrect taxonomy
-    df = multi_dict_replace_rows(df, taxa_dict)
+    df = TaxonomyResolver(taxa_dict).resolve(df)
     return df
\ No newline at end of file
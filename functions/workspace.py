@@ -0,0 +1,171 @@
+import time
+import itertools
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+
+# versions are drawn from one counter for the whole process, so a workspace that is
+# dropped and created again never reuses a version (cache keys include versions)
+_versions = itertools.count(1)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """
+    Returns the memory used by a dataframe in bytes,
+    including the contents of object (string) columns.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class Workspace:
+    """
+    In-memory dataframes belonging to a single user session.
+    Each dataframe is stored under a name ('uploaded', 'biobank', etc.)
+    along with a version number that increases every time it is replaced,
+    and is never reused by any workspace in the process.
+    """
+
+    def __init__(self, workspace_id: str):
+        self.id = workspace_id
+        self.frames = {}
+        self.sizes = {}
+        self.versions = {}
+        self.last_access = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        # a dataframe stored under several names (e.g. 'uploaded' and 'biobank') is counted once
+        return sum({id(self.frames[name]): size for name, size in self.sizes.items()}.values())
+
+
+class WorkspaceStore:
+    """
+    Session-keyed store of user workspaces.
+    Workspaces that haven't been used for ttl seconds are dropped,
+    and the least recently used workspaces are dropped when the total
+    size of stored dataframes goes over max_bytes. The workspace being
+    stored to or read from is never dropped for memory, even if it alone
+    is over max_bytes.
+
+    Parameters:
+        ttl (float, optional): seconds of inactivity before a workspace is dropped. Defaults to 3600.
+        max_bytes (int, optional): memory budget of all workspaces' dataframes. Defaults to 1GB.
+        clock (callable, optional): returns the current time in seconds. Defaults to time.monotonic.
+        on_evict (callable, optional): called with the id of each dropped workspace,
+            e.g. to drop data cached for it elsewhere
+    """
+
+    usecase = "Keeping each user's data in memory"
+
+    def __init__(self, ttl: float = 3600, max_bytes: int = 1 << 30, clock=time.monotonic, on_evict=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.on_evict = on_evict
+        self.evictions = 0
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, workspace_id: str, name: str, df: pd.DataFrame) -> int:
+        """
+        Stores a dataframe in a workspace, replacing any
+        dataframe already stored under the same name.
+
+        Parameters:
+            workspace_id (str): session workspace id
+            name (str): name of dataframe
+            df (pd.DataFrame): dataframe to store
+
+        Returns:
+            version (int): version number of the stored dataframe, unique within the process
+        """
+        with self._lock:
+            workspace = self._touch(workspace_id, create=True)
+            workspace.frames[name] = df
+            workspace.sizes[name] = frame_nbytes(df)
+            workspace.versions[name] = next(_versions)
+            version = workspace.versions[name]
+            dropped = self._evict(keep=workspace_id)
+        self._dropped(dropped)
+        return version
+
+    def get(self, workspace_id: str, name: str):
+        """
+        Returns the dataframe stored under name, None if the
+        workspace or dataframe doesn't exist (or has expired).
+        """
+        with self._lock:
+            dropped = self._evict(keep=workspace_id)
+            workspace = self._touch(workspace_id)
+            df = None if workspace is None else workspace.frames.get(name)
+        self._dropped(dropped)
+        return df
+
+    def version(self, workspace_id: str, name: str):
+        """
+        Returns the version of the dataframe stored under name,
+        None if it doesn't exist.
+        """
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is None:
+                return None
+            return workspace.versions.get(name) if name in workspace.frames else None
+
+    def discard(self, workspace_id: str):
+        """
+        Removes a workspace and all of its dataframes.
+        """
+        with self._lock:
+            dropped = [workspace_id] if self._workspaces.pop(workspace_id, None) is not None else []
+        self._dropped(dropped)
+
+    def stats(self) -> dict:
+        """
+        Returns number of workspaces, memory used and evictions.
+        """
+        with self._lock:
+            return {
+                "workspaces": len(self._workspaces),
+                "nbytes": sum(w.nbytes for w in self._workspaces.values()),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _touch(self, workspace_id, create=False):
+        workspace = self._workspaces.get(workspace_id)
+        if workspace is None:
+            if not create:
+                return None
+            workspace = Workspace(workspace_id)
+            self._workspaces[workspace_id] = workspace
+        workspace.last_access = self.clock()
+        self._workspaces.move_to_end(workspace_id)
+        return workspace
+
+    def _dropped(self, workspace_ids):
+        # called without the lock held, so callbacks can use the store
+        if self.on_evict:
+            for workspace_id in workspace_ids:
+                self.on_evict(workspace_id)
+
+    def _evict(self, keep=None):
+        dropped = []
+        # drop expired workspaces, including keep (it is created again if stored to)
+        now = self.clock()
+        for workspace_id in [k for k, w in self._workspaces.items() if now - w.last_access > self.ttl]:
+            del self._workspaces[workspace_id]
+            self.evictions += 1
+            dropped.append(workspace_id)
+        # drop least recently used workspaces until under memory budget
+        total = sum(w.nbytes for w in self._workspaces.values())
+        for workspace_id in list(self._workspaces):
+            if total <= self.max_bytes:
+                break
+            if workspace_id == keep:
+                continue
+            total -= self._workspaces.pop(workspace_id).nbytes
+            self.evictions += 1
+            dropped.append(workspace_id)
+        return dropped
@@ -42,12 +42,7 @@ if /i "%upload%"=="y" (
     :: Run only specific files here when the user selects 'n'
     echo Setting up app data
     :: Set up required data and files for app
-    call python database_setup/generate_metadata.py
-    call python database_setup/taxonomy/generate_tax_rep.py
-    call python database_setup/get_api_data.py
-    call python database_setup/generate_dataframes.py
-    call python database_setup/generate_entire_dataset.py
-    call python database_setup/generate_scored_dataset.py
+    call python database_setup/run_pipeline.py
 )
 
 echo Application has finished installing
\ No newline at end of file
@@ -37,10 +37,7 @@ else
 fi
 
 echo "Generating data for app..."
-python database_setup/generate_metadata.py
-python database_setup/taxonomy/generate_tax_rep.py
-python database_setup/get_api_data.py
-python database_setup/generate_dataframes.py
+python database_setup/run_pipeline.py generate_dataframes
 echo "Data created successfully"
 
 if [ "$upload" = "y" ]; then
@@ -50,8 +47,7 @@ if [ "$upload" = "y" ]; then
     python database_setup/generate_scored_dataset.py
 elif [ "$upload" = "n" ]; then
     echo "Compiling app data"
-    python database_setup/generate_entire_dataset.py
-    python database_setup/generate_scored_dataset.py
+    python database_setup/run_pipeline.py --skip-api generate_scored_dataset
 else
     echo "Invalid choice for data upload. Please specify 'y' or 'n'."
     exit 1
@@ -0,0 +1,61 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from functions.utils import clean_dataframe, filter_species, rename_taxonomy
+from functions.arrow_strings import SPECIES_PATTERN, capitalize, species_rows, to_arrow_strings
+
+names = pd.Series([
+    "Aaadonta angaurana", "Aaadonta angaurana", "Sphenodon punctatus guntheri", "sphenodon punctatus",
+    "Apteryx owenii\n", "Apteryx\xa0owenii", "Apteryx　haastii", "Apteryx  owenii", None, np.nan,
+    "Ölandia species", "Genus spécies", "", "Columba livia",
+], dtype=object)
+
+
+def test_species_pattern_whitespace():
+    """
+    Arrow's pattern matches the same separators as python's \\s, for every character
+    """
+    chars = [chr(c) for c in range(0x110000) if not 0xD800 <= c <= 0xDFFF]
+    strings = pa.array([f"Ab{c}cd" for c in chars])
+    arrow_matches = pc.match_substring_regex(strings, SPECIES_PATTERN).to_numpy(zero_copy_only=False)
+    python_matches = np.array([re.match(r"[A-Z]{1}[a-z]+\s[a-z]+$", f"Ab{c}cd") is not None for c in chars])
+    assert (arrow_matches == python_matches).all()
+
+
+def test_species_rows_matches_filter_species():
+    df = pd.DataFrame({"full_name": names, "taxonid": range(len(names))})
+    pd.testing.assert_frame_equal(filter_species(df, engine="arrow"), filter_species(df))
+    assert list(species_rows(names)) == [0, 4, 5, 6, 13]
+
+
+def test_capitalize_matches_pandas():
+    """
+    Capitalizing matches pandas, including non ASCII strings and keeping missing values
+    """
+    values = pd.Series(["aVES", None, np.nan, "ǆemo", "ßa", "", "éCLAIR", "MAMMALIA"], dtype=object, index=range(10, 18), name="class")
+    result = capitalize(values)
+    pd.testing.assert_series_equal(result, values.str.capitalize())
+    assert result[11] is None and result[12] is np.nan
+
+
+def test_not_strings_use_pandas():
+    mixed = pd.Series(["aves", 3], dtype=object)
+    assert to_arrow_strings(mixed) is None
+    pd.testing.assert_series_equal(capitalize(mixed), mixed.str.capitalize())
+    assert species_rows(pd.Series(["Aves aves"], dtype="category")) is None
+
+
+def test_clean_dataframe_engines_match():
+    df = pd.DataFrame({
+        "full_name": names,
+        "class_name": ["GASTROPODA", "GASTROPODA", "REPTILIA", "REPTILIA", "AVES", "AVES", "AVES", "AVES", None, "AVES", "INSECTA", "INSECTA", "AVES", "AVES"],
+        "Order Name": ["STYLOMMATOPHORA"] * 13 + [np.nan],
+        "taxonid": range(len(names)),
+    })
+    taxa_dict = {"class": {"Aves": "Birds"}, "order": {}, "family": {}}
+    arrow = clean_dataframe(df.copy(), taxa_dict)
+    pd.testing.assert_frame_equal(arrow, clean_dataframe(df.copy(), taxa_dict, engine="pandas"))
+    assert list(arrow["full_name"]) == ["Aaadonta angaurana", "Apteryx owenii\n", "Apteryx\xa0owenii", "Apteryx　haastii", "Columba livia"]
+    pd.testing.assert_frame_equal(rename_taxonomy(df, engine="arrow"), rename_taxonomy(df))
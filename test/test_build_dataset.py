@@ -0,0 +1,76 @@
+import os
+import sys
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from functions.fetch import ResponseStore, write_page
+
+# stage scripts import each other by module name, as when run from database_setup
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database_setup"))
+from build_dataset import build
+
+
+def iucn_record(taxonid, name, class_name, order, family, category):
+    return {
+        "taxonid": taxonid, "kingdom_name": "ANIMALIA", "phylum_name": "CHORDATA", "class_name": class_name,
+        "order_name": order, "family_name": family, "genus_name": name.split()[0], "scientific_name": name,
+        "taxonomic_authority": "Author, 1900", "infra_rank": None, "infra_name": None, "population": None,
+        "category": category, "main_common_name": None,
+    }
+
+
+def cites_record(taxon_id, name, class_name, order, family, listing):
+    return {
+        "id": taxon_id, "full_name": name, "author_year": "Author, 1900", "rank": "SPECIES", "name_status": "A",
+        "updated_at": "2023-01-01T00:00:00.000Z", "active": True, "cites_listing": listing,
+        "higher_taxa": {"kingdom": "Animalia", "phylum": "Chordata", "class": class_name, "order": order, "family": family},
+        "common_names": [{"name": "Tuatara", "language": "EN"}], "cites_listings": [{"appendix": listing}], "synonyms": [],
+    }
+
+
+@pytest.fixture
+def saved_responses(tmp_path):
+    """
+    Temp folder with saved IUCN and CITES pages, and a folder with an EDGE list workbook
+    """
+    temp_dir = str(tmp_path / "temp") + "/"
+    iucn_pages = [
+        {"result": [iucn_record(1, "Sphenodon punctatus", "REPTILIA", "RHYNCHOCEPHALIA", "SPHENODONTIDAE", "LC")]},
+        {"result": [iucn_record(2, "Apteryx owenii", "AVES", "APTERYGIFORMES", "APTERYGIDAE", "NT")]},
+    ]
+    cites_pages = [{"taxon_concepts": [cites_record(10, "Sphenodon punctatus", "Reptilia", "Rhynchocephalia", "Sphenodontidae", "I")]}]
+    for folder, pages in [("iucn_pages/", iucn_pages), ("cites_pages/", cites_pages)]:
+        out_dir = temp_dir + folder
+        os.makedirs(out_dir)
+        entries = [write_page(out_dir, number, page) for number, page in enumerate(pages, start=1)]
+        ResponseStore(out_dir).save_harvest(entries, url="https://api.example.com/page/{page}")
+
+    dataset_dir = str(tmp_path / "dataset") + "/"
+    os.makedirs(dataset_dir)
+    wb = Workbook()
+    wb.remove(wb.active)
+    ws = wb.create_sheet("Reptile scores")
+    ws.append(["Species", "RL.ID", "Family", "ED.median"])
+    ws.append(["Sphenodon punctatus", 1.0, "SPHENODONTIDAE", 10.5])
+    ws.append(["Acanthixalus sonjae", None, "HYPEROLIIDAE", 5.25])
+    wb.save(dataset_dir + "EDGE_List_2023.xlsx")
+    return temp_dir, dataset_dir
+
+
+def test_build_from_saved_responses(saved_responses):
+    """
+    Saved API pages and the EDGE list are built into the scored dataset in one process,
+    with intermediate dataframes written when checkpointing
+    """
+    temp_dir, dataset_dir = saved_responses
+    scored = build(api_keys={}, db_dir="", dataset_dir=dataset_dir, temp_dir=temp_dir, use_saved_responses=True, checkpoint=True)
+    assert list(scored.columns) == ["full_name", "class", "iucn_category", "cites_listing", "demand", "ed_median", "null_percent"]
+    scored = scored.set_index("full_name")
+    assert list(scored.index) == ["Acanthixalus sonjae", "Apteryx owenii", "Sphenodon punctatus"]
+    assert list(scored["null_percent"]) == [75, 50, 0]
+    assert scored.loc["Sphenodon punctatus", "cites_listing"] == 1.0
+    assert scored.loc["Sphenodon punctatus", "ed_median"] == 1.0
+    for name in ["iucn", "cites", "demand", "edge", "entire_dataset"]:
+        assert os.path.exists(temp_dir + name + ".parquet")
+    entire = pd.read_parquet(temp_dir + "entire_dataset.parquet")
+    assert list(entire["full_name"]) == list(scored.index)
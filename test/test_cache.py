@@ -0,0 +1,62 @@
+import os
+import pytest
+import pandas as pd
+from functions.cache import DatasetCache, file_hash
+
+
+@pytest.fixture
+def parquet_file(tmp_path):
+    path = str(tmp_path / "scored_dataset.parquet")
+    pd.DataFrame({"full_name": ["Aaadonta angaurana"], "demand": [0.5]}).to_parquet(path)
+    return path
+
+
+def test_file_hash(parquet_file, tmp_path):
+    copy = tmp_path / "copy.parquet"
+    copy.write_bytes(open(parquet_file, "rb").read())
+    assert file_hash(parquet_file) == file_hash(str(copy))
+
+
+def test_dataset_cache_hit_miss(parquet_file):
+    """
+    Dataset is read once, then served from memory.
+    """
+    cache = DatasetCache(parquet_file)
+    first = cache.get()
+    second = cache.get()
+    assert first is second
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_dataset_cache_touched_file(parquet_file):
+    """
+    A new mtime with identical contents doesn't reload the file.
+    """
+    cache = DatasetCache(parquet_file)
+    first = cache.get()
+    stat = os.stat(parquet_file)
+    os.utime(parquet_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get() is first
+    assert cache.misses == 1
+
+
+def test_dataset_cache_reload(parquet_file):
+    """
+    Changed file contents are reloaded.
+    """
+    cache = DatasetCache(parquet_file)
+    cache.get()
+    version = cache.version
+    pd.DataFrame({"full_name": ["Acanthixalus sonjae"], "demand": [0.1]}).to_parquet(parquet_file)
+    stat = os.stat(parquet_file)
+    os.utime(parquet_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert list(cache.get()["full_name"]) == ["Acanthixalus sonjae"]
+    assert cache.misses == 2
+    assert cache.version != version
+
+
+def test_dataset_cache_missing_file(tmp_path):
+    cache = DatasetCache(str(tmp_path / "missing.parquet"))
+    with pytest.raises(FileNotFoundError):
+        cache.get()
@@ -1,7 +1,7 @@
 import pytest
 import pandas as pd
 import numpy as np
-from functions.calculations import Calculations, priority_score, enforce_float
+from functions.calculations import Calculations, priority_score, enforce_float, scale
 
 
 @pytest.fixture
@@ -79,3 +79,49 @@ def test_priority_score():
         31.0,
         26.5,
     ]
+
+
+def test_scale_matches_apply():
+    """
+    Vectorised scaling gives the same results
+    as scaling each row with Series.apply().
+    """
+    series = pd.Series([3.0, 0.0, 7.5, 1.2, 7.5])
+    max_value = series.max()
+    pd.testing.assert_series_equal(scale(series, "divide_max"), series.apply(lambda row: row / max_value))
+    pd.testing.assert_series_equal(scale(series, "invert_max"), series.apply(lambda row: 1 - (row / max_value)))
+
+
+def test_scale_dataframe():
+    """
+    Each column of a dataframe is scaled separately.
+    """
+    df = pd.DataFrame({"a": [1.0, 2.0, 4.0], "b": [10.0, 5.0, 0.0]}, index=["x", "y", "z"])
+    expected = pd.DataFrame({"a": [0.25, 0.5, 1.0], "b": [1.0, 0.5, 0.0]}, index=["x", "y", "z"])
+    pd.testing.assert_frame_equal(scale(df, "divide_max"), expected)
+    expected = pd.DataFrame({"a": [0.0, 1 / 3, 1.0], "b": [1.0, 0.5, 0.0]}, index=["x", "y", "z"])
+    pd.testing.assert_frame_equal(scale(df, "min_max"), expected)
+
+
+def test_scale_strategies():
+    values = np.array([0.0, 1.0, 3.0, np.nan])
+    assert list(scale(values, "rank")[:3]) == [1 / 3, 2 / 3, 1.0]
+    assert np.allclose(scale(values, "log")[:3], np.log1p([0.0, 1.0, 3.0]) / np.log1p(3.0))
+    # NaN stays NaN
+    assert all(np.isnan(scale(values, strategy)[3]) for strategy in ["divide_max", "invert_max", "min_max", "rank", "log"])
+    with pytest.raises(ValueError):
+        scale(np.array([-1.0, 2.0]), "log")
+    with pytest.raises(ValueError):
+        scale(values, "not_a_strategy")
+
+
+def test_scale_zero_max():
+    """
+    Columns with a max of 0 are scaled to 0
+    rather than divided by 0.
+    """
+    values = np.array([0.0, 0.0])
+    assert list(scale(values, "divide_max")) == [0.0, 0.0]
+    assert list(scale(values, "invert_max")) == [1.0, 1.0]
+    assert list(scale(values, "min_max")) == [0.0, 0.0]
+    assert list(Calculations(pd.Series([0, None])).divide_max()) == [0.0, 0.0]
@@ -0,0 +1,56 @@
+import pandas as pd
+import pyarrow as pa
+from functions.categorical import sorted_categories, to_categorical, align_categories, read_parquet, dictionary_schema
+from functions.ingest import schema_to_arrow, write_parquet_chunks
+
+
+def test_to_categorical():
+    """
+    Species and taxonomy columns are converted to alphabetical categories, other columns are untouched
+    """
+    df = pd.DataFrame({'full_name': ['Sphenodon punctatus', 'Aaadonta angaurana', None], 'class': ['Reptilia', 'Gastropoda', 'Aves'], 'taxonid': [3, 1, 2]})
+    categorical = to_categorical(df)
+    assert list(categorical['full_name'].cat.categories) == ['Aaadonta angaurana', 'Sphenodon punctatus']
+    assert categorical['full_name'].isna().tolist() == [False, False, True]
+    assert categorical['taxonid'].dtype == 'int64'
+    # input is not changed
+    assert df['full_name'].dtype == object
+
+
+def test_sorted_categories():
+    series = pd.Series(pd.Categorical(['b', 'a'], categories=['b', 'a']))
+    assert list(sorted_categories(series).cat.categories) == ['a', 'b']
+    assert list(sorted_categories(series)) == ['b', 'a']
+    assert list(sorted_categories(series).sort_values()) == ['a', 'b']
+
+
+def test_align_categories():
+    """
+    Merging aligned columns keeps them categorical
+    """
+    left = pd.DataFrame({'full_name': pd.Categorical(['Aaadonta angaurana', 'Apteryx owenii']), 'class': ['Gastropoda', 'Aves'], 'iucn_category': ['CR', 'VU']})
+    right = pd.DataFrame({'full_name': ['Sphenodon punctatus', 'Apteryx owenii'], 'class': ['Reptilia', 'Aves'], 'demand': [2.0, 5.0]})
+    left, right = align_categories([left, right])
+    assert left['full_name'].dtype == right['full_name'].dtype
+    merged = pd.merge(left, right, on=['full_name', 'class'], how='outer')
+    assert isinstance(merged['full_name'].dtype, pd.CategoricalDtype)
+    assert sorted(merged['full_name']) == ['Aaadonta angaurana', 'Apteryx owenii', 'Sphenodon punctatus']
+
+
+def test_read_parquet_chunks(tmp_path):
+    """
+    Dictionary encoded chunks are read back as alphabetical categories
+    """
+    path = str(tmp_path / "data.parquet")
+    schema = dictionary_schema(schema_to_arrow({'taxonid': int, 'full_name': str, 'genus': str}))
+    assert schema.field('full_name').type == pa.dictionary(pa.int32(), pa.string())
+    assert schema.field('genus').type == pa.string()
+    chunks = [
+        pd.DataFrame({'taxonid': [0], 'full_name': ['Sphenodon punctatus'], 'genus': ['Sphenodon']}),
+        pd.DataFrame({'taxonid': [1], 'full_name': ['Aaadonta angaurana'], 'genus': ['Aaadonta']}),
+    ]
+    write_parquet_chunks(iter(chunks), path, schema)
+    df = read_parquet(path)
+    assert list(df['full_name']) == ['Sphenodon punctatus', 'Aaadonta angaurana']
+    assert list(df['full_name'].cat.categories) == ['Aaadonta angaurana', 'Sphenodon punctatus']
+    assert df['genus'].dtype == object
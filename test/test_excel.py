@@ -0,0 +1,92 @@
+import os
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+import functions.excel as excel
+from functions.excel import normalise_column, sheet_names, parse_sheet, read_excel_sheets
+
+columns = ["species", "rl_id", "family", "ed_median"]
+
+
+def score_sheet(sheet):
+    return "score" in sheet and "corals" not in sheet
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """
+    EDGE list like workbook: score sheets with unused columns, and sheets that aren't read
+    """
+    wb = Workbook()
+    wb.remove(wb.active)
+    header = ["Species", "RL.ID", "Family", "ED.median", "EDGE.median", "Notes"]
+    sheets = {
+        "Amphibian scores": [("Aaadonta angaurana", 1.0, "ENDODONTIDAE", 2.5, 3.1, "a"), ("Sphenodon punctatus", None, "SPHENODONTIDAE", 10.0, 1.2, None)],
+        "Read me": [("Not", "a", "score", "sheet", None, None)],
+        "Bird scores": [("Sphenodon punctatus", 2.0, "SPHENODONTIDAE", 11.0, 1.0, "b"), ("Apteryx owenii", 3.0, "APTERYGIDAE", None, 4.0, None)],
+        "corals scores": [("Acropora cervicornis", 4.0, "ACROPORIDAE", 1.0, 1.0, None)],
+    }
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        ws.append(header)
+        for row in rows:
+            ws.append(row)
+    path = str(tmp_path / "edge.xlsx")
+    wb.save(path)
+    return path
+
+
+def test_normalise_column():
+    assert normalise_column("ED.median") == "ed_median"
+    assert normalise_column("Species") == "species"
+
+
+def test_sheet_names(workbook):
+    assert sheet_names(workbook) == ["Amphibian scores", "Read me", "Bird scores", "corals scores"]
+
+
+def test_parse_sheet_needed_columns(workbook):
+    df = parse_sheet(workbook, "Amphibian scores", columns)
+    assert list(df.columns) == columns
+    assert df["species"].tolist() == ["Aaadonta angaurana", "Sphenodon punctatus"]
+
+
+def test_read_excel_sheets_matches_parse(workbook):
+    """
+    Sheets parsed in parallel give the same rows as parsing each sheet of the workbook in turn
+    """
+    data = pd.ExcelFile(workbook)
+    expected = []
+    for sheet in data.sheet_names:
+        if score_sheet(sheet):
+            df = data.parse(sheet)
+            df.columns = df.columns.str.lower().str.replace('.', '_', regex=False)
+            expected.append(df[columns])
+    expected = pd.concat(expected, ignore_index=True)
+
+    df = read_excel_sheets(workbook, select_sheet=score_sheet, columns=columns, max_workers=2)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_read_excel_sheets_cache(workbook, tmp_path, monkeypatch):
+    """
+    An unchanged workbook is read from cache without parsing,
+    a changed workbook is parsed again and replaces the old cache
+    """
+    cache_dir = str(tmp_path / "cache")
+    df = read_excel_sheets(workbook, select_sheet=score_sheet, columns=columns, cache_dir=cache_dir, max_workers=1)
+    assert len(os.listdir(cache_dir)) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("workbook parsed")
+    monkeypatch.setattr(excel, "parse_sheets", fail)
+    pd.testing.assert_frame_equal(read_excel_sheets(workbook, select_sheet=score_sheet, columns=columns, cache_dir=cache_dir), df)
+
+    monkeypatch.undo()
+    from openpyxl import load_workbook
+    wb = load_workbook(workbook)
+    wb["Bird scores"].append(["Kakapo strigops", 5.0, "STRIGOPIDAE", 20.0, 2.0, None])
+    wb.save(workbook)
+    changed = read_excel_sheets(workbook, select_sheet=score_sheet, columns=columns, cache_dir=cache_dir, max_workers=1)
+    assert len(changed) == len(df) + 1
+    assert len(os.listdir(cache_dir)) == 1
@@ -0,0 +1,55 @@
+import io
+import gzip
+import pytest
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from functions.export import stream_export
+
+
+@pytest.fixture
+def ranked_dataframe():
+    return pd.DataFrame({
+        'full_name': ['Acanthixalus sonjae', 'Aaadonta angaurana', 'Sphenodon punctatus'],
+        'class': ['Amphibia', 'Gastropoda', None],
+        'priority_score': [0.67, 0.5, 0.4],
+    })
+
+
+@pytest.mark.parametrize("export_format", ["csv", "csv.gz", "parquet", "arrow"])
+def test_stream_export(ranked_dataframe, export_format):
+    """
+    Every format contains the requested rows in order,
+    and is produced in more than one piece.
+    """
+    positions = np.array([2, 0])
+    parts = list(stream_export(ranked_dataframe, positions, export_format, chunk_size=1))
+    assert len([p for p in parts if p]) > 1
+    content = b"".join(parts)
+    if export_format == "csv":
+        result = pd.read_csv(io.BytesIO(content))
+    elif export_format == "csv.gz":
+        result = pd.read_csv(io.BytesIO(gzip.decompress(content)))
+    elif export_format == "parquet":
+        result = pq.read_table(io.BytesIO(content)).to_pandas()
+    else:
+        result = pa.ipc.open_stream(content).read_all().to_pandas()
+    expected = ranked_dataframe.iloc[positions].reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("export_format", ["csv", "parquet", "arrow"])
+def test_stream_export_no_rows(ranked_dataframe, export_format):
+    content = b"".join(stream_export(ranked_dataframe, np.array([], dtype=int), export_format))
+    if export_format == "csv":
+        assert content.decode().strip() == "full_name,class,priority_score"
+    elif export_format == "parquet":
+        assert pq.read_table(io.BytesIO(content)).num_rows == 0
+    else:
+        assert pa.ipc.open_stream(content).read_all().column_names == ['full_name', 'class', 'priority_score']
+
+
+def test_stream_export_unsupported(ranked_dataframe):
+    with pytest.raises(ValueError):
+        stream_export(ranked_dataframe, np.array([0]), "xlsx")
@@ -0,0 +1,278 @@
+import os
+import json
+import asyncio
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from functions.fetch import TokenBucket, AsyncFetcher, FetchError, page_count, probe_page_count, harvest_pages, iter_pages, ResponseStore, write_page
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+async def no_sleep(seconds):
+    pass
+
+
+async def serve(routes, run):
+    """
+    Runs coroutine function run with a session and the url of a local server of routes.
+    """
+    app = web.Application()
+    app.add_routes(routes)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await run(session, str(server.make_url("/")))
+    finally:
+        await server.close()
+
+
+def test_token_bucket_limits_rate():
+    clock = FakeClock()
+
+    async def take(n):
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+        for _ in range(n):
+            await bucket.acquire()
+
+    asyncio.run(take(6))
+    # burst of 2, then 4 more at 2 per second
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_token_bucket_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_get_json_retries_server_errors():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.query["token"])
+        if len(calls) < 3:
+            return web.Response(status=503 if len(calls) == 1 else 429, headers={"Retry-After": "1"})
+        return web.json_response({"result": [1, 2]})
+
+    async def run(session, url):
+        fetcher = AsyncFetcher(rate=100, retries=3, sleep=no_sleep)
+        return await fetcher.get_json(session, url + "page", params={"token": "abc"})
+
+    assert asyncio.run(serve([web.get("/page", handler)], run)) == {"result": [1, 2]}
+    assert calls == ["abc", "abc", "abc"]
+
+
+def test_get_json_gives_up():
+    async def handler(request):
+        return web.Response(status=500)
+
+    async def run(session, url):
+        fetcher = AsyncFetcher(rate=100, retries=2, sleep=no_sleep)
+        with pytest.raises(FetchError, match="after 3 attempts"):
+            await fetcher.get_json(session, url + "page")
+        return fetcher.requests
+
+    assert asyncio.run(serve([web.get("/page", handler)], run)) == 3
+
+
+def test_get_json_errors():
+    async def token(request):
+        return web.Response(text='{"message":"Token not valid!"}')
+
+    async def bad_request(request):
+        return web.Response(status=400)
+
+    async def run(session, url):
+        fetcher = AsyncFetcher(rate=100, sleep=no_sleep)
+        with pytest.raises(FetchError, match="Token not valid!"):
+            await fetcher.get_json(session, url + "token")
+        with pytest.raises(FetchError, match="status: 400"):
+            await fetcher.get_json(session, url + "bad")
+        assert await fetcher.get_json(session, url + "missing") is None
+        # errors aren't retried
+        return fetcher.requests
+
+    routes = [web.get("/token", token), web.get("/bad", bad_request)]
+    assert asyncio.run(serve(routes, run)) == 3
+
+
+def test_get_many_concurrency():
+    in_flight = []
+    peak = []
+
+    async def handler(request):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return web.json_response({"page": int(request.match_info["n"])})
+
+    async def run(session, url):
+        fetcher = AsyncFetcher(rate=1000, burst=10, concurrency=2)
+        return await fetcher.get_many(session, [url + f"page/{n}" for n in range(6)])
+
+    pages = asyncio.run(serve([web.get("/page/{n}", handler)], run))
+    assert pages == [{"page": n} for n in range(6)]
+    assert max(peak) == 2
+
+
+def test_page_count():
+    assert page_count(150000, 10000) == 15
+    assert page_count(150001, 10000) == 16
+    assert page_count(0, 10000) == 1
+
+
+def test_probe_page_count():
+    requested = []
+
+    async def fetch_page(n):
+        requested.append(n)
+        return {"result": [n] if n < 5 else []}
+
+    pages = asyncio.run(probe_page_count(fetch_page, lambda page: not page["result"], batch_size=4))
+    assert pages == [{"result": [n]} for n in range(5)]
+    assert sorted(requested) == list(range(8))
+
+
+def paginated_handler(total_entries, requested):
+    async def handler(request):
+        page, per_page = int(request.query["page"]), int(request.query["per_page"])
+        requested.append(page)
+        records = list(range((page - 1) * per_page, min(page * per_page, total_entries)))
+        return web.json_response({
+            "pagination": {"current_page": page, "per_page": per_page, "total_entries": total_entries},
+            "taxon_concepts": [{"id": i} for i in records],
+        })
+    return handler
+
+
+def harvest(tmp_path, total_entries, requested):
+    async def run(session, url):
+        fetcher = AsyncFetcher(rate=1000, burst=10, concurrency=3)
+        return await harvest_pages(
+            fetcher, session, url + "taxon_concepts", str(tmp_path),
+            count_pages=lambda page: page_count(page["pagination"]["total_entries"], page["pagination"]["per_page"]),
+            params={"per_page": 10},
+        )
+    return asyncio.run(serve([web.get("/taxon_concepts", paginated_handler(total_entries, requested))], run))
+
+
+def test_harvest_pages(tmp_path):
+    requested = []
+    index = harvest(tmp_path, 45, requested)
+    assert sorted(requested) == [1, 2, 3, 4, 5]
+    assert [entry["page"] for entry in index["pages"]] == [1, 2, 3, 4, 5]
+    assert sorted(os.listdir(tmp_path)) == ["index.json", "last_run.json"] + [f"page_0000{n}.json" for n in range(1, 6)]
+    ids = [concept["id"] for page in iter_pages(str(tmp_path)) for concept in page["taxon_concepts"]]
+    assert ids == list(range(45))
+    with open(tmp_path / "index.json") as f:
+        assert json.load(f) == {"url": index["url"], "pages": index["pages"]}
+    assert ResponseStore(str(tmp_path)).last_run["not_modified"] == 0
+
+
+def test_harvest_pages_removes_old_pages(tmp_path):
+    harvest(tmp_path, 45, [])
+    index = harvest(tmp_path, 15, [])
+    assert len(index["pages"]) == 2
+    assert sorted(os.listdir(tmp_path)) == ["index.json", "last_run.json", "page_00001.json", "page_00002.json"]
+
+
+def test_harvest_pages_conditional(tmp_path):
+    versions = {0: "v1", 1: "v1", 2: "v1"}
+    sent = {}
+
+    async def handler(request):
+        n = int(request.match_info["n"])
+        sent[n] = request.headers.get("If-None-Match")
+        etag = f'"{n}-{versions[n]}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.json_response({"result": [versions[n]]}, headers={"ETag": etag})
+
+    def run_harvest(conditional):
+        async def run(session, url):
+            fetcher = AsyncFetcher(rate=1000, burst=10)
+            return await harvest_pages(fetcher, session, url + "page/{page}", str(tmp_path),
+                                       count_pages=lambda page: 3, first_page=0, conditional=conditional)
+        return asyncio.run(serve([web.get("/page/{n}", handler)], run))
+
+    first = run_harvest(conditional=True)
+    assert first["not_modified"] == 0
+    assert [entry["etag"] for entry in first["pages"]] == ['"0-v1"', '"1-v1"', '"2-v1"']
+
+    versions[1] = "v2"
+    second = run_harvest(conditional=True)
+    assert sent == {0: '"0-v1"', 1: '"1-v1"', 2: '"2-v1"'}
+    assert second["not_modified"] == 2
+    assert [page["result"] for page in iter_pages(str(tmp_path))] == [["v1"], ["v2"], ["v1"]]
+
+    # a harvest that changes no page leaves the index unchanged (the test server's url changes each run)
+    with open(tmp_path / "index.json") as f:
+        index = json.load(f)
+    assert run_harvest(conditional=True)["not_modified"] == 3
+    with open(tmp_path / "index.json") as f:
+        assert {**json.load(f), "url": index["url"]} == index
+
+    run_harvest(conditional=False)
+    assert sent == {0: None, 1: None, 2: None}
+
+
+def test_response_store_merge_records(tmp_path):
+    store = ResponseStore(str(tmp_path))
+    assert store.last_synced is None
+    entries = [
+        write_page(str(tmp_path), 1, {"taxon_concepts": [{"id": 1, "v": "a"}, {"id": 2, "v": "a"}]}, {"ETag": '"x"'}),
+        write_page(str(tmp_path), 2, {"taxon_concepts": [{"id": 3, "v": "a"}]}, {"ETag": '"y"'}),
+    ]
+    store.write_manifest(entries)
+    store.mark_synced("2024-01-01T00:00:00Z")
+
+    summary = store.merge_records(
+        [{"id": 2, "v": "b"}, {"id": 4, "v": "b"}, {"id": 5, "v": "b"}], "taxon_concepts", page_size=1)
+    assert summary == {"updated": 1, "added": 2}
+    records = [concept for page in store.pages() for concept in page["taxon_concepts"]]
+    assert records == [{"id": 1, "v": "a"}, {"id": 2, "v": "b"}, {"id": 3, "v": "a"}, {"id": 4, "v": "b"}, {"id": 5, "v": "b"}]
+    pages = store.entries()
+    assert list(pages) == [1, 2, 3, 4]
+    # rewritten page no longer has the server's ETag, unchanged page keeps it
+    assert "etag" not in pages[1] and pages[2]["etag"] == '"y"'
+    assert store.last_synced == "2024-01-01T00:00:00Z"
+
+
+def test_response_store_sync_keeps_manifest(tmp_path):
+    """
+    A sync that changes no records doesn't change the manifest, the sync time
+    of a manifest written by an earlier version is kept
+    """
+    store = ResponseStore(str(tmp_path))
+    entries = [write_page(str(tmp_path), 1, {"taxon_concepts": [{"id": 1}]})]
+    with open(tmp_path / "index.json", "w") as f:
+        json.dump({"synced_at": "2024-01-01T00:00:00Z", "pages": entries}, f)
+    assert store.last_synced == "2024-01-01T00:00:00Z"
+    store.merge_records([], "taxon_concepts")
+    assert store.manifest == {"pages": entries}
+    assert store.last_synced == "2024-01-01T00:00:00Z"
+
+    with open(tmp_path / "index.json", "rb") as f:
+        index = f.read()
+    store.merge_records([], "taxon_concepts")
+    store.mark_synced("2024-02-01T00:00:00Z")
+    with open(tmp_path / "index.json", "rb") as f:
+        assert f.read() == index
+    assert store.last_synced == "2024-02-01T00:00:00Z"
+
+
+def test_iter_pages_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        iter_pages(str(tmp_path))
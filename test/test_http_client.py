@@ -0,0 +1,74 @@
+import gzip
+import threading
+import pytest
+import requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from functions.http_client import HttpClient
+from functions.utils import get_url
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+    statuses = []
+
+    def do_GET(self):
+        status = self.statuses.pop(0) if self.statuses else 200
+        body = b'{"data": "example"}'
+        self.send_response(status)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/data"
+    server.shutdown()
+    server.server_close()
+    Handler.statuses = []
+
+
+def test_connections_are_reused(server_url):
+    client = HttpClient()
+    for _ in range(5):
+        response = get_url(server_url, client=client)
+        # gzip response is decompressed
+        assert response.json() == {"data": "example"}
+        assert response.headers["Content-Encoding"] == "gzip"
+    stats = client.stats()
+    assert stats["requests"] == 5
+    assert stats["connections"] == 1
+    assert stats["reused"] == 4
+    host, = stats["hosts"].values()
+    assert host == {"connections": 1, "requests": 5, "reused": 4}
+    client.close()
+
+
+def test_server_errors_are_retried(server_url):
+    Handler.statuses = [503, 500]
+    client = HttpClient(backoff=0)
+    assert get_url(server_url, client=client).status_code == 200
+    assert client.stats()["hosts"][server_url[:-len("/data")]]["requests"] == 3
+
+
+def test_error_raised_after_retries(server_url):
+    """ Status error is raised as before once retries are used up """
+    Handler.statuses = [500, 500, 500]
+    with pytest.raises(requests.exceptions.HTTPError) as exc_info:
+        get_url(server_url, client=HttpClient(retries=2, backoff=0))
+    assert str(exc_info.value) == "HTTPError. Request failed with response status: 500, see the following link for more detail on this status: https://developer.mozilla.org/en-US/docs/Web/HTTP/Status/500"
+
+
+def test_timeout():
+    client = HttpClient(connect_timeout=1, read_timeout=2)
+    assert client.timeout == (1, 2)
@@ -0,0 +1,70 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from functions.utils import clean_dataframe
+from functions.ingest import schema_to_arrow, clean_chunks, concat_chunks, write_parquet_chunks
+
+taxa_dict = {'class': {}, 'order': {}, 'family': {}}
+schema = {'taxonid': int, 'class': str, 'full_name': str}
+
+
+def page(rows):
+    return {"result": [dict(zip(["taxonid", "class_name", "full_name"], row)) for row in rows]}
+
+
+pages = [
+    page([(0, 'GASTROPODA', 'Aaadonta angaurana'), (1, None, None), (2, 'GASTROPODA', 'Aaadonta constricta')]),
+    page([]),
+    page([(3, 'REPTILIA', 'Sphenodon punctatus guntheri'), (4, 'GASTROPODA', 'Aaadonta constricta'), (5, 'REPTILIA', 'Sphenodon punctatus')]),
+]
+
+
+def to_frame(page):
+    return pd.DataFrame.from_dict(page["result"])
+
+
+def test_clean_chunks_matches_clean_dataframe():
+    """
+    Cleaning page by page gives the same result as cleaning every page at once,
+    including dropping a species already in an earlier page
+    """
+    chunks = list(clean_chunks(pages, to_frame, taxa_dict, schema))
+    assert len(chunks) == 2
+    whole = clean_dataframe(pd.concat([to_frame(p) for p in pages], ignore_index=True), taxa_dict)
+    pd.testing.assert_frame_equal(concat_chunks(chunks), whole)
+    assert list(whole["taxonid"]) == [0, 2, 5]
+
+
+def test_concat_chunks_empty():
+    assert concat_chunks(iter([])).empty
+
+
+def test_schema_to_arrow():
+    assert schema_to_arrow({'id': int, 'name': str, 'score': float, 'active': bool}) == pa.schema([
+        ('id', pa.int64()), ('name', pa.string()), ('score', pa.float64()), ('active', pa.bool_())
+    ])
+
+
+def test_write_parquet_chunks(tmp_path):
+    """
+    Chunks are written with the same schema, even if a chunk's
+    column has no values, and in schema column order
+    """
+    path = str(tmp_path / "data.parquet")
+    chunks = [
+        pd.DataFrame({'full_name': ['Aaadonta angaurana'], 'taxonid': [0], 'class': [None]}),
+        pd.DataFrame({'full_name': ['Sphenodon punctatus'], 'taxonid': [5], 'class': ['Reptilia']}),
+    ]
+    assert write_parquet_chunks(iter(chunks), path, schema_to_arrow(schema)) == 2
+    parquet = pq.ParquetFile(path)
+    assert parquet.num_row_groups == 2
+    assert parquet.schema_arrow == schema_to_arrow(schema)
+    result = pd.read_parquet(path)
+    assert list(result.columns) == ['taxonid', 'class', 'full_name']
+    assert list(result['class']) == [None, 'Reptilia']
+
+
+def test_write_parquet_chunks_no_chunks(tmp_path):
+    path = str(tmp_path / "data.parquet")
+    assert write_parquet_chunks(iter([]), path, schema_to_arrow(schema)) == 0
+    assert pd.read_parquet(path).columns.tolist() == ['taxonid', 'class', 'full_name']
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from functools import reduce
+from functions.join import first_valid, join_species
+
+
+@pytest.fixture
+def sources():
+    iucn = pd.DataFrame({'full_name': ['Sphenodon punctatus', 'Apteryx owenii', 'Aaadonta angaurana'], 'class': ['Reptilia', 'Aves', 'Gastropoda'], 'iucn_category': [0.3, np.nan, 0.9]})
+    cites = pd.DataFrame({'full_name': ['Apteryx owenii', 'Acanthixalus sonjae'], 'class': ['Aves', 'Amphibia'], 'cites_listing': [0.5, 0.0]})
+    demand = pd.DataFrame({'full_name': ['Apteryx owenii', 'Apteryx owenii', None], 'class': ['Aves', 'Aves', 'Aves'], 'demand': [np.nan, 4.0, 7.0]})
+    return [iucn, cites, demand]
+
+
+def test_first_valid():
+    targets, rows = first_valid(np.array([2, 0, -1, 2, 0, 1]), np.array([True, False, True, True, True, False]))
+    assert list(targets) == [2, 0]
+    assert list(rows) == [0, 4]
+
+
+def test_join_species(sources):
+    """
+    One row per species sorted by species, with the first non-null value of each source
+    """
+    joined = join_species(sources)
+    assert list(joined.columns) == ['full_name', 'class', 'iucn_category', 'cites_listing', 'demand']
+    assert list(joined['full_name']) == ['Aaadonta angaurana', 'Acanthixalus sonjae', 'Apteryx owenii', 'Sphenodon punctatus']
+    assert list(joined['class']) == ['Gastropoda', 'Amphibia', 'Aves', 'Reptilia']
+    assert joined['demand'].tolist()[2] == 4.0
+    assert isinstance(joined['full_name'].dtype, pd.CategoricalDtype)
+
+
+def test_join_species_matches_merge(sources):
+    """
+    Sources with the same class for each species give the same values as outer merging and grouping
+    """
+    merged = reduce(lambda left, right: pd.merge(left, right, on=['full_name', 'class'], how='outer'), sources)
+    expected = merged.groupby('full_name').first().reset_index()
+    joined = join_species(sources)
+    pd.testing.assert_frame_equal(joined.astype({'full_name': object, 'class': object}), expected)
+
+
+def test_join_species_class_priority():
+    """
+    Species with different classes in different sources take the class of the first source with one
+    """
+    edge = pd.DataFrame({'full_name': ['Apteryx owenii', 'Sphenodon punctatus'], 'class': ['', ''], 'ed_median': [1.0, 2.0]})
+    iucn = pd.DataFrame({'full_name': ['Apteryx owenii', 'Sphenodon punctatus'], 'class': ['Aves', None], 'iucn_category': [0.3, 0.6]})
+    assert list(join_species([iucn, edge])['class']) == ['Aves', '']
+    assert list(join_species([edge, iucn])['class']) == ['', '']
+
+
+def test_join_species_columns():
+    """
+    Integer columns stay integers unless a species has no value, value columns must be unique
+    """
+    left = pd.DataFrame({'full_name': ['a', 'b'], 'class': ['x', 'x'], 'count': [1, 2]})
+    right = pd.DataFrame({'full_name': ['b', 'c'], 'class': ['x', 'x'], 'total': [3, 4]})
+    assert join_species([left, left[['full_name', 'class']]])['count'].dtype == 'int64'
+    assert join_species([left, right])['count'].dtype == 'float64'
+    with pytest.raises(ValueError, match="count"):
+        join_species([left, left])
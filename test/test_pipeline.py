@@ -0,0 +1,146 @@
+import os
+import pytest
+from functions.pipeline import Stage, PipelineRunner, fingerprint, format_report, imported_modules
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """
+    Two stage pipeline where 'scored' reads the output of 'entire'.
+    Stages copy their input file to their output file.
+    """
+    paths = {name: str(tmp_path / name) for name in ["source.txt", "entire.txt", "scored.txt", "entire.py", "scored.py"]}
+    for name in ["source.txt", "entire.py", "scored.py"]:
+        with open(paths[name], "w") as f:
+            f.write(name)
+    stages = [
+        Stage("scored", script=paths["scored.py"], inputs=[paths["entire.txt"]], outputs=[paths["scored.txt"]]),
+        Stage("entire", script=paths["entire.py"], inputs=[paths["source.txt"]], outputs=[paths["entire.txt"]]),
+    ]
+    ran = []
+
+    def run_stage(stage):
+        ran.append(stage.name)
+        with open(stage.inputs[0]) as src, open(stage.outputs[0], "w") as dst:
+            dst.write(src.read())
+
+    runner = PipelineRunner(stages, state_path=str(tmp_path / "state.json"), run_stage=run_stage)
+    return runner, paths, ran
+
+
+def test_fingerprint(tmp_path):
+    path = str(tmp_path / "a.txt")
+    missing = fingerprint([path])
+    with open(path, "w") as f:
+        f.write("a")
+    assert fingerprint([path]) != missing
+
+
+def test_pipeline_order(pipeline):
+    runner, _, _ = pipeline
+    assert [stage.name for stage in runner.order()] == ["entire", "scored"]
+    assert [stage.name for stage in runner.order(["entire"])] == ["entire"]
+    with pytest.raises(KeyError):
+        runner.order(["missing"])
+
+
+def test_pipeline_cycle(tmp_path):
+    stages = [
+        Stage("a", script="a.py", inputs=["b.txt"], outputs=["a.txt"]),
+        Stage("b", script="b.py", inputs=["a.txt"], outputs=["b.txt"]),
+    ]
+    with pytest.raises(ValueError):
+        PipelineRunner(stages, state_path=str(tmp_path / "state.json")).order()
+
+
+def test_pipeline_skips_unchanged(pipeline):
+    runner, paths, ran = pipeline
+    results = runner.run()
+    assert [r["status"] for r in results] == ["ran", "ran"]
+    # nothing changed, nothing runs
+    results = runner.run()
+    assert [r["status"] for r in results] == ["skipped", "skipped"]
+    assert ran == ["entire", "scored"]
+    assert "Total" in format_report(results)
+
+
+def test_pipeline_reruns_changed(pipeline):
+    runner, paths, ran = pipeline
+    runner.run()
+    # changed source reruns every stage downstream of it
+    with open(paths["source.txt"], "w") as f:
+        f.write("new data")
+    runner.run()
+    assert ran == ["entire", "scored", "entire", "scored"]
+    # missing output reruns that stage only
+    os.remove(paths["scored.txt"])
+    results = runner.run()
+    assert [r["status"] for r in results] == ["skipped", "ran"]
+    # forced run reruns everything
+    results = runner.run(force=True)
+    assert [r["status"] for r in results] == ["ran", "ran"]
+
+
+def test_pipeline_unchanged_upstream_output(pipeline):
+    """
+    A stage that reruns but writes identical output
+    doesn't cause the stages after it to rerun.
+    """
+    runner, paths, ran = pipeline
+    runner.stages["entire"].always_run = True
+    runner.run()
+    runner.run()
+    assert ran == ["entire", "scored", "entire"]
+
+
+def test_imported_modules(tmp_path):
+    """
+    Project modules imported directly or through other project modules are found,
+    installed packages and the standard library aren't
+    """
+    package = tmp_path / "functions"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "utils.py").write_text("import os\nfrom functions import helpers\n")
+    (package / "helpers.py").write_text("from .shared import value\n")
+    (package / "shared.py").write_text("value = 1\n")
+    (package / "unused.py").write_text("")
+    script = tmp_path / "stage.py"
+    script.write_text("import pandas as pd\nfrom functions.utils import get_path_info\n")
+    found = imported_modules(str(script), [str(tmp_path)])
+    assert [os.path.relpath(path, tmp_path) for path in found] == [os.path.join("functions", name) for name in ["__init__.py", "helpers.py", "shared.py", "utils.py"]]
+
+
+def test_pipeline_reruns_changed_module_and_config(tmp_path):
+    """
+    Changing a module the script imports or a config section the stage reads reruns the stage,
+    changing another config section doesn't
+    """
+    (tmp_path / "helpers.py").write_text("SEED = 0\n")
+    script = tmp_path / "stage.py"
+    script.write_text("import helpers\n")
+    config = tmp_path / "config.ini"
+    config.write_text("[PIPELINE]\ndemand_seed = 0\n\n[USER]\ndate = 01/01/2024\n")
+    stage = Stage("stage", script=str(script), config_sections=["PIPELINE"])
+    runner = PipelineRunner([stage], state_path=str(tmp_path / "state.json"), run_stage=lambda stage: None, root=str(tmp_path), config_path=str(config))
+    assert [r["status"] for r in runner.run()] == ["ran"]
+    config.write_text("[PIPELINE]\ndemand_seed = 0\n\n[USER]\ndate = 02/01/2024\n")
+    assert [r["status"] for r in runner.run()] == ["skipped"]
+    config.write_text("[PIPELINE]\ndemand_seed = 1\n\n[USER]\ndate = 02/01/2024\n")
+    assert [r["status"] for r in runner.run()] == ["ran"]
+    (tmp_path / "helpers.py").write_text("SEED = 1\n")
+    assert [r["status"] for r in runner.run()] == ["ran"]
+    assert [r["status"] for r in runner.run()] == ["skipped"]
+
+
+def test_stages_dont_import_app_modules():
+    """
+    Pipeline stages don't import the app's ranking and search code,
+    so changing it doesn't rerun the rebuild
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for name in ["generate_metadata.py", "generate_scored_dataset.py", "build_dataset.py"]:
+        script = os.path.join(root, "database_setup", name)
+        found = [os.path.basename(path) for path in imported_modules(script, [os.path.dirname(script), root])]
+        assert "utils.py" in found
+        assert "ranking.py" not in found and "search.py" not in found
@@ -0,0 +1,204 @@
+import pytest
+import pandas as pd
+from functions.ranking import RankedDataset, RankingCache, rank_dataset, build_base_dataset, parse_weight
+from functions.search import TrigramIndex
+
+
+@pytest.fixture
+def weighted_dataframe():
+    return pd.DataFrame({
+        'full_name': ['Aaadonta angaurana', 'Acanthixalus sonjae', 'Sphenodon punctatus', 'Aaadonta constricta'],
+        'class': ['Gastropoda', 'Amphibia', 'Reptilia', 'Gastropoda'],
+        'biobank_samples': [1.0, 0.5, 0.0, 1.0],
+        'demand': [0.2, 0.9, 0.4, 0.1],
+        'conservation_value': [0.3, 0.6, 0.8, 0.1],
+        'null_percent': [0, 25, 50, 0],
+    })
+
+
+def test_rank_dataset(weighted_dataframe):
+    ranked = rank_dataset(weighted_dataframe)
+    assert list(ranked.columns) == ['full_name', 'class', 'biobank_samples', 'demand', 'conservation_value', 'priority_score', 'null_percent']
+    assert list(ranked['full_name']) == ['Acanthixalus sonjae', 'Aaadonta angaurana', 'Sphenodon punctatus', 'Aaadonta constricta']
+    assert list(ranked['priority_score']) == [0.67, 0.5, 0.4, 0.4]
+
+
+def test_rank_dataset_weights(weighted_dataframe):
+    """
+    Weights multiply the score columns when the data is ranked,
+    without changing the data they are applied to.
+    """
+    ranked = rank_dataset(weighted_dataframe, {'conservation_value': 2.5, 'demand': 0.5})
+    assert list(ranked['full_name']) == ['Acanthixalus sonjae', 'Sphenodon punctatus', 'Aaadonta angaurana', 'Aaadonta constricta']
+    assert list(ranked['conservation_value']) == [1.5, 2.0, 0.75, 0.25]
+    assert list(ranked['demand']) == [0.45, 0.2, 0.1, 0.05]
+    assert list(weighted_dataframe['demand']) == [0.2, 0.9, 0.4, 0.1]
+
+
+def test_parse_weight():
+    assert parse_weight("2") == 2.0
+    assert parse_weight("0.25") == 0.25
+    assert parse_weight("") == 1.0
+    assert parse_weight(None) == 1.0
+    with pytest.raises(ValueError):
+        parse_weight("abc")
+    with pytest.raises(ValueError):
+        parse_weight("inf")
+
+
+def test_build_base_dataset():
+    scored = pd.DataFrame({
+        'full_name': ['Aaadonta angaurana', 'Acanthixalus sonjae', 'Sphenodon punctatus'],
+        'class': ['Gastropoda', 'Amphibia', 'Reptilia'],
+        'iucn_category': [0.9, 0.3, None],
+        'cites_listing': [0.3, 0.0, 0.6],
+        'ed_median': [0.6, 0.3, 0.3],
+        'demand': [0.5, 0.5, 0.5],
+        'null_percent': [0, 0, 25],
+    })
+    biobank = pd.DataFrame({
+        'full_name': ['Aaadonta angaurana', 'Sphenodon punctatus'],
+        'class': ['Gastropoda', 'Reptilia'],
+        'biobank_samples': [10, 40],
+    })
+    base = build_base_dataset(scored, biobank)
+    assert list(base.columns) == ['full_name', 'class', 'biobank_samples', 'demand', 'null_percent', 'conservation_value']
+    base = base.set_index('full_name')
+    # samples are inverted, species not in the biobank get a score of 1
+    assert base.loc['Aaadonta angaurana', 'biobank_samples'] == 0.75
+    assert base.loc['Sphenodon punctatus', 'biobank_samples'] == 0.0
+    assert base.loc['Acanthixalus sonjae', 'biobank_samples'] == 1.0
+    assert base.loc['Sphenodon punctatus', 'conservation_value'] == 0.3
+
+
+def test_ranked_dataset_query(weighted_dataframe):
+    ranking = RankedDataset(rank_dataset(weighted_dataframe))
+    # default order is the ranking itself
+    assert list(ranking.query()) == [0, 1, 2, 3]
+    # class filter
+    assert list(ranking.query(class_selected='Gastropoda')) == [1, 3]
+    # case insensitive search
+    assert list(ranking.query(search='AAADONTA')) == [1, 3]
+    # order by another column
+    positions = ranking.query(order_col='full_name', ascending=True)
+    assert list(ranking.page(positions, 0, 2)['full_name']) == ['Aaadonta angaurana', 'Aaadonta constricta']
+    positions = ranking.query(order_col='demand', ascending=False)
+    assert list(ranking.page(positions, 1, 10)['demand']) == [0.4, 0.2, 0.1]
+
+
+def test_ranking_cache():
+    cache = RankingCache(maxsize=2)
+    built = []
+    def build(name):
+        built.append(name)
+        return name
+    cache.get(('v1', (1, 1, 1)), lambda: build('a'))
+    cache.get(('v1', (2, 1, 1)), lambda: build('b'))
+    assert cache.get(('v1', (1, 1, 1)), lambda: build('c')) == 'a'
+    # least recently used ranking is evicted
+    cache.get(('v1', (3, 1, 1)), lambda: build('d'))
+    assert cache.get(('v1', (2, 1, 1)), lambda: build('e')) == 'e'
+    assert built == ['a', 'b', 'd', 'e']
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['size'] == 2
+
+
+def test_ranking_cache_discard():
+    cache = RankingCache()
+    for key in [('ws_a', 1, ()), ('ws_a', 2, ()), ('ws_b', 3, ())]:
+        cache.get(key, lambda: key)
+    assert cache.discard(lambda key: key[0] == 'ws_a') == 2
+    assert cache.stats()['size'] == 1
+    assert cache.get(('ws_b', 3, ()), lambda: None) == ('ws_b', 3, ())
+
+
+def test_ranked_dataset_permutation(weighted_dataframe):
+    """
+    Permutations are computed once per column and
+    filtered without re-sorting.
+    """
+    ranking = RankedDataset(rank_dataset(weighted_dataframe))
+    assert list(ranking.permutation('full_name')) == [1, 3, 0, 2]
+    assert ranking.permutation('full_name') is ranking.permutation('full_name')
+    assert list(ranking.query(class_selected='Gastropoda', order_col='full_name', ascending=True)) == [1, 3]
+    assert list(ranking.query(class_selected='Gastropoda', order_col='full_name', ascending=False)) == [3, 1]
+    assert list(ranking.query(order_col='priority_score', ascending=True)) == [3, 2, 1, 0]
+
+
+def test_ranked_dataset_class_index(weighted_dataframe):
+    ranking = RankedDataset(rank_dataset(weighted_dataframe))
+    assert list(ranking.class_index['Gastropoda']) == [1, 3]
+    assert list(ranking.query(class_selected='Aves')) == []
+    assert list(ranking.query(class_selected='Gastropoda', search='constricta')) == [3]
+
+
+def test_ranked_dataset_categorical(weighted_dataframe):
+    """
+    Categorical species and class columns are ordered and filtered as strings,
+    and classes without species aren't indexed
+    """
+    categorical = weighted_dataframe.astype({'full_name': 'category', 'class': pd.CategoricalDtype(['Aves', 'Amphibia', 'Gastropoda', 'Reptilia'])})
+    ranking = RankedDataset(rank_dataset(categorical))
+    expected = RankedDataset(rank_dataset(weighted_dataframe))
+    assert list(ranking.permutation('full_name')) == list(expected.permutation('full_name'))
+    assert list(ranking.query(class_selected='Gastropoda', search='constricta')) == [3]
+    assert 'Aves' not in ranking.class_index
+
+
+def test_build_base_dataset_categorical():
+    """
+    Base dataset of a categorical scored dataset matches that of an object
+    scored dataset, with species and class kept as categories
+    """
+    scored = pd.DataFrame({
+        'full_name': ['Aaadonta angaurana', 'Acanthixalus sonjae'],
+        'class': ['Gastropoda', 'Amphibia'],
+        'iucn_category': [0.9, 0.3],
+        'cites_listing': [0.3, 0.0],
+        'ed_median': [0.6, 0.3],
+        'demand': [0.5, 0.5],
+        'null_percent': [0, 0],
+    })
+    biobank = pd.DataFrame({'full_name': ['Aaadonta angaurana', 'Sphenodon punctatus'], 'class': ['Gastropoda', 'Reptilia'], 'biobank_samples': [10, 40]})
+    base = build_base_dataset(scored.astype({'full_name': 'category', 'class': 'category'}), biobank)
+    assert isinstance(base['full_name'].dtype, pd.CategoricalDtype)
+    assert list(base['class'].cat.categories) == ['Amphibia', 'Gastropoda', 'Reptilia']
+    pd.testing.assert_frame_equal(base.astype({'full_name': object, 'class': object}), build_base_dataset(scored, biobank).astype({'full_name': object, 'class': object}))
+
+
+def test_build_base_dataset_class_mismatch():
+    """
+    Biobank samples are joined on species, taking the scored dataset's class
+    """
+    scored = pd.DataFrame({
+        'full_name': ['Aaadonta angaurana', 'Acanthixalus sonjae'],
+        'class': ['Gastropoda', 'Amphibia'],
+        'iucn_category': [0.9, 0.3],
+        'cites_listing': [0.3, 0.0],
+        'ed_median': [0.6, 0.3],
+        'demand': [0.5, 0.5],
+        'null_percent': [0, 0],
+    })
+    biobank = pd.DataFrame({'full_name': ['Acanthixalus sonjae', 'Aaadonta angaurana'], 'class': ['Reptilia', None], 'biobank_samples': [10, 40]})
+    base = build_base_dataset(scored, biobank)
+    assert list(base['full_name']) == ['Aaadonta angaurana', 'Acanthixalus sonjae']
+    assert list(base['class']) == ['Gastropoda', 'Amphibia']
+    assert list(base['biobank_samples']) == [0.0, 0.75]
+
+
+def test_ranked_dataset_shared_search_index(weighted_dataframe):
+    """
+    Rankings with different weights search one index of the dataset they were ranked from
+    """
+    built = []
+    def build_index():
+        built.append(1)
+        return TrigramIndex(weighted_dataframe['full_name'])
+    cache = RankingCache()
+    for weights in [None, {'biobank_samples': 5.0}, {'demand': 0.0}]:
+        ranked, order = rank_dataset(weighted_dataframe, weights, return_order=True)
+        ranking = RankedDataset(ranked, search_index=lambda: cache.get('v1', build_index), source_positions=order)
+        expected = RankedDataset(ranked)
+        for term in ['AAADONTA', 'ae', 'onta con', 'zzz']:
+            assert list(ranking.query(search=term)) == list(expected.query(search=term))
+    assert len(built) == 1
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from functions.search import TrigramIndex, trigrams
+
+
+def test_trigrams():
+    assert trigrams("aves") == {"ave", "ves"}
+    assert trigrams("av") == set()
+
+
+def test_trigram_index_search():
+    names = pd.Series(['Aaadonta angaurana', 'Acanthixalus sonjae', None, 'Aaadonta constricta', 'Sphenodon punctatus'])
+    index = TrigramIndex(names)
+    assert list(index.search("AAADONTA")) == [0, 3]
+    assert list(index.search("onta con")) == [3]
+    assert list(index.search("don")) == [0, 3, 4]
+    # short terms are checked against every row
+    assert list(index.search("ae")) == [1]
+    # no match, or trigrams present in different rows only
+    assert list(index.search("zzz")) == []
+    assert list(index.search("aaadonta sonjae")) == []
+
+
+def test_trigram_index_matches_str_contains():
+    """
+    Index gives the same rows as a case insensitive literal str.contains().
+    """
+    rng = np.random.default_rng(0)
+    names = pd.Series(["".join(rng.choice(list("abcAB "), size=12)) for _ in range(500)])
+    index = TrigramIndex(names)
+    for term in ["ab", "abc", "A b", "cab a", "bbbb", "c"]:
+        expected = np.flatnonzero(names.str.contains(term, case=False, regex=False))
+        assert list(index.search(term)) == list(expected)
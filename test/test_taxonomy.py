@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from functions.utils import multi_dict_replace_rows
+from functions.taxonomy import resolve_chains, TaxonomyResolver
+
+rep_dicts = {
+    "class": {"Actinopteri": "Actinopterygii", "Dipneusti": "Sarcopterygii"},
+    "family": {"Dermophiidae": "Caeciliidae", "Helostomatidae": "Helostomatidae", "Columbidnae": "Columbidae"},
+}
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "full_name": ["Aaadonta angaurana", "Geotrypetes seraphini", "Columba livia", "Protopterus annectens", "Helostoma temminkii"],
+        "class": ["Gastropoda", "Amphibia", "Aves", "Dipneusti", None],
+        "family": ["Endodontidae", "Dermophiidae", "Columbidnae", np.nan, "Helostomatidae"],
+    })
+
+
+def test_resolve_chains():
+    assert resolve_chains({"A": "B", "B": "C", "C": "C", "D": "E"}) == {"A": "C", "B": "C", "D": "E"}
+
+
+def test_resolve_chains_cycle():
+    with pytest.raises(ValueError):
+        resolve_chains({"A": "B", "B": "A"})
+
+
+def test_resolve_matches_multi_dict_replace_rows(df):
+    """
+    Rank columns are corrected as replacing every value would,
+    keeping missing values and the column dtype
+    """
+    resolved = TaxonomyResolver(rep_dicts).resolve(df)
+    pd.testing.assert_frame_equal(resolved, multi_dict_replace_rows(df, rep_dicts))
+    assert resolved["family"][3] is np.nan and resolved["class"][4] is None
+    # input is not changed
+    assert df["family"][1] == "Dermophiidae"
+
+
+def test_resolve_chained_corrections(df):
+    resolved = TaxonomyResolver({"family": {"Dermophiidae": "Typhlonectidae", "Typhlonectidae": "Caeciliidae"}}).resolve(df)
+    assert resolved["family"][1] == "Caeciliidae"
+
+
+def test_resolve_categorical(df):
+    """
+    Categorical columns stay categorical, with corrected values merged into existing categories
+    """
+    df["family"] = pd.Categorical(["Endodontidae", "Dermophiidae", "Columbidnae", None, "Caeciliidae"])
+    resolved = TaxonomyResolver(rep_dicts).resolve(df)
+    assert isinstance(resolved["family"].dtype, pd.CategoricalDtype)
+    assert resolved["family"].tolist() == ["Endodontidae", "Caeciliidae", "Columbidae", np.nan, "Caeciliidae"]
+    assert sorted(resolved["family"].cat.categories) == ["Caeciliidae", "Columbidae", "Endodontidae"]
+
+
+def test_resolve_with_report(df):
+    df = pd.concat([df, df.iloc[[1]]], ignore_index=True)
+    _, report = TaxonomyResolver(rep_dicts).resolve_with_report(df)
+    assert report.to_dict("records") == [
+        {"rank": "class", "original": "Dipneusti", "corrected": "Sarcopterygii", "rows": 1},
+        {"rank": "family", "original": "Dermophiidae", "corrected": "Caeciliidae", "rows": 2},
+        {"rank": "family", "original": "Columbidnae", "corrected": "Columbidae", "rows": 1},
+    ]
+
+
+def test_resolve_without_rank_column():
+    df = pd.DataFrame({"full_name": ["Columba livia"]})
+    resolved, report = TaxonomyResolver(rep_dicts).resolve_with_report(df)
+    pd.testing.assert_frame_equal(resolved, df)
+    assert report.empty
@@ -2,7 +2,9 @@ import pytest
 import jsonschema
 import numpy as np
 import pandas as pd
-from functions.utils import multi_dict_replace_rows, filter_species, rename_taxonomy, nested_dicts_to_df, generate_demand, validate_json_schema, validate_df_schema, columns_to_snake_case, clean_dataframe
+import json
+import functions.utils
+from functions.utils import columnar_json, flatten_nested, multi_dict_replace_rows, filter_species, rename_taxonomy, nested_dicts_to_df, generate_demand, validate_json_schema, validate_df_schema, df_schema_report, invalid_type_rows, columns_to_snake_case, clean_dataframe
 
 @pytest.fixture
 def test_dataframe():
@@ -124,6 +126,19 @@ def test_generate_demand():
     assert all([round(r) in range(0,7) for r in (result_df[result_df['class'] == 'Fruit']["demand"])])
     assert all([round(r) in range(7,14) for r in (result_df[result_df['class'] == 'Vegetable']["demand"])])
 
+def test_generate_demand_seed():
+    """
+    Tests if generate_demand() gives the same scores for the same seed,
+    with species ordered by class and species without a class dropped.
+    """
+    test_df = pd.DataFrame(data = {'full_name': ['Peppers', 'Banana', 'Apple', 'Carrots', 'Milk'], 'class': ['Vegetable', 'Fruit', 'Fruit', 'Vegetable', None]})
+    test_scores = {'Vegetable': 10, 'Fruit': 3}
+    result_df = generate_demand(test_df, test_scores, seed=1)
+    pd.testing.assert_frame_equal(result_df, generate_demand(test_df, test_scores, seed=1))
+    assert list(result_df.columns) == ['demand', 'full_name', 'class']
+    assert list(result_df['full_name']) == ['Banana', 'Apple', 'Peppers', 'Carrots']
+    assert not result_df['demand'].equals(generate_demand(test_df, test_scores, seed=2)['demand'])
+
 def test_validate_json_schema():
     # Create a valid JSON data and schema
     json_data = {"name": "John", "age": 30}
@@ -207,6 +222,59 @@ def test_validate_df_schema_fail_KeyError(test_dataframe):
     # Assert the specific error message
     assert str(error.value) == str(KeyError("Expected columns are missing from dataframe: ['another_column']"))
 
+@pytest.mark.parametrize("values, dtype", [
+    ([1, 2], None),
+    ([1.5, np.nan], None),
+    ([True, False], None),
+    (["a", None, np.nan], None),
+    (["a", float("nan")], None),
+    (["a", 1, None], None),
+    ([np.int64(1), 2], object),
+    (["a", None], "string"),
+    (["a", None, "b"], "category"),
+    ([1, None, 2], "category"),
+    ([None, None], object),
+])
+@pytest.mark.parametrize("expected_type", [int, float, str, bool, object])
+def test_invalid_type_rows_matches_values(values, dtype, expected_type):
+    """
+    Columns checked by dtype are valid exactly when every value is
+    of the expected type, None or np.nan
+    """
+    series = pd.Series(values, dtype=dtype)
+    valid = all(isinstance(value, expected_type) or value is None or value is np.nan for value in series)
+    assert invalid_type_rows(series, expected_type).empty == valid
+
+
+def test_df_schema_report(test_dataframe):
+    """
+    Every missing and invalid column is reported, with the index of invalid rows
+    """
+    df = test_dataframe.set_index(pd.Index([10, 11]))
+    df.loc[11, "main_common_name"] = 5
+    schema = {"taxonid": float, "kingdom": str, "main_common_name": str, "another_column": str}
+    report = df_schema_report(df, schema)
+    assert report["missing_columns"] == ["another_column"]
+    assert "phylum" in report["unexpected_columns"]
+    assert report["invalid_columns"] == {
+        "taxonid": {"expected": "float", "dtype": "int64", "rows": [10, 11]},
+        "main_common_name": {"expected": "str", "dtype": "object", "rows": [11]},
+    }
+    assert not report["valid"]
+
+
+def test_df_schema_report_sample():
+    """
+    Only a sample of rows is checked one by one
+    """
+    df = pd.DataFrame({"mixed": ["a"] * 99 + [1]})
+    assert df_schema_report(df, {"mixed": str})["invalid_columns"]["mixed"]["rows"] == [99]
+    for random_state in range(20):
+        sampled = df.sample(10, random_state=random_state).index
+        report = df_schema_report(df, {"mixed": str}, sample=10, random_state=random_state)
+        assert report["valid"] == (99 not in sampled)
+
+
 def test_columns_to_snake_case():
     test_df = pd.DataFrame(
         [
@@ -248,4 +316,51 @@ def test_clean_dataframe():
         'full_name': ['Aaadonta angaurana', 'Aaadonta constricta'],
     })
     result_df = clean_dataframe(test_df, taxa_dict)
-    assert result_df.equals(expected_df)
\ No newline at end of file
+    assert result_df.equals(expected_df)
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_columnar_json(monkeypatch, use_orjson):
+    """
+    Columnar response gives the same rows as the records response,
+    with or without orjson installed.
+    """
+    if not use_orjson:
+        monkeypatch.setattr(functions.utils, "orjson", None)
+    data = pd.DataFrame({
+        'full_name': ['Aaadonta angaurana', 'Acanthixalus sonjae'],
+        'class': ['Gastropoda', None],
+        'demand': [0.25, np.nan],
+        'null_percent': [0, 50],
+    })
+    result = json.loads(columnar_json({'draw': 1, 'recordsTotal': 2}, data))
+    assert result['draw'] == 1
+    assert result['columnar'] == {
+        'full_name': ['Aaadonta angaurana', 'Acanthixalus sonjae'],
+        'class': ['Gastropoda', None],
+        'demand': [0.25, None],
+        'null_percent': [0, 50],
+    }
+
+def test_flatten_nested():
+    """
+    Each child row has the id of its own parent record,
+    records without children are skipped
+    """
+    records = [
+        {"id": 10, "common_names": [{"name": "Tuatara", "language": "EN"}, {"name": "Tuátara", "language": "ES"}], "synonyms": []},
+        {"id": 20, "common_names": [], "synonyms": None},
+        {"id": 30, "common_names": [{"name": "Snail", "language": "EN"}], "synonyms": [{"full_name": "Aaadonta x"}]},
+    ]
+    tables = flatten_nested(records, ["common_names", "synonyms"], parent_column="taxon_concept_id")
+    expected_names = pd.DataFrame({
+        "taxon_concept_id": [10, 10, 30],
+        "name": ["Tuatara", "Tuátara", "Snail"],
+        "language": ["EN", "ES", "EN"],
+    })
+    pd.testing.assert_frame_equal(tables["common_names"], expected_names)
+    pd.testing.assert_frame_equal(tables["synonyms"], pd.DataFrame({"taxon_concept_id": [30], "full_name": ["Aaadonta x"]}))
+
+def test_flatten_nested_no_children():
+    tables = flatten_nested([{"id": 1, "synonyms": []}], ["synonyms"])
+    assert list(tables["synonyms"].columns) == ["parent_id"]
+    assert tables["synonyms"].empty
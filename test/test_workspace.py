@@ -0,0 +1,107 @@
+import pandas as pd
+from functions.workspace import WorkspaceStore, frame_nbytes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_workspaces_are_isolated():
+    store = WorkspaceStore()
+    store.put("user_a", "biobank", pd.DataFrame({"full_name": ["Aaadonta angaurana"]}))
+    store.put("user_b", "biobank", pd.DataFrame({"full_name": ["Acanthixalus sonjae"]}))
+    assert list(store.get("user_a", "biobank")["full_name"]) == ["Aaadonta angaurana"]
+    assert list(store.get("user_b", "biobank")["full_name"]) == ["Acanthixalus sonjae"]
+    assert store.get("user_c", "biobank") is None
+    assert store.get("user_a", "weighted") is None
+
+
+def test_workspace_versions():
+    store = WorkspaceStore()
+    df = pd.DataFrame({"full_name": ["Aaadonta angaurana"]})
+    assert store.version("user_a", "weighted") is None
+    first = store.put("user_a", "weighted", df)
+    second = store.put("user_a", "weighted", df)
+    assert second > first
+    assert store.version("user_a", "weighted") == second
+
+
+def test_workspace_versions_not_reused():
+    """
+    A workspace created again after expiring gets new versions,
+    so rankings cached for the old data aren't matched
+    """
+    clock = FakeClock()
+    store = WorkspaceStore(ttl=60, clock=clock)
+    df = pd.DataFrame({"full_name": ["Aaadonta angaurana"]})
+    old = store.put("user_a", "base", df)
+    clock.now = 120
+    assert store.get("user_a", "base") is None
+    assert store.put("user_a", "base", df) != old
+    store.discard("user_a")
+    assert store.put("user_a", "base", df) > old
+
+
+def test_workspace_ttl_eviction():
+    clock = FakeClock()
+    store = WorkspaceStore(ttl=60, clock=clock)
+    store.put("user_a", "biobank", pd.DataFrame({"full_name": ["Aaadonta angaurana"]}))
+    clock.now = 30
+    assert store.get("user_a", "biobank") is not None
+    # last access refreshed at 30s, so workspace expires after 90s
+    clock.now = 91
+    assert store.get("user_a", "biobank") is None
+    assert store.stats()["evictions"] == 1
+
+
+def test_workspace_memory_eviction():
+    df = pd.DataFrame({"full_name": ["Aaadonta angaurana"] * 100})
+    store = WorkspaceStore(max_bytes=int(frame_nbytes(df) * 2.5))
+    store.put("user_a", "biobank", df)
+    store.put("user_b", "biobank", df)
+    store.get("user_a", "biobank")
+    # user_b is least recently used and dropped to stay under budget
+    store.put("user_c", "biobank", df)
+    assert store.get("user_b", "biobank") is None
+    assert store.get("user_a", "biobank") is not None
+    assert store.get("user_c", "biobank") is not None
+    assert store.stats()["nbytes"] <= store.max_bytes
+
+
+def test_workspace_over_budget_is_kept_while_used():
+    """
+    A workspace alone over the memory budget is still returned to its user
+    """
+    df = pd.DataFrame({"full_name": ["Aaadonta angaurana"] * 100})
+    store = WorkspaceStore(max_bytes=frame_nbytes(df) // 2)
+    store.put("user_a", "uploaded", df)
+    assert store.get("user_a", "uploaded") is df
+    # dropped once another workspace is used
+    store.put("user_b", "uploaded", df)
+    assert store.get("user_a", "uploaded") is None
+
+
+def test_workspace_shared_frame_counted_once():
+    df = pd.DataFrame({"full_name": ["Aaadonta angaurana"] * 100})
+    store = WorkspaceStore()
+    store.put("user_a", "uploaded", df)
+    store.put("user_a", "biobank", df)
+    assert store.stats()["nbytes"] == frame_nbytes(df)
+
+
+def test_workspace_on_evict():
+    clock = FakeClock()
+    dropped = []
+    store = WorkspaceStore(ttl=60, clock=clock, on_evict=dropped.append)
+    df = pd.DataFrame({"full_name": ["Aaadonta angaurana"]})
+    store.put("user_a", "base", df)
+    store.put("user_b", "base", df)
+    store.discard("user_b")
+    store.discard("user_c")
+    clock.now = 120
+    assert store.get("user_a", "base") is None
+    assert dropped == ["user_b", "user_a"]